@@ -0,0 +1,119 @@
+"""Benchmark the single-pass page extractor against the previous regex scans.
+
+Builds friends/pending fixture pages with 2,000 friends (or loads saved ones
+with --fixtures), runs every scan the old code made over such a page and a
+single extract_page() call, checks that both find the same users, and fails if
+the extractor is slower.
+
+    python -m benchmarks.bench_extractor [--friends 2000] [--save DIR] [--fixtures DIR]
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from steamautofriend.utils.extractor import extract_page, STEAM_ID64_BASE
+
+def make_friends_page(friend_count: int, pending_count: int = 0) -> str:
+    """Build a synthetic friends page shaped like steamcommunity.com's."""
+    parts = ['<html><head><title>Friends</title></head><body>',
+             '<div class="profile_small_header"><div data-miniprofile="1">Me</div></div>',
+             '<a href="https://steamcommunity.com/my/friends/pending">Pending Invites</a>']
+    for i in range(friend_count):
+        account_id = 100000 + i
+        steam_id = account_id + STEAM_ID64_BASE
+        pending = i < pending_count
+        parts.append(
+            f'<div class="selectable friend_block_v2 persona offline" data-steamid="{steam_id}" '
+            f'data-miniprofile="{account_id}">'
+            f'<a class="selectable_overlay" href="https://steamcommunity.com/profiles/{steam_id}"></a>'
+            f'<div class="player_avatar friend_block_link_overlay offline"><img src="avatar{i}.jpg"></div>'
+            f'<div class="friend_block_content">Player {i}<br>'
+            f'<span class="friend_small_text">{"Pending..." if pending else "Last online 3 days ago"}</span>'
+            f'</div></div>'
+        )
+    parts.append('</body></html>')
+    return '\n'.join(parts)
+
+def legacy_scan(html: str, own_miniprofile: str = '1') -> dict:
+    """The regex scans the previous get_friends/get_pending_requests ran over a page."""
+    friends = set()
+    for miniprofile in re.findall(r'data-miniprofile="(\d+)"', html):
+        if miniprofile != own_miniprofile:
+            friends.add(str(int(miniprofile) + STEAM_ID64_BASE))
+    links = set(re.findall(r'href="https://steamcommunity\.com/profiles/(\d+)"', html))
+    # METHOD 3 pattern: DOTALL and non-greedy, quadratic when few users are pending
+    pending = set(re.findall(r'data-steamid="(\d+)"[^>]*>.*?Pending.*?</span>', html, re.DOTALL | re.IGNORECASE))
+    return {'friends': friends, 'links': links, 'pending': pending}
+
+def extractor_scan(html: str) -> dict:
+    page = extract_page(html)
+    return {
+        'friends': set(page.miniprofile_ids(exclude=str(1 + STEAM_ID64_BASE))),
+        'links': set(page.profile_links),
+        'pending': set(page.pending_ids()),
+    }
+
+def best_of(func, html: str, repeat: int) -> float:
+    """Best wall-clock time of several runs, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--friends', type=int, default=2000, help='Number of friends on the fixture page')
+    parser.add_argument('--repeat', type=int, default=5, help='Extractor runs per measurement (best is reported); the legacy scans are quadratic and run once')
+    parser.add_argument('--save', type=Path, help='Write the generated fixture pages to this directory')
+    parser.add_argument('--fixtures', type=Path, help='Load friends.html and pending.html from this directory')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        friends_html = (args.fixtures / 'friends.html').read_text()
+        pending_html = (args.fixtures / 'pending.html').read_text()
+    else:
+        friends_html = make_friends_page(args.friends)
+        # Only a few pending users: the old DOTALL pattern scans far past each user
+        pending_html = make_friends_page(args.friends, pending_count=10)
+
+    if args.save:
+        args.save.mkdir(parents=True, exist_ok=True)
+        (args.save / 'friends.html').write_text(friends_html)
+        (args.save / 'pending.html').write_text(pending_html)
+        print(f"Saved fixtures to {args.save}")
+
+    failures = 0
+    cases = [('friends page', friends_html), ('pending page', pending_html)]
+    print(f"{'case':<16}{'page KB':>10}{'legacy ms':>12}{'extractor ms':>14}{'speedup':>10}")
+    for name, html in cases:
+        new_result = extractor_scan(html)
+        start = time.perf_counter()
+        legacy_result = legacy_scan(html)
+        legacy_time = time.perf_counter() - start
+        for key in ('friends', 'links'):
+            if new_result[key] != legacy_result[key]:
+                print(f"MISMATCH in {name} ({key}): legacy found {len(legacy_result[key])}, "
+                      f"extractor found {len(new_result[key])}")
+                failures += 1
+        # The old pending pattern over-matches (it pairs a user with the next
+        # marker anywhere on the page), so only require pending users to be found
+        if legacy_result['pending'] and not new_result['pending']:
+            print(f"MISMATCH in {name} (pending): legacy found {len(legacy_result['pending'])}, extractor found none")
+            failures += 1
+
+        new_time = best_of(extractor_scan, html, args.repeat)
+        speedup = legacy_time / new_time if new_time else float('inf')
+        print(f"{name:<16}{len(html) / 1024:>10.0f}{legacy_time * 1000:>12.2f}{new_time * 1000:>14.2f}{speedup:>9.1f}x")
+
+        if new_time > legacy_time:
+            print(f"REGRESSION in {name}: extractor took {new_time * 1000:.2f} ms (legacy {legacy_time * 1000:.2f} ms)")
+            failures += 1
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
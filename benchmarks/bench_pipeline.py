@@ -0,0 +1,225 @@
+"""Benchmark SteamAutoFriend's account pipeline against the local Steam stand-in.
+
+For each queue size, a fresh process with its own data directory runs three
+passes through the real code, with all Steam traffic sent to the stand-in:
+
+  resolve  SteamAutoFriend.resolve_account() for every account (cold cache)
+  process  SteamAutoFriend.process_accounts() over the whole queue
+  check    one SteamAutoFriend.check_friend_requests() cycle, with the
+           friends/pending snapshot expired as it is between periodic checks
+
+and reports HTTP calls per account, wall-clock time and peak memory (RSS) per
+pass. The friend request pacer and the politeness spacing are
+turned off unless --keep-delays is given, so the numbers show the client's own
+cost plus the configured stand-in latency.
+
+    python -m benchmarks.bench_pipeline [--sizes 100,1000,10000] [--latency 5] [--error-rate 0.01] [--json FILE]
+    python -m benchmarks.bench_pipeline --phases process   # process with a cold resolve cache
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from .steam_standin import SteamStandin, OWN_STEAM_ID, STEAM_ID64_BASE, MISSING_PREFIX, load_pages, vanity_steam_id
+
+PHASES = ('resolve', 'process', 'check')
+
+def make_accounts(count: int) -> List[str]:
+    """A queue mixing vanity names, vanity/profile URLs, Steam IDs and unknown names."""
+    accounts = []
+    for i in range(count):
+        kind = i % 10
+        if i % 50 == 49:
+            accounts.append(f'{MISSING_PREFIX}_user_{i}')
+        elif kind < 5:
+            accounts.append(f'bench_user_{i}')
+        elif kind < 7:
+            accounts.append(str(STEAM_ID64_BASE + 2_000_000 + i))
+        elif kind < 9:
+            accounts.append(f'https://steamcommunity.com/profiles/{STEAM_ID64_BASE + 2_000_000 + i}')
+        else:
+            accounts.append(f'https://steamcommunity.com/id/bench_user_{i}')
+    return accounts
+
+def account_steam_id(account: str):
+    """The Steam ID the stand-in will resolve an account to."""
+    if account.isdigit():
+        return account
+    if '/profiles/' in account:
+        return account.rsplit('/', 1)[-1]
+    return vanity_steam_id(account.rsplit('/', 1)[-1])
+
+def initial_relationships(accounts: List[str]):
+    """Make about 5% of the queue existing friends and 5% already pending."""
+    friends, pending = set(), set()
+    for i, account in enumerate(accounts):
+        steam_id = account_steam_id(account)
+        if steam_id is None:
+            continue
+        if i % 20 == 1:
+            friends.add(steam_id)
+        elif i % 20 == 2:
+            pending.add(steam_id)
+    return friends, pending
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_child(args) -> Dict:
+    """Run the passes in this process. STEAMAUTOFRIEND_HOME must already point to a scratch directory."""
+    import requests
+
+    from steamautofriend.core.auto_friend import SteamAutoFriend
+    from steamautofriend.core.pooled_session import PooledSteamSession
+    from steamautofriend.core.steam_session import SteamSession, get_politeness_limiter
+    from steamautofriend.utils.pacer import get_write_pacer
+    from steamautofriend.utils.blacklist import get_blacklist_index, flush_blacklist
+    from .steam_standin import attach
+
+    if not args.keep_delays:
+        get_write_pacer().configure(0, 0, 0)
+        get_politeness_limiter().min_interval = 0
+
+    # Log in the way SteamAutoFriend.login() does, without the background checker
+    steam = SteamSession()
+    attach(steam.session, args.standin)
+    steam.session.cookies.set('steamLoginSecure', f'{OWN_STEAM_ID}%7C%7Cstandin', domain='.steamcommunity.com', path='/')
+    steam.session.cookies.set('sessionid', 'standin', domain='.steamcommunity.com', path='/')
+    steam.logged_in = True
+    bot = SteamAutoFriend()
+    bot.steam = steam
+    bot.logged_in = True
+    bot.pooled_steam = PooledSteamSession(steam)
+    bot.blacklist = get_blacklist_index()
+
+    accounts = make_accounts(args.size)
+    stats_url = f'{args.standin}/__standin__/stats'
+
+    def standin_calls() -> Dict[str, int]:
+        return requests.get(stats_url, timeout=10).json()['calls']
+
+    def run_resolve():
+        for account in accounts:
+            bot.resolve_account(account)
+
+    def run_check():
+        steam.relationships.invalidate()
+        bot.check_friend_requests()
+
+    passes = {'resolve': run_resolve,
+              'process': lambda: bot.process_accounts(list(accounts)),
+              'check': run_check}
+
+    results = {'size': args.size, 'phases': {}}
+    for phase in args.phases:
+        before = standin_calls()
+        start = time.perf_counter()
+        # The pipeline prints progress for every account
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            passes[phase]()
+        elapsed = time.perf_counter() - start
+        after = standin_calls()
+        calls = {route: after.get(route, 0) - before.get(route, 0) for route in after}
+        calls = {route: count for route, count in calls.items() if count}
+        total = sum(calls.values())
+        results['phases'][phase] = {
+            'seconds': elapsed,
+            'http_calls': total,
+            'calls_per_account': total / args.size,
+            'peak_rss_mb': peak_rss_mb(),
+            'calls_by_route': calls,
+        }
+
+    flush_blacklist()
+    bot.pooled_steam.close()
+    results['sent_requests'] = len(bot.sent_requests)
+    return results
+
+def run_size(size: int, standin: SteamStandin, args) -> Dict:
+    """Run one queue size in a fresh process with its own data directory."""
+    accounts = make_accounts(size)
+    friends, pending = initial_relationships(accounts)
+    standin.reset(friends=friends, pending=pending, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                  error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=size,
+                  pages=load_pages(args.pages) if args.pages else None)
+
+    with tempfile.TemporaryDirectory(prefix='saf-bench-') as home:
+        env = dict(os.environ, STEAMAUTOFRIEND_HOME=home)
+        command = [sys.executable, '-m', 'benchmarks.bench_pipeline', '--child', '--size', str(size),
+                   '--standin', standin.url, '--phases', ','.join(args.phases)]
+        if args.keep_delays:
+            command.append('--keep-delays')
+        proc = subprocess.run(command, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr[-4000:])
+            raise RuntimeError(f"Benchmark process for {size} accounts failed with exit code {proc.returncode}")
+        if args.verbose:
+            sys.stderr.write(proc.stderr)
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def print_report(results: List[Dict]) -> None:
+    print(f"{'accounts':>9} {'pass':<8}{'HTTP calls':>11}{'calls/acct':>11}{'seconds':>10}{'acct/s':>9}{'peak RSS MB':>13}")
+    for result in results:
+        size = result['size']
+        for phase in result['phases']:
+            data = result['phases'][phase]
+            rate = size / data['seconds'] if data['seconds'] else float('inf')
+            print(f"{size:>9} {phase:<8}{data['http_calls']:>11}{data['calls_per_account']:>11.2f}"
+                  f"{data['seconds']:>10.2f}{rate:>9.0f}{data['peak_rss_mb']:>13.1f}")
+        print(f"{'':>9} friend requests sent: {result['sent_requests']}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help='Comma-separated queue sizes')
+    parser.add_argument('--latency', type=float, default=5.0, help='Stand-in response latency in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random latency variation in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of friend requests rejected with error 25')
+    parser.add_argument('--phases', default=','.join(PHASES),
+                        help='Comma-separated passes to run, in order (leave out resolve to process with a cold resolve cache)')
+    parser.add_argument('--pages', help='Serve recorded friends.html/pending.html from this directory')
+    parser.add_argument('--keep-delays', action='store_true', help='Keep the friend request pacing and the politeness spacing')
+    parser.add_argument('--json', dest='json_file', help='Also write the results to this file as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Show log output from the benchmark processes')
+    # Internal: run a single size against an already running stand-in
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--standin', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.phases = [phase.strip() for phase in args.phases.split(',') if phase.strip()]
+    unknown = [phase for phase in args.phases if phase not in PHASES]
+    if unknown:
+        parser.error(f"unknown passes: {', '.join(unknown)}")
+
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = []
+    with SteamStandin() as standin:
+        for size in sizes:
+            print(f"Running {size} accounts...", file=sys.stderr)
+            results.append(run_size(size, standin, args))
+
+    print_report(results)
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump({'options': {'latency_ms': args.latency, 'jitter_ms': args.jitter,
+                                   'error_rate': args.error_rate, 'throttle_rate': args.throttle_rate,
+                                   'keep_delays': args.keep_delays},
+                       'results': results}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
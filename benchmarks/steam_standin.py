@@ -0,0 +1,385 @@
+"""Local stand-in for the parts of steamcommunity.com that SteamAutoFriend uses.
+
+Serves synthetic friends, pending and profile pages, /id/<vanity> redirects,
+the community search and ResolveVanityURL endpoints, and AddFriendAjax. Sent
+requests show up as pending on later page loads. Latency and error rates can
+be configured, and every request is counted per route.
+
+Attach a requests session to it with attach(session, standin): requests to
+steamcommunity.com and api.steampowered.com are then sent to the local server
+instead.
+
+    python -m benchmarks.steam_standin [--port 8080] [--latency 20] [--error-rate 0.01] [--pages DIR]
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+STEAM_ID64_BASE = 76561197960265728
+OWN_STEAM_ID = str(STEAM_ID64_BASE + 1)
+
+# Vanity names starting with this prefix don't exist on the stand-in
+MISSING_PREFIX = 'missing'
+
+# Hosts that attach() redirects to the stand-in
+STEAM_HOSTS = ('https://steamcommunity.com', 'https://api.steampowered.com')
+
+def vanity_steam_id(vanity: str) -> Optional[str]:
+    """The Steam ID the stand-in resolves a vanity name to."""
+    if vanity.lower().startswith(MISSING_PREFIX):
+        return None
+    return str(STEAM_ID64_BASE + 10_000_000 + zlib.crc32(vanity.lower().encode('utf-8')))
+
+def load_pages(directory) -> Dict[str, str]:
+    """Load recorded friends.html/pending.html pages to serve instead of the synthetic ones."""
+    pages = {}
+    for name in ('friends', 'pending'):
+        path = Path(directory) / f'{name}.html'
+        if path.exists():
+            pages[name] = path.read_text(encoding='utf-8')
+    return pages
+
+def _miniprofile(steam_id: str) -> int:
+    return int(steam_id) - STEAM_ID64_BASE
+
+class StandinState:
+    """Relationships and counters shared by all request handlers."""
+
+    def __init__(self, friends: Iterable[str] = (), pending: Iterable[str] = (),
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = 0, pages: Optional[Dict[str, str]] = None):
+        self.lock = threading.Lock()
+        self.friends = set(friends)
+        self.pending = set(pending)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        # Recorded pages that replace the synthetic ones ('friends', 'pending')
+        self.pages = pages or {}
+        self.calls: Counter = Counter()
+        self.bytes_sent = 0
+        self.not_modified = 0
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'calls': dict(self.calls),
+                'total_calls': sum(self.calls.values()),
+                'bytes_sent': self.bytes_sent,
+                'not_modified': self.not_modified,
+                'friends': len(self.friends),
+                'pending': len(self.pending),
+            }
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Routes stand-in requests. The server's state is in self.server.state."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'SteamStandin/1.0'
+    # Send headers and body in one write so keep-alive connections don't stall on delayed ACKs
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ('GET', re.compile(r'^/__standin__/stats$'), 'stats'),
+        ('GET', re.compile(r'^/$'), 'home'),
+        ('GET', re.compile(r'^/my/?$'), 'my'),
+        ('GET', re.compile(r'^/(?:my|profiles/\d+)/friends/pending/?$'), 'pending_page'),
+        ('GET', re.compile(r'^/profiles/\d+/friends/?$'), 'friends_page'),
+        ('GET', re.compile(r'^/profiles/(\d+)/?$'), 'profile'),
+        ('GET', re.compile(r'^/id/([^/]+)/?$'), 'vanity'),
+        ('GET', re.compile(r'^/ISteamUser/ResolveVanityURL/v1/?$'), 'resolve_vanity_api'),
+        ('POST', re.compile(r'^/search/SearchCommunityAjax$'), 'search'),
+        ('POST', re.compile(r'^/actions/AddFriendAjax$'), 'add_friend'),
+    ]
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    @property
+    def state(self) -> StandinState:
+        return self.server.state
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        self.form = {}
+        if method == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8', 'replace') if length else ''
+            self.form = {key: values[0] for key, values in parse_qs(body).items()}
+
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(url.path) if route_method == method else None
+            if match:
+                break
+        else:
+            name, match = 'not_found', None
+
+        if name != 'stats':
+            with self.state.lock:
+                self.state.calls[name] += 1
+            delay = self.state.delay()
+            if delay:
+                time.sleep(delay)
+            if self.state.roll(self.state.error_rate):
+                self._send(503, 'Service Unavailable', 'text/plain')
+                return
+
+        getattr(self, f'route_{name}')(*(match.groups() if match else ()))
+
+    def _send(self, status: int, body: str, content_type: str = 'text/html; charset=utf-8',
+              headers: Optional[Dict[str, str]] = None, etag: bool = False) -> None:
+        data = body.encode('utf-8')
+        headers = dict(headers or {})
+        if etag and status == 200:
+            tag = '"%s"' % hashlib.sha1(data).hexdigest()[:20]
+            headers['ETag'] = tag
+            if self.headers.get('If-None-Match') == tag:
+                with self.state.lock:
+                    self.state.not_modified += 1
+                status, data = 304, b''
+
+        self.send_response(status)
+        if data or status != 304:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        with self.state.lock:
+            self.state.bytes_sent += len(data)
+
+    def _send_json(self, data) -> None:
+        self._send(200, json.dumps(data), 'application/json; charset=utf-8')
+
+    def _page(self, title: str, content: str) -> str:
+        own_miniprofile = _miniprofile(OWN_STEAM_ID)
+        return (f'<html><head><title>Steam Community :: {title}</title>'
+                f'<script>g_sessionID = "standin";</script></head><body>'
+                f'<div class="profile_small_header"><div data-miniprofile="{own_miniprofile}">Me</div></div>'
+                f'{content}</body></html>')
+
+    def _friend_block(self, steam_id: str, status: str) -> str:
+        return (f'<div class="selectable friend_block_v2 persona offline" data-steamid="{steam_id}" '
+                f'data-miniprofile="{_miniprofile(steam_id)}">'
+                f'<a class="selectable_overlay" href="https://steamcommunity.com/profiles/{steam_id}"></a>'
+                f'<div class="friend_block_content">Player {steam_id}<br>'
+                f'<span class="friend_small_text">{status}</span></div></div>\n')
+
+    # Routes
+
+    def route_stats(self):
+        self._send_json(self.state.stats())
+
+    def route_not_found(self):
+        self._send(404, self._page('Error', 'Not found'))
+
+    def route_home(self):
+        self._send(200, self._page('Home', 'Welcome'))
+
+    def route_my(self):
+        self._send(200, self._page('Profile', f'<a href="https://steamcommunity.com/profiles/{OWN_STEAM_ID}">Me</a>'))
+
+    def route_friends_page(self):
+        if 'friends' in self.state.pages:
+            self._send(200, self.state.pages['friends'], etag=True)
+            return
+        with self.state.lock:
+            friends = sorted(self.state.friends)
+        blocks = ''.join(self._friend_block(steam_id, 'Last online 3 days ago') for steam_id in friends)
+        content = f'<a href="https://steamcommunity.com/my/friends/pending">Pending Invites</a>{blocks}'
+        self._send(200, self._page('Friends', content), etag=True)
+
+    def route_pending_page(self):
+        if 'pending' in self.state.pages:
+            self._send(200, self.state.pages['pending'], etag=True)
+            return
+        with self.state.lock:
+            pending = sorted(self.state.pending)
+        links = ''.join(f'<a href="https://steamcommunity.com/profiles/{steam_id}">Player {steam_id}</a>\n'
+                        for steam_id in pending)
+        content = f'<div class="friends_invites_section">{links}</div>'
+        self._send(200, self._page('Pending Invites', content), etag=True)
+
+    def route_profile(self, steam_id: str):
+        with self.state.lock:
+            is_friend = steam_id in self.state.friends
+            is_pending = steam_id in self.state.pending
+        if is_friend:
+            action = '<div class="friendRelationship">Friends</div>'
+        elif is_pending:
+            action = '<span class="btn_profile_action invite_sent">Invite Sent</span>'
+        else:
+            action = '<a class="btn_profile_action" href="javascript:AddFriend()">Add Friend</a>'
+        profile_data = json.dumps({'steamid': steam_id, 'personaname': f'Player {steam_id}'})
+        content = f'<script>g_rgProfileData = {profile_data};</script>{action}'
+        self._send(200, self._page(f'Player {steam_id}', content))
+
+    def route_vanity(self, vanity: str):
+        steam_id = vanity_steam_id(vanity)
+        if steam_id is None:
+            self._send(200, self._page('Error', 'The specified profile could not be found.'))
+        else:
+            self._send(302, '', headers={'Location': f'https://steamcommunity.com/profiles/{steam_id}'})
+
+    def route_resolve_vanity_api(self):
+        vanity = (self.query.get('vanityurl') or [''])[0]
+        steam_id = vanity_steam_id(vanity) if vanity else None
+        if steam_id is None:
+            self._send_json({'response': {'success': 42, 'message': 'No match'}})
+        else:
+            self._send_json({'response': {'steamid': steam_id, 'success': 1}})
+
+    def route_search(self):
+        text = self.form.get('text', '')
+        steam_id = vanity_steam_id(text) if text else None
+        html = ''
+        if steam_id is not None:
+            html = (f'<a href="https://steamcommunity.com/id/{text}">{text}</a>'
+                    f'<a href="https://steamcommunity.com/profiles/{steam_id}">{text}</a>')
+        self._send_json({'success': 1, 'html': html, 'search_result_count': 1 if html else 0})
+
+    def route_add_friend(self):
+        steam_id = self.form.get('steamid', '')
+        if self.state.roll(self.state.throttle_rate):
+            # Error 25: too many requests
+            self._send_json({'success': 1, 'failed_invites': [steam_id], 'failed_invites_result': [25]})
+            return
+        with self.state.lock:
+            if steam_id in self.state.pending:
+                result = 15
+            elif steam_id == OWN_STEAM_ID:
+                result = 40
+            else:
+                self.state.pending.add(steam_id)
+                result = 1
+        if result == 1:
+            self._send_json({'success': 1, 'invited': [steam_id]})
+        else:
+            self._send_json({'success': 1, 'failed_invites': [steam_id], 'failed_invites_result': [result]})
+
+class SteamStandin:
+    """The stand-in server, running on a background thread."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, **state_options):
+        self.server = ThreadingHTTPServer((host, port), StandinHandler)
+        self.server.daemon_threads = True
+        self.server.state = StandinState(**state_options)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> StandinState:
+        return self.server.state
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def reset(self, **state_options) -> None:
+        """Replace the relationships, counters and options."""
+        self.server.state = StandinState(**state_options)
+
+    def start(self) -> 'SteamStandin':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='steam-standin')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'SteamStandin':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+class StandinAdapter(HTTPAdapter):
+    """Transport adapter that sends Steam requests to the stand-in.
+
+    Only the connection target is changed: cookies, redirects and the
+    response URL still use the original steamcommunity.com address.
+    """
+
+    def __init__(self, standin_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.standin_url = standin_url.rstrip('/')
+
+    def send(self, request, **kwargs):
+        original_url = request.url
+        local = request.copy()
+        parts = urlsplit(original_url)
+        local.url = f"{self.standin_url}{parts.path or '/'}" + (f'?{parts.query}' if parts.query else '')
+        response = super().send(local, **kwargs)
+        response.url = original_url
+        response.request = request
+        return response
+
+def attach(session, standin_url: str) -> None:
+    """Route a requests session's Steam traffic to the stand-in at standin_url.
+
+    The session's connection pool sizes are kept, so connection reuse is the same as against Steam.
+    """
+    current = session.get_adapter('https://steamcommunity.com/')
+    adapter = StandinAdapter(standin_url, pool_connections=getattr(current, '_pool_connections', 10),
+                             pool_maxsize=getattr(current, '_pool_maxsize', 10))
+    for host in STEAM_HOSTS:
+        session.mount(host, adapter)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Response latency in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random latency variation in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of friend requests rejected with error 25')
+    parser.add_argument('--pages', type=Path, help='Serve recorded friends.html/pending.html from this directory')
+    args = parser.parse_args()
+
+    standin = SteamStandin(args.host, args.port, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                           pages=load_pages(args.pages) if args.pages else None)
+    print(f"Steam stand-in listening on {standin.url} (own Steam ID {OWN_STEAM_ID})")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.server.server_close()
+
+if __name__ == '__main__':
+    main()
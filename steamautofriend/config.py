@@ -2,20 +2,112 @@ import os
 from pathlib import Path
 
 # File paths
-BASE_DIR = Path(__file__).parent.parent
+# STEAMAUTOFRIEND_HOME moves all data files (session, accounts, blacklist, logs) to another directory
+BASE_DIR = Path(os.environ.get("STEAMAUTOFRIEND_HOME") or Path(__file__).parent.parent)
 ACCOUNTS_FILE = BASE_DIR / "accounts.txt"
 BLACKLIST_FILE = BASE_DIR / "blacklist.txt"
 LOG_FILE = BASE_DIR / "steam_auto_friend.log"
 SESSION_FILE = BASE_DIR / "steam_session.json"
+RESOLVE_CACHE_FILE = BASE_DIR / "resolve_cache.txt"
+STATE_DB_FILE = BASE_DIR / "steamautofriend.db"
+METRICS_FILE = BASE_DIR / "metrics.json"
+
+# Storage backend for the account queue and blacklist
+# "sqlite" keeps state in STATE_DB_FILE (accounts.txt/blacklist.txt are imported on first run
+# and can be exported with the 'export' command); "text" reads and writes the text files directly
+STORAGE_BACKEND = "sqlite"
 
 # Request settings
 MAX_DENIED_REQUESTS = 3  # How many times a user can deny a request before being blacklisted
 CHECK_INTERVAL = 60  # How often to check friend request status (in seconds)
 RETRY_COOLDOWN_MINUTES = 120  # How long to wait before retrying a denied friend request (in minutes)
+RELATIONSHIP_SNAPSHOT_TTL = 60  # How long the fetched friends/pending lists are reused before being reloaded (in seconds)
+BLACKLIST_FLUSH_INTERVAL = 5  # How long blacklist changes are batched in memory before being written to storage (in seconds)
+
+# Pending request detection
+PENDING_SOURCE_CONCURRENCY = 2  # How many pending request pages are fetched at the same time
+
+# Profile verification (direct profile checks for requests missing from the pending lists)
+PROFILE_CHECK_CONCURRENCY = 4  # Maximum number of profile pages fetched at the same time
+PROFILE_CHECK_DEADLINE = 30  # Maximum time to spend on profile checks per check cycle (in seconds)
+
+# Account resolution and preparation ahead of sending
+RESOLVE_CONCURRENCY = 4  # How many accounts are resolved at the same time while process_accounts sends requests
+RESOLVE_AHEAD = 200  # Maximum number of accounts being resolved ahead of the account being processed
+PREPARE_AHEAD = 2  # How many upcoming friend requests have their profile page loaded while waiting for the pacer (0 turns it off)
+
+# Background work and shutdown
+BACKGROUND_WORKERS = 2  # How many accounts added with 'add' are processed in the background at the same time
+BACKGROUND_QUEUE_SIZE = 100  # Maximum number of added accounts waiting for a background worker
+SHUTDOWN_TIMEOUT = 0.5  # How long exiting waits for background work to finish before saving state (in seconds)
+
+# Interactive commands
+LIST_PAGE_SIZE = 50  # How many accounts the 'list' command shows per page
+
+# Vanity URL resolution cache
+RESOLVE_CACHE_TTL_HOURS = 24 * 7  # How long a resolved vanity URL is trusted before it is looked up again (in hours)
+RESOLVE_CACHE_NEGATIVE_TTL_MINUTES = 60  # How long a failed lookup is remembered before trying again (in minutes)
 
 # Rate limiting
+# Friend requests from every thread share one pacer. It starts at one request per
+# (MIN_DELAY_BETWEEN_REQUESTS + MAX_DELAY_BETWEEN_REQUESTS) / 2 seconds on average, slows down when
+# Steam answers with error 25 or HTTP 429, and speeds back up gradually as requests go through,
+# but never beyond one request per FRIEND_REQUEST_FASTEST_INTERVAL seconds
 MIN_DELAY_BETWEEN_REQUESTS = 2  # Minimum delay between friend requests in seconds
-MAX_DELAY_BETWEEN_REQUESTS = 10  # Maximum delay between friend requests in seconds
+MAX_DELAY_BETWEEN_REQUESTS = 10  # Maximum delay between friend requests in seconds (at the starting pace)
+FRIEND_REQUEST_FASTEST_INTERVAL = (MIN_DELAY_BETWEEN_REQUESTS + MAX_DELAY_BETWEEN_REQUESTS) / 2  # Shortest average interval the pacer speeds up to; lower it (down to MIN_DELAY_BETWEEN_REQUESTS) to send faster
+FRIEND_REQUEST_SLOWEST_INTERVAL = 300  # Longest the pacer slows down to between friend requests (in seconds)
+FRIEND_REQUEST_BACKOFF = 0.5  # Factor the friend request rate is multiplied by when Steam throttles us
+FRIEND_REQUEST_RECOVERY = 0.05  # Fraction of the fastest rate regained after each friend request that goes through
+
+# Politeness limits applied to every HTTP request, from any thread
+MAX_CONCURRENT_REQUESTS = 4  # Maximum number of HTTP requests in flight at the same time
+MIN_REQUEST_INTERVAL = 0.2  # Minimum time between the start of two HTTP requests (in seconds)
+
+# Keep-alive connection pools shared by every thread
+HTTP_POOL_HOSTS = 4  # Number of hosts (steamcommunity.com, api.steampowered.com, ...) connection pools are kept for
+HTTP_POOL_SIZE = MAX_CONCURRENT_REQUESTS  # Connections kept open per host; at least MAX_CONCURRENT_REQUESTS so none are thrown away
+
+# Timeouts, deadlines and retries for HTTP requests
+CONNECT_TIMEOUT = 5  # Time allowed to connect to Steam (in seconds)
+READ_TIMEOUT = 15  # Time allowed for Steam to answer, unless ENDPOINT_READ_TIMEOUTS says otherwise (in seconds)
+# Read timeouts by endpoint, written as in the 'stats' command; the longest matching prefix applies
+ENDPOINT_READ_TIMEOUTS = {
+    'steamcommunity.com/profiles/<id>': 10,  # Profile pages
+    'steamcommunity.com/id/<vanity>': 10,
+    'steamcommunity.com/profiles/<id>/friends': 20,  # Friends list and pending requests, which can be long
+    'steamcommunity.com/my/friends': 20,
+    'steamcommunity.com/search': 10,
+    'api.steampowered.com': 10,
+}
+REQUEST_RETRIES = 2  # Extra attempts for reads that fail to connect, time out or get a 5xx answer (writes are never retried)
+RETRY_BACKOFF = 1  # Delay before the first retry, doubled for each further one and jittered (in seconds)
+CHECK_CYCLE_DEADLINE = 120  # Time the reads of one check cycle may take in total, retries included (in seconds)
+RELATIONSHIPS_DEADLINE = 60  # Time fetching the friends list or the pending requests may take (in seconds)
+RESOLVE_DEADLINE = 30  # Time resolving one account may take (in seconds)
+FRIEND_REQUEST_DEADLINE = 30  # Time the checks before one friend request may take (in seconds)
+
+# Circuit breaker: stop sending requests Steam is going to refuse, then check cheaply whether it accepts them again
+BREAKER_AUTH_COOLDOWN = 300  # Wait after the session turns out to have expired before checking it again (in seconds)
+BREAKER_CAPTCHA_COOLDOWN = 900  # Wait after Steam asks for a CAPTCHA before trying a friend request again (in seconds)
+BREAKER_THROTTLE_COOLDOWN = 300  # Wait after Steam rejects friend requests as too many before trying again (in seconds)
+BREAKER_MAX_COOLDOWN = 3600  # Longest wait; it doubles each time the check after a wait fails (in seconds)
+
+# Conditional GET cache for Steam Community pages
+PAGE_CACHE_ENABLED = True  # Revalidate cached pages with ETag/Last-Modified instead of downloading them again
+PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Maximum total size of cached page bodies (in bytes)
+
+# Instrumentation
+METRICS_ENABLED = True  # Count HTTP requests, latency and parse time per operation (shown by the 'stats' command)
+
+# Prometheus metrics exporter
+# None disables it; "http" serves /metrics on METRICS_EXPORTER_HOST:METRICS_EXPORTER_PORT;
+# "textfile" rewrites METRICS_TEXTFILE for the node_exporter textfile collector
+METRICS_EXPORTER = None
+METRICS_EXPORTER_HOST = "127.0.0.1"  # Keep the endpoint local unless it is put behind something that adds authentication
+METRICS_EXPORTER_PORT = 9877
+METRICS_TEXTFILE = BASE_DIR / "steamautofriend.prom"
+METRICS_TEXTFILE_INTERVAL = 15  # Seconds between textfile updates
 
 # Logging configuration
 LOG_LEVEL = "WARNING"  # DEBUG, INFO, WARNING, ERROR, CRITICAL
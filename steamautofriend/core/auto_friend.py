@@ -1,18 +1,40 @@
 import queue
 import threading
 import time
-from typing import List, Optional, Set, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, Iterator, List, Optional, Set, Dict, Any, Tuple
 import traceback
 
 import requests
 
-from ..config import CHECK_INTERVAL, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES
+from ..config import (
+    CHECK_INTERVAL, CHECK_CYCLE_DEADLINE, PROFILE_CHECK_DEADLINE, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES,
+    RESOLVE_CONCURRENCY, RESOLVE_AHEAD, PREPARE_AHEAD,
+    BACKGROUND_WORKERS, BACKGROUND_QUEUE_SIZE, SHUTDOWN_TIMEOUT
+)
 from ..utils.logging import logger
-from ..utils.blacklist import load_blacklist, save_blacklist, is_blacklisted
-from ..utils.accounts import load_accounts, add_account as add_account_util
-from ..utils.friends import send_friend_request, get_friends, get_pending_requests
+from ..utils.blacklist import (
+    get_blacklist_index, update_blacklist_entry, remove_from_blacklist,
+    is_blacklisted, close_blacklist, next_attempt_time, should_retry
+)
+from ..utils.accounts import (
+    iter_accounts, count_accounts, is_account_stored, get_account_steam_id, link_account,
+    add_account as add_account_util
+)
+from ..utils.friends import (
+    fetch_friends, get_pending_requests, send_friend_request, prepare_friend_request,
+    verify_pending_via_profiles, profile_check_cycle, PreparedFriendRequest
+)
 from ..utils.resolver import resolve_account, resolve_vanity_url
+from ..utils.relationships import RelationshipSnapshot
+from ..utils.scheduler import ReadinessScheduler
+from ..utils.account_status import AccountStatusTable, UNKNOWN, UNRESOLVED, classify_account
+from ..utils.metrics import instrumented, propagate
+from ..utils.request_policy import with_deadline
+from ..utils.workers import BackgroundWorkers
 from .steam_session import SteamSession
+from .pooled_session import PooledSteamSession
 
 class SteamAutoFriend:
     """Main class for managing Steam friend requests."""
@@ -20,25 +42,45 @@ class SteamAutoFriend:
     def __init__(self, verbose: bool = False):
         """Initialize the SteamAutoFriend class."""
         self.steam = None
+        self.pooled_steam = None
         self.logged_in = False
         self.blacklist = {}
         self.processing_accounts = set()  # Track accounts being processed
         self.account_queue = queue.Queue()
+        # Stored accounts ordered by when they are next due, for the periodic check
+        self.scheduler = ReadinessScheduler()
+        # Materialized status of every stored account, read by the 'list' and 'check' commands
+        self.account_status = AccountStatusTable()
+        # Accounts looked up in this run that could not be resolved, so a rebuilt table still shows them as UNRESOLVED
+        self._unresolved_accounts: Set[str] = set()
+        # Number of stored accounts the schedule and status table were built for
+        self._scheduled_count = None
+        self._sync_lock = threading.Lock()
         self.running = True
+        # Set by stop(); background loops wait on it so they wake up straight away
+        self._stop_event = threading.Event()
+        # Accounts added with 'add' are processed by a fixed number of background workers
+        self._workers = BackgroundWorkers(BACKGROUND_WORKERS, BACKGROUND_QUEUE_SIZE, name="add-account")
         self.sent_requests = set()
         self.last_check_time = 0
         self.verbose = verbose
         
-        # Cache for frequently accessed data to reduce duplicate logging
-        self._friends_cache = None
-        self._friends_cache_time = 0
-        self._pending_cache = None
-        self._pending_cache_time = 0
-        self._cache_ttl = 60  # Cache valid for 60 seconds
+        # Relationship state seen by the previous check, used to work out what changed
+        self._last_relationship_state = None
+        # Sent requests already confirmed missing via a profile check; they aren't
+        # re-verified every cycle unless their state changes again
+        self._verified_missing = set()
         
         # Friend request checker
         self.check_thread = None
         self.check_interval = CHECK_INTERVAL  # Use the value from config
+        
+        # Counters for monitoring
+        self.requests_sent = 0
+        self.requests_accepted = 0
+        self.requests_denied = 0
+        self.check_cycles = 0
+        self.last_check_duration = 0.0
     
     def login(self) -> bool:
         """Log in to Steam."""
@@ -47,8 +89,9 @@ class SteamAutoFriend:
             if self.steam.load_session():
                 logger.info("Session loaded successfully")
                 self.logged_in = True  # Make sure to set logged_in state
-                # Load blacklist after successful login
-                self.blacklist = load_blacklist()
+                self.pooled_steam = PooledSteamSession(self.steam)
+                # Use the shared in-memory blacklist after successful login
+                self.blacklist = get_blacklist_index()
                 # Start periodic check after successful login
                 self.start_periodic_check()
                 return True
@@ -60,13 +103,16 @@ class SteamAutoFriend:
             return False
 
     def load_accounts(self) -> bool:
-        """Load accounts from the accounts.txt file."""
+        """Prepare to process the stored accounts.
+        
+        The stored accounts aren't copied into the queue; the queue is cleared so
+        process_accounts() streams them from storage as it goes.
+        """
         if not self.logged_in:
             logger.error("Not logged in")
             return False
             
-        accounts = load_accounts()
-        if not accounts:
+        if next(iter_accounts(), None) is None:
             logger.info("No accounts found to process")
             return False
             
@@ -74,13 +120,10 @@ class SteamAutoFriend:
         while not self.account_queue.empty():
             self.account_queue.get()
             
-        # Add each account to the queue
-        for account in accounts:
-            self.account_queue.put(account)
-            
-        logger.info(f"Loaded {len(accounts)} accounts")
+        logger.info("Stored accounts will be streamed from storage")
         return True
     
+    @instrumented('add_account')
     def add_account(self, account: str) -> bool:
         """Add an account to process."""
         # Check format - could be a username, vanity URL, or full profile URL
@@ -91,8 +134,11 @@ class SteamAutoFriend:
         if steam_id:
             logger.info(f"Resolved account {account} to Steam ID: {steam_id}")
             
-            # Add to the accounts file
-            add_account_util(account)
+            # Add to the accounts file, and to the schedule and status table if it's a new account
+            if add_account_util(account) and self._scheduled_count is not None:
+                self.scheduler.schedule(account, time.time())
+                self.account_status.set(account, steam_id, *self._classify(steam_id))
+                self._scheduled_count += 1
             
             # Also add to the queue for processing
             self.account_queue.put(account)
@@ -100,19 +146,169 @@ class SteamAutoFriend:
             # Process the request in the background
             if steam_id not in self.processing_accounts:
                 self.processing_accounts.add(steam_id)
-                threading.Thread(target=self.process_account_in_background, 
-                                args=(steam_id, account), 
-                                daemon=True).start()
+                if not self._workers.submit(self.process_account_in_background, steam_id, account):
+                    # Too much queued (or shutting down); the periodic check will get to it
+                    self.processing_accounts.discard(steam_id)
+                    logger.warning(f"Background workers busy, {account} will be processed by the periodic check")
             
             return True
         else:
             logger.error(f"Could not resolve account {account} to a Steam ID")
             return False
     
+    def _known_relationships(self) -> Tuple[Set[str], Set[str]]:
+        """The friends and pending requests last seen, without fetching anything.
+        
+        Requests sent in this session count as pending until the checker settles them.
+        """
+        friends, pending = set(), set(self.sent_requests)
+        if self.steam is not None:
+            known_friends, known_pending = self.steam.relationships.state()
+            friends.update(known_friends)
+            pending.update(known_pending)
+        return friends, pending
+    
+    def _classify(self, steam_id: Optional[str],
+                  known: Optional[Tuple[Set[str], Set[str]]] = None) -> Tuple[str, Optional[float]]:
+        """The (status, until) of a Steam ID from what is known locally.
+        
+        known is (friends, pending) as returned by _known_relationships(), for
+        callers classifying many accounts at once.
+        """
+        friends, pending = known or self._known_relationships()
+        return classify_account(steam_id, friends, pending)
+    
+    def _refresh_status(self, steam_id: str, account: Optional[str] = None,
+                        known: Optional[Tuple[Set[str], Set[str]]] = None) -> None:
+        """Update the status table for a Steam ID after something about it changed.
+        
+        account is the stored account it was reached through, if any; it picks
+        up the Steam ID if the table didn't know it yet.
+        """
+        status, until = self._classify(steam_id, known)
+        if account and account in self.account_status:
+            self.account_status.set(account, steam_id, status, until)
+        self.account_status.set_steam_id_status(steam_id, status, until)
+    
+    def _sync_stored_accounts(self) -> None:
+        """Build the readiness schedule and the status table from the stored accounts.
+        
+        They are rebuilt only when the number of stored accounts no longer matches,
+        i.e. accounts were added or removed other than through add_account(), or
+        after accounts_changed(). Otherwise both are kept up to date as accounts
+        are checked and sent to.
+        """
+        with self._sync_lock:
+            count = count_accounts()
+            if count == self._scheduled_count:
+                return
+            now = time.time()
+            friends, pending = self._known_relationships()
+            schedule = []
+            rows = []
+            for account in iter_accounts():
+                steam_id = get_account_steam_id(account)
+                status, until = classify_account(steam_id, friends, pending, now)
+                if status == UNKNOWN and account in self._unresolved_accounts:
+                    status = UNRESOLVED
+                rows.append((account, steam_id, status, until))
+                # Accounts whose Steam ID isn't known yet are due straight away, so they get resolved
+                due = next_attempt_time(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES) if steam_id else 0.0
+                if due is not None:
+                    schedule.append((account, due))
+            self.scheduler.clear()
+            self.scheduler.schedule_many(schedule)
+            self.account_status.replace(rows)
+            self._scheduled_count = count
+            logger.info(f"Scheduled {len(self.scheduler)} of {count} stored accounts")
+    
+    def accounts_changed(self) -> None:
+        """Rebuild the schedule and status table on next use, e.g. after an account was removed."""
+        self._scheduled_count = None
+    
+    def get_account_status(self) -> AccountStatusTable:
+        """The status table of the stored accounts, brought up to date with storage first."""
+        self._sync_stored_accounts()
+        return self.account_status
+    
     def resolve_account(self, account: str) -> Optional[str]:
-        """Resolve a username, URL, or Steam ID to a Steam ID."""
-        return resolve_account(account, self.steam)
+        """Resolve a username, URL, or Steam ID to a Steam ID.
+        
+        Stored accounts are only resolved once: the Steam ID is recorded with the
+        account, which also merges accounts that turn out to be the same user.
+        """
+        steam_id = get_account_steam_id(account)
+        if steam_id:
+            return steam_id
+        steam_id = resolve_account(account, self.steam)
+        if steam_id:
+            link_account(account, steam_id)
+            self._unresolved_accounts.discard(account)
+            if account in self.account_status:
+                self._refresh_status(steam_id, account)
+        return steam_id
+    
+    def _mark_unresolved(self, account: str) -> None:
+        """Record that an account was looked up but could not be resolved."""
+        self._unresolved_accounts.add(account)
+        if account in self.account_status:
+            self.account_status.set(account, None, UNRESOLVED)
     
+    def resolve_ahead(self, accounts: Iterable[str], max_workers: int = RESOLVE_CONCURRENCY,
+                      window: int = RESOLVE_AHEAD) -> Iterator[Tuple[str, Optional[str]]]:
+        """Resolve accounts on a worker pool, ahead of the caller.
+        
+        Yields (account, steam_id) as each lookup finishes, with steam_id None
+        for accounts that couldn't be resolved. Up to window accounts are looked
+        up ahead of the caller, so a slow lookup doesn't hold up the accounts
+        behind it and the caller's own work (e.g. paced friend requests) overlaps
+        the lookups. Accounts are read from the iterable only as the window
+        has room, so a streamed queue is never read into memory.
+        """
+        def resolve(account: str) -> Optional[str]:
+            try:
+                return self.resolve_account(account)
+            except Exception as e:
+                logger.error(f"Error resolving account {account}: {str(e)}")
+                return None
+        
+        accounts = iter(accounts)
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="resolve")
+        pending = {}
+        exhausted = False
+        resolved = 0
+        unresolved = 0
+        try:
+            while True:
+                # Keep the window full
+                while not exhausted and len(pending) < window:
+                    account = next(accounts, None)
+                    if account is None:
+                        exhausted = True
+                    else:
+                        pending[executor.submit(propagate(resolve), account)] = account
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    account = pending.pop(future)
+                    steam_id = future.result()
+                    if steam_id:
+                        resolved += 1
+                    else:
+                        unresolved += 1
+                    if (resolved + unresolved) % 100 == 0:
+                        logger.info(f"Resolved {resolved + unresolved} accounts ({unresolved} unresolved), "
+                                    f"{len(pending)} lookups in progress")
+                    yield account, steam_id
+        finally:
+            # The caller stopped early or the queue is done; drop lookups that haven't started
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+            logger.info(f"Resolved {resolved} accounts, {unresolved} could not be resolved")
+        
     def resolve_vanity_url(self, vanity_url: str) -> Optional[str]:
         """Resolve a vanity URL to a Steam ID."""
         return resolve_vanity_url(vanity_url, self.steam)
@@ -127,72 +323,85 @@ class SteamAutoFriend:
             return False
         return self.steam.verify_session()
 
+    def get_relationships(self) -> RelationshipSnapshot:
+        """Get the shared friends/pending snapshot, refreshing it if it has expired."""
+        if not self.pooled_steam:
+            return self.steam.relationships.current(self.steam)
+            
+        def fetch() -> Tuple[Optional[List[str]], List[str]]:
+            # Fetch the friends and pending lists concurrently
+            try:
+                return self.pooled_steam.fetch_relationships()
+            except Exception as e:
+                logger.warning(f"Concurrent relationship refresh failed, falling back: {str(e)}")
+                return fetch_friends(self.steam), get_pending_requests(self.steam)
+                
+        # The snapshot checks whether it's stale and refreshes in one step, so
+        # callers that find it stale at the same time share one refresh
+        return self.steam.relationships.current(self.steam, fetch)
+
     def get_friends(self) -> List[str]:
         """Get the list of friends."""
-        current_time = time.time()
-        # Return cached result if available and not expired
-        if self._friends_cache and (current_time - self._friends_cache_time) < self._cache_ttl:
-            return self._friends_cache
-            
-        # Get fresh data and update cache
-        self._friends_cache = get_friends(self.steam)
-        self._friends_cache_time = current_time
-        return self._friends_cache
+        return self.get_relationships().friends_list()
         
     def get_pending_requests(self) -> List[str]:
         """Get the list of pending friend requests."""
-        current_time = time.time()
-        # Return cached result if available and not expired
-        if self._pending_cache and (current_time - self._pending_cache_time) < self._cache_ttl:
-            return self._pending_cache
-            
-        # Get fresh data and update cache
-        self._pending_cache = get_pending_requests(self.steam)
-        self._pending_cache_time = current_time
-        return self._pending_cache
+        return self.get_relationships().pending_list()
 
-    def send_friend_request(self, steam_id: str, account_name: str = None) -> bool:
-        """Send a friend request to a Steam user."""
+    def send_friend_request(self, steam_id: str, account_name: str = None,
+                            prepared: Optional[PreparedFriendRequest] = None) -> bool:
+        """Send a friend request to a Steam user, using prepared if the read side was done ahead."""
         if not self.steam or not self.logged_in:
             logger.error("Not logged in")
             return False
             
+        # Don't spend requests on a friend request Steam is going to refuse
+        if self.steam.session.breaker.is_blocking('POST'):
+            logger.info(f"Not sending friend request to {account_name or steam_id}: friend requests are paused")
+            return False
+            
         # Attempt to send the friend request
-        success = send_friend_request(self.steam, steam_id, account_name)
+        success = send_friend_request(self.steam, steam_id, account_name, prepared)
         if success:
+            if steam_id not in self.sent_requests:
+                self.requests_sent += 1
             self.sent_requests.add(steam_id)
+        self._refresh_status(steam_id, account_name)
         return success
 
-    def process_account(self, steam_id: str, account_name: str = None) -> None:
-        """Process a single account."""
+    def process_account(self, steam_id: str, account_name: str = None,
+                        prepared: Optional[PreparedFriendRequest] = None) -> None:
+        """Process a single account; prepared is its prepare_ahead() result, if any."""
         try:
             display_name = account_name or steam_id
             logger.info(f"Processing account {display_name}")
             
             # Check if already friends
             logger.info(f"Checking if already friends with {display_name}...")
-            friends = self.get_friends()
-            if steam_id in friends:
+            relationships = self.get_relationships()
+            if relationships.is_friend(steam_id):
                 logger.info(f"Already friends with {display_name}")
                 print(f"  [✓] Already friends with {display_name}")
+                self._refresh_status(steam_id, account_name)
                 return
             
             # Check if request is already pending
             logger.info(f"Checking if request is already pending for {display_name}...")
-            pending = self.get_pending_requests()
-            if steam_id in pending:
+            if relationships.is_pending(steam_id):
                 logger.info(f"Friend request already pending for {display_name}")
                 print(f"  [✓] Friend request already pending for {display_name}")
+                self._refresh_status(steam_id, account_name)
                 return
                 
             # Check if blacklisted
             if is_blacklisted(steam_id):
                 logger.info(f"{display_name} is blacklisted")
                 print(f"  [❌] {display_name} is blacklisted - won't send friend request")
+                self._refresh_status(steam_id, account_name)
                 return
                 
             # Send friend request
-            result = self.send_friend_request(steam_id, display_name)
+            result = self.send_friend_request(steam_id, display_name, prepared)
             logger.info(f"Friend request to {display_name}: {'Succeeded' if result else 'Failed'}")
             
         except Exception as e:
@@ -202,7 +411,8 @@ class SteamAutoFriend:
             if steam_id in self.processing_accounts:
                 self.processing_accounts.remove(steam_id)
             
-    def process_accounts(self, accounts: List[str] = None) -> None:
+    @instrumented('process_accounts')
+    def process_accounts(self, accounts: Optional[Iterable[str]] = None) -> None:
         """Process a list of accounts or accounts from the queue."""
         if not self.logged_in:
             logger.error("Not logged in")
@@ -212,11 +422,12 @@ class SteamAutoFriend:
             # Get a comprehensive list of pending requests first
             # This will help us avoid duplicate requests and error code 15
             logger.info("Fetching comprehensive list of pending requests...")
-            pending_requests = self.get_pending_requests()
+            relationships = self.get_relationships()
+            pending_requests = set(relationships.pending_list())
             logger.info(f"Found {len(pending_requests)} existing pending requests")
             
             # Get friends list to avoid adding people we're already friends with
-            friends = self.get_friends()
+            friends = set(relationships.friends_list())
             logger.info(f"Found {len(friends)} existing friends")
             
             # Track which accounts we should skip processing
@@ -226,179 +437,180 @@ class SteamAutoFriend:
             already_processed.update(pending_requests)
             
             # If we don't have accounts provided, load from file
-            if accounts is None or len(accounts) == 0:
+            if not accounts:
                 # Process from queue
                 if self.account_queue.empty():
-                    # Try to load accounts from file
+                    # Stream the stored accounts so work starts with the first one
+                    # instead of after the whole list has been read
                     if self.load_accounts():
-                        logger.info("Loaded accounts from file")
+                        logger.info("Processing accounts from storage")
+                        accounts_to_process = iter_accounts()
+                        total = None
                     else:
                         logger.info("No accounts in queue to process")
                         return
-                
-                count = self.account_queue.qsize()
-                logger.info(f"Found {count} accounts to process")
-                
-                # Process each account directly without using threads
-                accounts_to_process = []
-                while not self.account_queue.empty():
-                    accounts_to_process.append(self.account_queue.get())
-                
-                # Track how many accounts were processed and how many succeeded
-                processed_count = 0
-                success_count = 0
-                skipped_count = 0
-                
-                # Track account name to ID mapping for easier reference later
-                if not hasattr(self, 'account_mapping'):
-                    self.account_mapping = {}
-                
-                for account in accounts_to_process:
-                    if not self.running:
-                        logger.info("Stopping account processing")
-                        break
-                        
-                    processed_count += 1
-                    logger.info(f"Processing account {processed_count} of {len(accounts_to_process)}: {account}")
+                else:
+                    count = self.account_queue.qsize()
+                    logger.info(f"Found {count} accounts to process")
                     
-                    try:
-                        steam_id = self.resolve_account(account)
-                        if steam_id:
-                            logger.info(f"Resolved account {account} to Steam ID: {steam_id}")
-                            
-                            # Update account mapping
-                            self.account_mapping[account] = steam_id
-                            
-                            # Check if we should skip this account
-                            if steam_id in already_processed:
-                                skip_reason = ""
-                                if steam_id in friends:
-                                    skip_reason = "already friends"
-                                elif steam_id in pending_requests:
-                                    skip_reason = "request already pending"
-                                elif steam_id in self.sent_requests:
-                                    skip_reason = "request already sent in this session"
-                                elif steam_id in self.processing_accounts:
-                                    skip_reason = "currently being processed in another thread"
-                                else:
-                                    skip_reason = "previously processed"
-                                
-                                logger.info(f"Skipping account {account} ({steam_id}): {skip_reason}")
-                                print(f"  [ℹ️] Skipping {account}: {skip_reason}")
-                                skipped_count += 1
-                                continue
-                            
-                            # Also check if blacklisted and should not retry
-                            from ..utils.blacklist import should_retry
-                            from ..config import MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES
-                            if not should_retry(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES):
-                                logger.info(f"Skipping account {account} ({steam_id}): blacklisted or in cooldown")
-                                print(f"  [ℹ️] Skipping {account}: blacklisted or in cooldown")
-                                skipped_count += 1
-                                continue
-                            
-                            # Now, process the account
-                            try:
-                                # Add to the already processed set to prevent duplicates within this batch
-                                already_processed.add(steam_id)
-                                
-                                # Process the account but catch any exceptions so we can continue
-                                self.process_account(steam_id, account)
-                                success_count += 1
-                            except Exception as e:
-                                logger.error(f"Error processing account {account}: {str(e)}")
-                                traceback.print_exc()
-                                # Continue with next account despite errors
-                                continue
-                        else:
-                            logger.error(f"Could not resolve account {account}")
-                    except Exception as e:
-                        logger.error(f"Error resolving account {account}: {str(e)}")
-                        traceback.print_exc()
-                        continue
-                
-                logger.info(f"Finished processing {processed_count} accounts. Successful: {success_count}, Skipped: {skipped_count}, Failed: {processed_count - success_count - skipped_count}")
+                    accounts_to_process = []
+                    while not self.account_queue.empty():
+                        accounts_to_process.append(self.account_queue.get())
+                    total = len(accounts_to_process)
             else:
-                # Process provided accounts
-                logger.info(f"Processing {len(accounts)} provided accounts")
-                
-                # Track how many accounts were processed and how many succeeded
-                processed_count = 0
-                success_count = 0
-                skipped_count = 0
+                # Process provided accounts (any iterable, e.g. a stream from iter_accounts())
+                accounts_to_process = accounts
+                total = len(accounts) if hasattr(accounts, '__len__') else None
+                logger.info(f"Processing {total if total is not None else 'streamed'} provided accounts")
                 
-                # Track account name to ID mapping for easier reference later
-                if not hasattr(self, 'account_mapping'):
-                    self.account_mapping = {}
+            self._send_to_accounts(accounts_to_process, total, friends, pending_requests, already_processed)
+            
+        except Exception as e:
+            logger.error(f"Error processing accounts: {str(e)}")
+            traceback.print_exc()
+            
+    def _send_to_accounts(self, accounts: Iterable[str], total: Optional[int], friends: Set[str],
+                          pending_requests: Set[str], already_processed: Set[str]) -> None:
+        """Send friend requests to a stream of accounts as a pipeline.
+        
+        Accounts are resolved ahead of the sender (resolve_ahead) and the next
+        few that need a request have their profile page loaded while the sender
+        waits for its turn from the write pacer (prepare_ahead), so a pass takes
+        about one pacing interval per request instead of the interval plus the reads.
+        """
+        # Track how many accounts were processed and how many succeeded
+        counts = {'processed': 0, 'success': 0, 'skipped': 0}
+        
+        # Track account name to ID mapping for easier reference later
+        if not hasattr(self, 'account_mapping'):
+            self.account_mapping = {}
+            
+        def targets() -> Iterator[Tuple[str, str]]:
+            """The resolved accounts that need a friend request, minus the ones to skip."""
+            for account, steam_id in self.resolve_ahead(accounts):
+                if not self.running:
+                    logger.info("Stopping account processing")
+                    break
+                if self.steam.session.breaker.is_blocking('GET'):
+                    # Lookups fail while the session has expired, so don't report every account as unresolvable
+                    logger.warning("Stopping account processing: the Steam session has expired")
+                    break
+                    
+                counts['processed'] += 1
+                logger.info(f"Processing account {counts['processed']}{f' of {total}' if total else ''}: {account}")
                 
-                for account in accounts:
-                    if not self.running:
-                        logger.info("Stopping account processing")
-                        break
+                try:
+                    if not steam_id:
+                        logger.error(f"Could not resolve account {account}")
+                        print(f"  [❌] Could not resolve {account}")
+                        self._mark_unresolved(account)
+                        continue
+                        
+                    logger.info(f"Resolved account {account} to Steam ID: {steam_id}")
                     
-                    processed_count += 1
-                    logger.info(f"Processing account {processed_count} of {len(accounts)}: {account}")
+                    # Update account mapping
+                    self.account_mapping[account] = steam_id
                     
-                    try:    
-                        steam_id = self.resolve_account(account)
-                        if steam_id:
-                            logger.info(f"Resolved account {account} to Steam ID: {steam_id}")
-                            
-                            # Update account mapping
-                            self.account_mapping[account] = steam_id
-                            
-                            # Check if we should skip this account
-                            if steam_id in already_processed:
-                                skip_reason = ""
-                                if steam_id in friends:
-                                    skip_reason = "already friends"
-                                elif steam_id in pending_requests:
-                                    skip_reason = "request already pending"
-                                elif steam_id in self.sent_requests:
-                                    skip_reason = "request already sent in this session"
-                                elif steam_id in self.processing_accounts:
-                                    skip_reason = "currently being processed in another thread"
-                                else:
-                                    skip_reason = "previously processed"
-                                
-                                logger.info(f"Skipping account {account} ({steam_id}): {skip_reason}")
-                                print(f"  [ℹ️] Skipping {account}: {skip_reason}")
-                                skipped_count += 1
-                                continue
-                            
-                            # Also check if blacklisted and should not retry
-                            from ..utils.blacklist import should_retry
-                            from ..config import MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES
-                            if not should_retry(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES):
-                                logger.info(f"Skipping account {account} ({steam_id}): blacklisted or in cooldown")
-                                print(f"  [ℹ️] Skipping {account}: blacklisted or in cooldown")
-                                skipped_count += 1
-                                continue
-                            
-                            try:
-                                # Add to the already processed set to prevent duplicates within this batch
-                                already_processed.add(steam_id)
-                                
-                                # Process the account but catch any exceptions so we can continue
-                                self.process_account(steam_id, account)
-                                success_count += 1
-                            except Exception as e:
-                                logger.error(f"Error processing account {account}: {str(e)}")
-                                traceback.print_exc()
-                                # Continue with next account despite errors
-                                continue
+                    # Check if we should skip this account
+                    if steam_id in already_processed:
+                        skip_reason = ""
+                        if steam_id in friends:
+                            skip_reason = "already friends"
+                        elif steam_id in pending_requests:
+                            skip_reason = "request already pending"
+                        elif steam_id in self.sent_requests:
+                            skip_reason = "request already sent in this session"
+                        elif steam_id in self.processing_accounts:
+                            skip_reason = "currently being processed in another thread"
                         else:
-                            logger.error(f"Could not resolve account {account}")
-                    except Exception as e:
-                        logger.error(f"Error resolving account {account}: {str(e)}")
-                        traceback.print_exc()
+                            skip_reason = "previously processed"
+                        
+                        logger.info(f"Skipping account {account} ({steam_id}): {skip_reason}")
+                        print(f"  [ℹ️] Skipping {account}: {skip_reason}")
+                        counts['skipped'] += 1
                         continue
+                    
+                    # Also check if blacklisted and should not retry
+                    if not should_retry(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES):
+                        logger.info(f"Skipping account {account} ({steam_id}): blacklisted or in cooldown")
+                        print(f"  [ℹ️] Skipping {account}: blacklisted or in cooldown")
+                        counts['skipped'] += 1
+                        continue
+                except Exception as e:
+                    logger.error(f"Error resolving account {account}: {str(e)}")
+                    traceback.print_exc()
+                    continue
+                    
+                # Add to the already processed set to prevent duplicates within this batch
+                already_processed.add(steam_id)
+                yield account, steam_id
                 
-                logger.info(f"Finished processing {processed_count} accounts. Successful: {success_count}, Skipped: {skipped_count}, Failed: {processed_count - success_count - skipped_count}")
+        for account, steam_id, prepared in self.prepare_ahead(targets()):
+            if not self.running:
+                break
+            if self.steam.session.breaker.is_blocking('POST'):
+                # Every remaining account would fail the same way; the periodic check picks them up later
+                logger.warning("Stopping account processing: Steam is refusing requests for now")
+                print("  [!] Stopping: the remaining accounts will be processed once Steam accepts requests again")
+                break
+            try:
+                # Process the account but catch any exceptions so we can continue
+                self.process_account(steam_id, account, prepared)
+                counts['success'] += 1
+            except Exception as e:
+                logger.error(f"Error processing account {account}: {str(e)}")
+                traceback.print_exc()
+                # Continue with next account despite errors
+                continue
+                
+        logger.info(f"Finished processing {counts['processed']} accounts. Successful: {counts['success']}, "
+                    f"Skipped: {counts['skipped']}, Failed: {counts['processed'] - counts['success'] - counts['skipped']}")
+        
+    def prepare_ahead(self, targets: Iterable[Tuple[str, str]],
+                      window: int = PREPARE_AHEAD) -> Iterator[Tuple[str, str, Optional[PreparedFriendRequest]]]:
+        """Do the read side of upcoming friend requests while earlier ones are being sent.
+        
+        Takes (account, steam_id) pairs and yields (account, steam_id, prepared)
+        in the same order. Up to window targets are prepared (checked and their
+        profile page loaded) on a worker pool ahead of the caller, so those
+        reads happen while the caller waits for the write pacer rather than
+        after it. prepared is None if preparing raised; send_friend_request()
+        then does it itself.
+        """
+        if window <= 0:
+            for account, steam_id in targets:
+                yield account, steam_id, None
+            return
             
-        except Exception as e:
-            logger.error(f"Error processing accounts: {str(e)}")
-            traceback.print_exc()
+        def prepare(account: str, steam_id: str) -> PreparedFriendRequest:
+            return prepare_friend_request(self.steam, steam_id, account)
+            
+        targets = iter(targets)
+        executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="prepare")
+        pending = deque()
+        try:
+            while True:
+                # Keep the window full
+                while len(pending) < window:
+                    target = next(targets, None)
+                    if target is None:
+                        break
+                    pending.append((target, executor.submit(propagate(prepare), *target)))
+                if not pending:
+                    break
+                    
+                (account, steam_id), future = pending.popleft()
+                try:
+                    prepared = future.result()
+                except Exception as e:
+                    logger.error(f"Error preparing friend request to {account}: {str(e)}")
+                    prepared = None
+                yield account, steam_id, prepared
+        finally:
+            # The caller stopped early; drop preparations that haven't started
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
             
     def process_account_in_background(self, steam_id: str, account_name: str = None) -> None:
         """Process a single account in a background thread."""
@@ -411,8 +623,16 @@ class SteamAutoFriend:
             # Remove the account from the processing set
             self.processing_accounts.discard(steam_id)
             
+    @instrumented('check_friend_requests')
+    @with_deadline(CHECK_CYCLE_DEADLINE)
+    @profile_check_cycle(PROFILE_CHECK_DEADLINE)
     def check_friend_requests(self) -> None:
-        """Check the status of sent friend requests and process ready accounts."""
+        """Check the status of sent friend requests and process ready accounts.
+        
+        The profile checks of the whole cycle (those made while fetching the
+        pending list and those for requests gone missing) share one
+        PROFILE_CHECK_DEADLINE.
+        """
         if not self.logged_in:
             logger.warning("Not logged in, cannot check friend requests")
             return
@@ -420,35 +640,67 @@ class SteamAutoFriend:
         current_time = time.time()
         self.last_check_time = current_time  # Update the last check time
         
+        # While the session is known to have expired every page would be the login page
+        if self.steam.session.breaker.is_blocking('GET'):
+            logger.warning("Session expired, skipping this check")
+            return
+            
         try:
-            # Get friends and pending requests - use our enhanced get_pending_requests
-            # which checks multiple sources
-            friends = self.get_friends()
-            pending_requests = self.get_pending_requests()
+            # Get friends and pending requests from the shared snapshot, which uses
+            # our enhanced get_pending_requests to check multiple sources
+            relationships = self.get_relationships()
+            friends = set(relationships.friends_list())
+            pending_requests = set(relationships.pending_list())
+            
+            # Work out what changed since the last check so only those IDs need
+            # expensive verification
+            diff = relationships.diff(self._last_relationship_state)
+            self._last_relationship_state = relationships.state()
             
             # Log what we found for debugging purposes
             logger.info(f"Checking status of {len(self.sent_requests)} sent requests")
-            logger.info(f"Found {len(friends)} friends and {len(pending_requests)} pending requests")
+            logger.info(f"Found {len(friends)} friends and {len(pending_requests)} pending requests ({diff} since last check)")
             
             # Track how many failed attempts before considering a request as denied
             max_consecutive_failures = 3  # Increased from 2 to 3 to be more conservative
             
+            # Requests missing from both lists get a direct profile check. One already
+            # verified missing is only checked again if its own state changed since the
+            # last check, or if this check would confirm the denial. Do these up front
+            # through a bounded pool so a batch of slow profile pages costs roughly one
+            # page load rather than the sum of all of them
+            changed = diff.changed()
+            
+            def needs_profile_check(steam_id: str) -> bool:
+                if steam_id in friends or steam_id in pending_requests:
+                    return False
+                if steam_id not in self._verified_missing or steam_id in changed:
+                    return True
+                entry = self.blacklist.get(steam_id)
+                return entry is not None and entry.get('consecutive_missing', 0) + 1 >= max_consecutive_failures
+                
+            to_verify = [steam_id for steam_id in sorted(self.sent_requests) if needs_profile_check(steam_id)]
+            profile_results = verify_pending_via_profiles(self.steam, to_verify)
+            
             # Check each sent request
-            for steam_id in list(self.sent_requests):
+            checked_requests = sorted(self.sent_requests)
+            for steam_id in checked_requests:
                 # If request was accepted
                 if steam_id in friends:
                     logger.info(f"Friend request to {steam_id} was accepted")
                     self.sent_requests.remove(steam_id)
+                    self.requests_accepted += 1
+                    self._verified_missing.discard(steam_id)
                     # If they were in blacklist (temporarily), remove them
                     if steam_id in self.blacklist and self.blacklist[steam_id]['count'] < MAX_DENIED_REQUESTS:
                         logger.info(f"Removing {steam_id} from blacklist as they accepted the request")
-                        del self.blacklist[steam_id]
-                        save_blacklist(self.blacklist)
+                        remove_from_blacklist(steam_id)
                     continue
                     
                 # If request is still pending
                 if steam_id in pending_requests:
                     logger.info(f"Friend request to {steam_id} is still pending")
+                    self._verified_missing.discard(steam_id)
                     # Reset any temporary failure counts as the request is still pending
                     if steam_id in self.blacklist and not self.blacklist[steam_id].get('failure_is_confirmed', True):
                         # This was probably a temporary issue, so reset the count
@@ -456,7 +708,7 @@ class SteamAutoFriend:
                         self.blacklist[steam_id]['count'] = 0  # Reset to 0 completely
                         self.blacklist[steam_id]['consecutive_missing'] = 0
                         self.blacklist[steam_id]['failure_is_confirmed'] = False
-                        save_blacklist(self.blacklist)
+                        update_blacklist_entry(steam_id, self.blacklist[steam_id])
                     continue
                 
                 # Request was not found in the pending list or friends list
@@ -466,23 +718,25 @@ class SteamAutoFriend:
                 # 3. The Steam API failed to return complete data
                 
                 # IMPORTANT ENHANCEMENT: Before concluding it's missing, do a direct profile check
-                # This is a redundant safety check to catch cases where our pending detection missed it
-                try:
-                    profile_url = f"https://steamcommunity.com/profiles/{steam_id}"
-                    profile_resp = self.steam.session.get(profile_url, timeout=10)
-                    if profile_resp.status_code == 200:
-                        # Check if request is shown as pending on the profile page
-                        if "invite_sent" in profile_resp.text or "Pending..." in profile_resp.text:
-                            logger.info(f"Friend request to {steam_id} is still pending (verified via profile)")
-                            # Reset any temporary failure counts
-                            if steam_id in self.blacklist and not self.blacklist[steam_id].get('failure_is_confirmed', True):
-                                self.blacklist[steam_id]['count'] = 0
-                                self.blacklist[steam_id]['consecutive_missing'] = 0
-                                self.blacklist[steam_id]['failure_is_confirmed'] = False
-                                save_blacklist(self.blacklist)
-                            continue
-                except Exception as e:
-                    logger.warning(f"Error checking profile directly for {steam_id}: {str(e)}")
+                # This is a redundant safety check to catch cases where our pending detection missed it.
+                # If it was already verified missing in an earlier check and its state didn't change
+                # since, the extra page load is skipped - except on the check that would confirm the denial
+                profile_result = profile_results.get(steam_id)
+                if steam_id not in profile_results:
+                    logger.debug(f"Friend request to {steam_id} still missing (already verified via profile)")
+                elif profile_result:
+                    # Request is shown as pending on the profile page
+                    logger.info(f"Friend request to {steam_id} is still pending (verified via profile)")
+                    self._verified_missing.discard(steam_id)
+                    # Reset any temporary failure counts
+                    if steam_id in self.blacklist and not self.blacklist[steam_id].get('failure_is_confirmed', True):
+                        self.blacklist[steam_id]['count'] = 0
+                        self.blacklist[steam_id]['consecutive_missing'] = 0
+                        self.blacklist[steam_id]['failure_is_confirmed'] = False
+                        update_blacklist_entry(steam_id, self.blacklist[steam_id])
+                    continue
+                elif profile_result is False:
+                    self._verified_missing.add(steam_id)
                 
                 # Check how many times we've seen this request "missing"
                 consecutive_missing = 0
@@ -501,11 +755,13 @@ class SteamAutoFriend:
                         self.blacklist[steam_id]['failure_is_confirmed'] = True
                         self.blacklist[steam_id]['reason'] = 'Friend request denied'
                         self.sent_requests.remove(steam_id)
+                        self._verified_missing.discard(steam_id)
+                        self.requests_denied += 1
                         print(f"  [ℹ️] Friend request to {steam_id} was confirmed denied or ignored after {consecutive_missing} checks")
                     else:
                         logger.info(f"Friend request to {steam_id} not found, but not confirmed denied yet ({consecutive_missing}/{max_consecutive_failures})")
                     
-                    save_blacklist(self.blacklist)
+                    update_blacklist_entry(steam_id, self.blacklist[steam_id])
                 else:
                     # First time this request is missing
                     logger.info(f"Friend request to {steam_id} not found, marking for potential denial (1/{max_consecutive_failures})")
@@ -518,7 +774,7 @@ class SteamAutoFriend:
                         'failure_is_confirmed': False,
                         'last_attempt': current_time
                     }
-                    save_blacklist(self.blacklist)
+                    update_blacklist_entry(steam_id, self.blacklist[steam_id])
                 
                 # Only retry sending the request if it's confirmed denied and not blacklisted
                 if steam_id in self.blacklist and self.blacklist[steam_id].get('failure_is_confirmed', False) and not is_blacklisted(steam_id):
@@ -539,76 +795,98 @@ class SteamAutoFriend:
                         # Reset the consecutive missing counter
                         self.blacklist[steam_id]['consecutive_missing'] = 0
                         self.blacklist[steam_id]['failure_is_confirmed'] = False
-                        save_blacklist(self.blacklist)
+                        update_blacklist_entry(steam_id, self.blacklist[steam_id])
+            
+            # Bring the status table up to date for the requests just checked and
+            # anyone whose friend or pending state changed since the last check
+            known = self._known_relationships()
+            for steam_id in changed.union(checked_requests):
+                self._refresh_status(steam_id, known=known)
             
             # ENHANCEMENT: Process accounts from accounts.txt that are ready
             try:
-                # Load accounts from accounts.txt
-                from ..utils.accounts import load_accounts
-                accounts = load_accounts()
+                # Accounts come off the readiness schedule, so accounts in cooldown
+                # or blacklisted aren't looked at again until they are due
+                self._sync_stored_accounts()
+                logger.info(f"Checking stored accounts ({len(self.scheduler)} scheduled)")
+                processed_count = 0
+                cooldown_seconds = RETRY_COOLDOWN_MINUTES * 60
+                
+                # Create a set of accounts we've already processed to avoid duplicates
+                already_processed = set(self.processing_accounts)
+                already_processed.update(self.sent_requests)
+                already_processed.update(pending_requests)
                 
-                if accounts:
-                    logger.info(f"Found {len(accounts)} accounts to check")
-                    processed_count = 0
+                # Track account name to ID mapping for easier reference later
+                if not hasattr(self, 'account_mapping'):
+                    self.account_mapping = {}
+                
+                while self.running:
+                    # Skip if we've already processed too many accounts in this check
+                    if processed_count >= 2:  # Limit to 2 accounts per check to avoid rate limiting
+                        logger.info(f"Rate limiting: Will process remaining accounts in next check")
+                        break
+                        
+                    # Steam is refusing friend requests for now; the accounts stay scheduled
+                    if self.steam.session.breaker.is_blocking('POST'):
+                        logger.info("Friend requests are paused, will process accounts in a later check")
+                        break
                     
-                    # Create a set of accounts we've already processed to avoid duplicates
-                    already_processed = set(self.processing_accounts)
-                    already_processed.update(self.sent_requests)
-                    already_processed.update(friends)
-                    already_processed.update(pending_requests)
+                    account = self.scheduler.pop_due(current_time)
+                    if account is None:
+                        break
                     
-                    # Track account name to ID mapping for easier reference later
-                    if not hasattr(self, 'account_mapping'):
-                        self.account_mapping = {}
+                    # The account may have been removed since it was scheduled
+                    if not is_account_stored(account):
+                        self.account_status.remove(account)
+                        continue
                     
-                    for account in accounts:
-                        # Skip if we've already processed too many accounts in this check
-                        if processed_count >= 2:  # Limit to 2 accounts per check to avoid rate limiting
-                            logger.info(f"Rate limiting: Will process remaining accounts in next check")
-                            break
-                        
-                        # Resolve the account to a Steam ID
-                        steam_id = self.resolve_account(account)
-                        if not steam_id:
-                            logger.warning(f"Could not resolve account: {account}")
-                            continue
-                        
-                        # Store account name to ID mapping
-                        self.account_mapping[account] = steam_id
-                        
-                        # Skip if we've already processed this account or it's already in a processed state
-                        if steam_id in already_processed:
-                            logger.debug(f"Already processed or in progress: {account}")
-                            continue
-                        
-                        # Skip if already friends
-                        if steam_id in friends:
-                            logger.debug(f"Already friends with {account}")
-                            continue
-                        
-                        # Skip if request already pending
-                        if steam_id in pending_requests:
-                            logger.debug(f"Friend request already pending for {account}")
-                            continue
-                        
-                        # Skip if blacklisted and should not retry
-                        from ..utils.blacklist import should_retry
-                        from ..config import MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES
-                        if not should_retry(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES):
-                            logger.debug(f"Account {account} is blacklisted or in cooldown")
-                            continue
-                        
-                        # Process the account - add to already_processed to prevent duplicates
-                        already_processed.add(steam_id)
-                        
-                        # Process the account
-                        logger.info(f"Sending friend request to {account}")
-                        if self.send_friend_request(steam_id, account):
-                            processed_count += 1
-                            self.sent_requests.add(steam_id)
+                    # Resolve the account to a Steam ID
+                    steam_id = self.resolve_account(account)
+                    if not steam_id:
+                        logger.warning(f"Could not resolve account: {account}")
+                        self._mark_unresolved(account)
+                        self.scheduler.schedule(account, current_time + cooldown_seconds)
+                        continue
                     
-                    if processed_count > 0:
-                        logger.info(f"Automatically processed {processed_count} accounts")
+                    # Store account name to ID mapping
+                    self.account_mapping[account] = steam_id
+                    self._refresh_status(steam_id, account, known)
+                    
+                    # Already friends - nothing left to do for this account
+                    if steam_id in friends:
+                        logger.debug(f"Already friends with {account}")
+                        continue
+                    
+                    # Skip if we've already processed this account, it's in progress or a
+                    # request is pending; look again once that request has had time to settle
+                    if steam_id in already_processed:
+                        logger.debug(f"Already processed, in progress or pending: {account}")
+                        self.scheduler.schedule(account, current_time + cooldown_seconds)
+                        continue
+                    
+                    # Skip if blacklisted for good, or wait until the cooldown is over
+                    due = next_attempt_time(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES)
+                    if due is None:
+                        logger.debug(f"Account {account} is blacklisted")
+                        continue
+                    if due > current_time:
+                        logger.debug(f"Account {account} is in cooldown")
+                        self.scheduler.schedule(account, due)
+                        continue
+                    
+                    # Process the account - add to already_processed to prevent duplicates
+                    already_processed.add(steam_id)
+                    
+                    # Process the account
+                    logger.info(f"Sending friend request to {account}")
+                    if self.send_friend_request(steam_id, account):
+                        processed_count += 1
+                        self.sent_requests.add(steam_id)
+                    self.scheduler.schedule(account, current_time + cooldown_seconds)
+                
+                if processed_count > 0:
+                    logger.info(f"Automatically processed {processed_count} accounts")
             
             except Exception as e:
                 logger.error(f"Error processing accounts: {str(e)}")
@@ -616,33 +894,66 @@ class SteamAutoFriend:
         except Exception as e:
             logger.error(f"Error checking friend requests: {str(e)}")
             traceback.print_exc()
+        finally:
+            self.check_cycles += 1
+            self.last_check_duration = time.time() - current_time
             
     def start_periodic_check(self) -> None:
         """Start periodic checking of friend requests."""
+        if self.check_thread is not None and self.check_thread.is_alive():
+            return
+            
         def check_loop():
-            while self.running:
+            # Waits end as soon as stop() is called
+            while not self._stop_event.is_set():
                 try:
                     if not self.logged_in:
                         logger.warning("Not logged in, waiting before next check...")
-                        time.sleep(60)  # Wait a minute before retrying
+                        self._stop_event.wait(60)  # Wait a minute before retrying
                         continue
                         
                     logger.debug("Checking friend requests...")
                     self.check_friend_requests()
                     # Note: last_check_time is now updated in check_friend_requests
-                    time.sleep(CHECK_INTERVAL)
+                    self._stop_event.wait(CHECK_INTERVAL)
                 except Exception as e:
                     logger.error(f"Error in periodic check: {str(e)}")
-                    time.sleep(CHECK_INTERVAL)
+                    self._stop_event.wait(CHECK_INTERVAL)
+            logger.debug("Periodic check stopped")
         
         # Set initial last_check_time to current time
         self.last_check_time = time.time()
         
         # Start the check loop in a background thread
-        threading.Thread(target=check_loop, daemon=True).start()
+        self.check_thread = threading.Thread(target=check_loop, daemon=True, name="periodic-check")
+        self.check_thread.start()
         logger.info("Started periodic friend request check")
         
-    def stop(self) -> None:
-        """Stop all background processing."""
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        """Stop all background processing and save state.
+        
+        Background loops wake up straight away, queued background work is
+        dropped, and HTTP requests that haven't been sent yet are cancelled.
+        Work still running after timeout seconds is left to finish on its
+        own; the blacklist is flushed and then written through, so its updates
+        are saved either way.
+        """
+        if self._stop_event.is_set():
+            return
         self.running = False
+        self._stop_event.set()
         logger.info("Stopping SteamAutoFriend")
+        deadline = time.monotonic() + timeout
+        
+        if self.steam is not None:
+            self.steam.session.cancel()
+        self._workers.shutdown(timeout)
+        if self.check_thread is not None:
+            self.check_thread.join(max(0.0, deadline - time.monotonic()))
+            if self.check_thread.is_alive():
+                logger.warning("Periodic check still running at shutdown")
+        
+        # Write any batched blacklist changes before exiting
+        close_blacklist()
+        if self.pooled_steam:
+            self.pooled_steam.close()
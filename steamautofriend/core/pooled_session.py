@@ -0,0 +1,70 @@
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from ..config import MAX_CONCURRENT_REQUESTS
+from ..utils.logging import logger
+from ..utils.metrics import propagate
+from ..utils.friends import fetch_friends, get_friends, get_pending_requests, send_friend_request
+from ..utils.resolver import resolve_account, resolve_vanity_url
+
+class PooledSteamSession:
+    """Thread-pool façade over a SteamSession.
+
+    Each operation submits the existing blocking implementation to a small
+    worker pool and returns a concurrent.futures.Future, so independent reads
+    can overlap. It is not asynchronous I/O: every request still holds a
+    worker thread while it waits on Steam, and still goes through the
+    process-wide politeness limiter, so it never raises the request rate
+    beyond those limits.
+    """
+
+    def __init__(self, steam_session, max_workers: int = MAX_CONCURRENT_REQUESTS):
+        self.steam = steam_session
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix="steam-pool")
+
+    def _submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Run a blocking call on the worker pool."""
+        # Keep the work attributed to the operation that submitted it
+        return self._executor.submit(propagate(functools.partial(func, *args, **kwargs)))
+
+    def get(self, url: str, **kwargs) -> Future:
+        """GET a URL with the underlying session."""
+        return self._submit(self.steam.session.get, url, **kwargs)
+
+    def get_friends(self) -> Future:
+        """Get the list of friends for the logged-in account."""
+        return self._submit(get_friends, self.steam)
+
+    def get_pending_requests(self) -> Future:
+        """Get the list of pending friend requests."""
+        return self._submit(get_pending_requests, self.steam)
+
+    def resolve_account(self, account: str) -> Future:
+        """Resolve a username, URL, or Steam ID to a Steam ID."""
+        return self._submit(resolve_account, account, self.steam)
+
+    def resolve_vanity_url(self, vanity_url: str) -> Future:
+        """Resolve a vanity URL to a Steam ID."""
+        return self._submit(resolve_vanity_url, vanity_url, self.steam)
+
+    def send_friend_request(self, steam_id: str, account_name: str = None) -> Future:
+        """Send a friend request to a Steam user."""
+        return self._submit(send_friend_request, self.steam, steam_id, account_name)
+
+    def fetch_relationships(self) -> Tuple[Optional[List[str]], List[str]]:
+        """Fetch the friends list and pending requests side by side and wait for both.
+
+        friends is None if it couldn't be fetched. Pass this method to
+        RelationshipSnapshot.refresh() or current() to update the snapshot, so
+        the refresh is coordinated with other callers.
+        """
+        friends = self._submit(fetch_friends, self.steam)
+        pending = self.get_pending_requests()
+        return friends.result(), pending.result()
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        self._executor.shutdown(wait=False)
+        logger.debug("Pooled Steam session closed")
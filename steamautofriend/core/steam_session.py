@@ -1,24 +1,326 @@
+import threading
+import time
 import requests
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
 
 from ..utils.logging import logger
 from ..utils.session import load_session, save_session
 from ..utils.friends import get_friends as get_friends_util
 from ..utils.friends import get_pending_requests as get_pending_requests_util
+from ..utils.friends import send_friend_request as send_friend_request_util
+from ..utils.resolver import resolve_account as resolve_account_util
 from ..utils.accounts import extract_steam_id_from_url
+from ..utils.relationships import RelationshipSnapshot
+from ..utils.page_cache import PageCache
+from ..utils.metrics import get_metrics, instrumented
+from ..utils.pacer import get_write_pacer, PacingCancelled
+from ..utils.request_policy import RequestPolicy, DeadlineExceeded, is_paced
+from ..utils.circuit_breaker import CircuitBreaker, AUTH, THROTTLED
+from ..config import MAX_CONCURRENT_REQUESTS, MIN_REQUEST_INTERVAL, PAGE_CACHE_ENABLED, HTTP_POOL_HOSTS, HTTP_POOL_SIZE
+
+class RequestCancelled(requests.exceptions.RequestException):
+    """Raised instead of sending a request once its session has been cancelled."""
+
+class PolitenessLimiter:
+    """Process-wide limit on concurrent HTTP requests and on how quickly they start.
+    
+    Shared by every thread and worker pool, so adding concurrency
+    elsewhere never increases the load we put on Steam beyond these limits.
+    """
+    
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_REQUESTS, min_interval: float = MIN_REQUEST_INTERVAL):
+        self.min_interval = min_interval
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._spacing_lock = threading.Lock()
+        self._next_start = 0.0
+        
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> None:
+        """Wait for a request slot and the request's start time.
+        
+        If cancel_event is set while waiting, the wait ends early with RequestCancelled.
+        """
+        if cancel_event is None:
+            self._slots.acquire()
+        else:
+            while not self._slots.acquire(timeout=0.05):
+                if cancel_event.is_set():
+                    raise RequestCancelled("Request cancelled while waiting for a slot")
+        # Reserve the next start time, then sleep outside the lock
+        with self._spacing_lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.min_interval
+        if start > now:
+            if cancel_event is None:
+                time.sleep(start - now)
+            elif cancel_event.wait(start - now):
+                self._slots.release()
+                raise RequestCancelled("Request cancelled while waiting to start")
+                
+    def release(self) -> None:
+        self._slots.release()
+        
+    def __enter__(self):
+        self.acquire()
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+_politeness_limiter = PolitenessLimiter()
+
+def get_politeness_limiter() -> PolitenessLimiter:
+    """Get the process-wide politeness limiter."""
+    return _politeness_limiter
+
+class LockedCookieJar(RequestsCookieJar):
+    """Cookie jar that any number of threads can share.
+    
+    http.cookiejar already locks the jar while cookies are stored from a
+    response or added to a request, but requests' dict-like reads (get, items,
+    merging into a request) walk it unlocked and can fail with "dictionary
+    changed size during iteration" while another thread's response sets a
+    cookie. Here they walk a copy taken under the jar's lock.
+    """
+    
+    def __iter__(self):
+        with self._cookies_lock:
+            cookies = list(super().__iter__())
+        return iter(cookies)
+        
+    def clear(self, domain=None, path=None, name=None):
+        with self._cookies_lock:
+            super().clear(domain, path, name)
+            
+    def copy(self):
+        new_jar = LockedCookieJar()
+        new_jar.set_policy(self.get_policy())
+        new_jar.update(self)
+        return new_jar
+
+def _retry_after(response) -> Optional[float]:
+    """The Retry-After delay of a response in seconds, if it gives one in seconds."""
+    value = response.headers.get('Retry-After', '')
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+def _is_login_redirect(response) -> bool:
+    """Whether Steam sent a request to its login page, i.e. the session isn't logged in."""
+    if response.is_redirect:
+        return '/login' in response.headers.get('Location', '')
+    return urlsplit(response.url).path.startswith('/login')
+
+class PoliteSession(requests.Session):
+    """requests.Session that sends every request through the politeness limiter.
+    
+    Timeouts, operation deadlines and retries come from the session's
+    RequestPolicy, so no request can wait on Steam indefinitely and only reads
+    are sent more than once.
+    
+    Friend requests (the PACED_PATHS endpoints in request_policy) also wait
+    for their turn from the process-wide write pacer, and HTTP 429 answers to
+    them slow the pacer down. Other writes, like the search POSTs used to
+    resolve accounts, only read and aren't paced.
+    
+    The session's circuit breaker opens when Steam redirects to its login
+    page or answers HTTP 429 (and when callers report a CAPTCHA or error 25),
+    after which requests Steam would refuse fail fast with CircuitOpen.
+    
+    GET requests are also revalidated against the page cache: if we have a copy
+    of the page, Steam is asked for it conditionally and the cached body is
+    reused when the answer is 304 Not Modified.
+    
+    One session is shared by the checker, the background workers and the
+    interactive prompt. Connections are kept alive in a pool per host sized
+    for MAX_CONCURRENT_REQUESTS, so requests reuse them instead of paying for
+    a new TLS handshake, and cookies live in a LockedCookieJar.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.cookies = LockedCookieJar()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=max(HTTP_POOL_SIZE, MAX_CONCURRENT_REQUESTS))
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.page_cache = PageCache() if PAGE_CACHE_ENABLED else None
+        # Set by cancel(); requests and pacing waits check it so shutdown isn't held up
+        self.cancelled = threading.Event()
+        self.write_pacer = get_write_pacer()
+        self.policy = RequestPolicy()
+        self.breaker = CircuitBreaker(probe=self._probe_login)
+    
+    def cancel(self) -> None:
+        """Cancel this session: waiting requests give up and later ones fail with RequestCancelled.
+        
+        Requests already on the wire run to completion (or their timeout).
+        """
+        self.cancelled.set()
+    
+    def request(self, method, url, *args, **kwargs):
+        if self.cancelled.is_set():
+            raise RequestCancelled(f"Session cancelled, not sending {method} {url}")
+        self.breaker.check(method, url)
+        # A request without a timeout could block its thread, and exiting, indefinitely
+        timeout_positional = len(args) >= 7
+        if not timeout_positional:
+            kwargs['timeout'] = self._timeout(method, url, kwargs.get('timeout'))
+        key = None
+        entry = None
+        if (self.page_cache is not None and not args and method.upper() == 'GET'
+                and not kwargs.get('stream')):
+            key = self.page_cache.make_key(url, kwargs.get('params'), self.cookies.get('steamLoginSecure', '') or '')
+            entry = self.page_cache.get(key)
+            if entry is not None:
+                headers = dict(kwargs.get('headers') or {})
+                for name, value in self.page_cache.conditional_headers(entry).items():
+                    headers.setdefault(name, value)
+                kwargs['headers'] = headers
+                
+        # Wait for the write's turn before taking a request slot, so pacing doesn't hold one up
+        paced = is_paced(method, url)
+        if paced:
+            try:
+                self.write_pacer.acquire(self.cancelled)
+            except PacingCancelled:
+                raise RequestCancelled(f"Session cancelled, not sending {method} {url}")
+                
+        limiter = get_politeness_limiter()
+        attempts = self.policy.attempts(method)
+        attempt = 0
+        while True:
+            response = None
+            error = None
+            limiter.acquire(self.cancelled)
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            finally:
+                limiter.release()
+                
+            attempt += 1
+            if attempt >= attempts or not self.policy.should_retry(response, error):
+                break
+            delay = self.policy.retry_delay(attempt)
+            if delay is None:
+                break
+            reason = str(error) if error is not None else f"HTTP {response.status_code}"
+            logger.debug(f"Retrying {method} {url} in {delay:.1f} seconds ({reason})")
+            if response is not None:
+                response.close()
+            if self.cancelled.wait(delay):
+                raise RequestCancelled(f"Session cancelled, not retrying {method} {url}")
+            if not timeout_positional:
+                # Whatever the deadline has left after the backoff
+                kwargs['timeout'] = self._timeout(method, url, kwargs['timeout'])
+            metrics = get_metrics()
+            if metrics.enabled:
+                metrics.record_retry(method, url)
+                
+        if error is not None:
+            raise error
+        if response.status_code == 429:
+            if paced:
+                self.write_pacer.throttled(_retry_after(response))
+            self.breaker.trip(THROTTLED, _retry_after(response))
+        elif _is_login_redirect(response):
+            self.breaker.trip(AUTH)
+            
+        if key is not None:
+            response = self.page_cache.handle_response(key, entry, response)
+        return response
+    
+    def _probe_login(self) -> bool:
+        """The circuit breaker's probe: one GET of /my, which redirects to the login page if the session has expired."""
+        response = self.get('https://steamcommunity.com/my', allow_redirects=False)
+        return response.status_code < 400 and not _is_login_redirect(response)
+        
+    def _timeout(self, method, url, requested):
+        """The policy's timeout for a request, counting the reads it turns away at the deadline."""
+        try:
+            return self.policy.timeout(method, url, requested)
+        except DeadlineExceeded:
+            metrics = get_metrics()
+            if metrics.enabled:
+                metrics.record_deadline_exceeded()
+            raise
+    
+    def pool_stats(self) -> List[Dict[str, Any]]:
+        """Connection pool use per host.
+        
+        For each host: 'size' (connections kept open), 'in_use' (connections
+        checked out by a request), 'idle' (open and waiting), 'requests' and
+        'connections_opened', so requests - connections_opened were sent on a
+        reused connection.
+        """
+        stats = []
+        for adapter in {id(adapter): adapter for adapter in self.adapters.values()}.values():
+            pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+            if pools is None:
+                continue
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                if pool.pool is None:
+                    # Closed
+                    continue
+                with pool.pool.mutex:
+                    # The queue holds what isn't checked out: open connections, and None
+                    # for each one that hasn't been opened yet
+                    waiting = len(pool.pool.queue)
+                    idle = sum(1 for conn in pool.pool.queue if conn is not None)
+                stats.append({
+                    'host': pool.host,
+                    'size': pool.pool.maxsize,
+                    'in_use': max(0, pool.pool.maxsize - waiting),
+                    'idle': idle,
+                    'requests': pool.num_requests,
+                    'connections_opened': pool.num_connections,
+                })
+        return stats
+        
+    def send(self, request, **kwargs):
+        # Every HTTP exchange, including redirect hops, passes through here
+        if self.cancelled.is_set():
+            raise RequestCancelled(f"Session cancelled, not sending {request.method} {request.url}")
+        metrics = get_metrics()
+        if not metrics.enabled:
+            return super().send(request, **kwargs)
+            
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception as e:
+            metrics.record_http(request.method, request.url, None, (time.perf_counter() - start) * 1000,
+                                timed_out=isinstance(e, requests.exceptions.Timeout))
+            raise
+        size = 0 if kwargs.get('stream') else len(response.content)
+        metrics.record_http(request.method, request.url, response.status_code, (time.perf_counter() - start) * 1000,
+                            size, from_cache=response.status_code == 304)
+        return response
 
 class SteamSession:
     """Class representing a Steam session."""
     
     def __init__(self):
         """Initialize the Steam session."""
-        self.session = requests.Session()
+        self.session = PoliteSession()
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         }
         self.session.headers.update(self.headers)
         self.logged_in = False
+        # Shared friends/pending view used by every sender and checker
+        self.relationships = RelationshipSnapshot()
     
+    @instrumented('load_session')
     def load_session(self) -> bool:
         """Load a saved Steam session."""
         try:
@@ -55,7 +357,7 @@ class SteamSession:
             # Visit the Steam Community home page to get any missing cookies
             try:
                 logger.info("Visiting Steam Community to refresh cookies...")
-                home_resp = self.session.get('https://steamcommunity.com/', timeout=10)
+                home_resp = self.session.get('https://steamcommunity.com/')
                 logger.debug(f"Home page status: {home_resp.status_code}")
                 
                 # Check if we got a sessionid cookie now
@@ -89,6 +391,7 @@ class SteamSession:
             traceback.print_exc()
             return False
             
+    @instrumented('verify_session')
     def verify_session(self) -> bool:
         """Verify that the session is valid."""
         # Check if we have the required cookies
@@ -108,9 +411,7 @@ class SteamSession:
         # Check if we can access Steam
         try:
             logger.debug("Checking access to Steam profile page...")
-            response = self.session.get('https://steamcommunity.com/my', 
-                                        allow_redirects=False,
-                                        timeout=10)
+            response = self.session.get('https://steamcommunity.com/my', allow_redirects=False)
             
             # Log response details
             logger.debug(f"Profile check response: {response.status_code}")
@@ -129,7 +430,7 @@ class SteamSession:
                     
                     # Try to follow the redirect
                     try:
-                        redirect_resp = self.session.get(redirect_url, timeout=10)
+                        redirect_resp = self.session.get(redirect_url)
                         logger.debug(f"Redirect response: {redirect_resp.status_code}")
                         
                         # If we successfully followed the redirect and didn't get redirected to login
@@ -181,6 +482,14 @@ class SteamSession:
         """Get the list of pending friend requests."""
         return get_pending_requests_util(self)
             
+    def resolve_account(self, account: str) -> Optional[str]:
+        """Resolve a username, URL, or Steam ID to a Steam ID."""
+        return resolve_account_util(account, self)
+            
+    def send_friend_request(self, steam_id: str, account_name: str = None) -> bool:
+        """Send a friend request to a Steam user."""
+        return send_friend_request_util(self, steam_id, account_name)
+            
     def get_own_steam_id(self) -> Optional[str]:
         """Get the Steam ID of the logged-in account."""
         try:
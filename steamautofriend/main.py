@@ -6,12 +6,17 @@ import logging
 
 from .utils.logging import setup_logging, logger
 from .utils.session import create_session_file
-from .utils.accounts import load_accounts, remove_account as remove_account_util, clean_accounts_file
-from .utils.blacklist import load_blacklist
+from .utils.accounts import get_account_aliases, remove_account as remove_account_util
+from .utils.blacklist import load_blacklist, flush_blacklist, reload_blacklist
+from .utils.storage import import_text_files, export_text_files
+from .utils.metrics import get_metrics
+from .utils.exporter import start_exporter, stop_exporter
+from .utils.pacer import get_write_pacer
+from .utils.circuit_breaker import DESCRIPTIONS
+from .utils.account_status import STATUSES, READY, COOLDOWN, BLACKLISTED, UNKNOWN
 from .config import (
     CHECK_INTERVAL, 
-    RETRY_COOLDOWN_MINUTES, 
-    MAX_DENIED_REQUESTS
+    LIST_PAGE_SIZE
 )
 from .core.auto_friend import SteamAutoFriend
 
@@ -25,9 +30,12 @@ def print_help():
     print("  login - Test if your session is valid")
     print("  add [account] - Add a new account to process (username, URL, or Steam ID)")
     print("  remove [account or number] - Remove an account from the queue")
-    print("  list - List all accounts in the queue")
+    print("  list [status] [page] - List the accounts in the queue with their status (ready, cooldown, pending, friend, blacklisted, unknown, unresolved)")
     print("  process - Process all accounts in the queue")
     print("  check - Check the status of sent friend requests")
+    print("  import - Merge accounts.txt and blacklist.txt into the state database")
+    print("  export - Write the state database out to accounts.txt and blacklist.txt")
+    print("  stats [json [file] | reset] - Show HTTP requests and timings per operation, dump them as JSON, or reset them")
     print("  help - Show this help message")
     print("  exit - Exit the program")
 
@@ -40,75 +48,141 @@ def show_status(bot):
         print(f"  Accounts in queue: {bot.account_queue.qsize()}")
         print(f"  Active friend requests: {len(bot.sent_requests)}")
         print(f"  Blacklisted users: {len(bot.blacklist)}")
+        pacer = get_write_pacer().stats()
+        if pacer['enabled']:
+            print(f"  Friend request pace: one every {pacer['interval']:.1f} seconds ({pacer['throttles']} throttled)")
+        breaker = bot.steam.session.breaker.stats()
+        if breaker['state'] != 'closed':
+            print(f"  Paused: {DESCRIPTIONS[breaker['reason']]} (trying again in {breaker['retry_in']:.0f} seconds)")
     else:
         print(f"  Session valid: No")
 
-def list_accounts(bot):
-    """List all accounts in the queue."""
-    # First clean the accounts file to remove duplicates
-    clean_accounts_file()
-    
-    # Get the accounts (now without duplicates)
-    accounts = load_accounts()
+def show_stats(bot=None):
+    """Show per-operation request counts and timings."""
+    metrics = get_metrics()
+    if not metrics.enabled:
+        print("\nInstrumentation is disabled (set METRICS_ENABLED = True in config.py)")
+        return
+        
+    operations = metrics.operation_rows()
+    endpoints = metrics.endpoint_rows()
+    if not operations:
+        print("\nNo operations recorded yet")
+        return
+        
+    print("\nOperations (HTTP requests and parsing include nested operations):")
+    print(f"  {'Operation':<28}{'Calls':>7}{'Avg ms':>9}{'p95 ms':>9}{'HTTP':>7}{'HTTP/call':>10}{'KB':>9}{'Parse ms':>10}")
+    for name, stats in operations:
+        calls = stats.calls
+        avg = stats.latency.total / calls if calls else 0
+        per_call = f"{stats.http_requests / calls:.1f}" if calls else "-"
+        print(f"  {name:<28}{calls:>7}{avg:>9.0f}{stats.latency.quantile(0.95):>9.0f}{stats.http_requests:>7}"
+              f"{per_call:>10}{stats.bytes_downloaded / 1024:>9.0f}{stats.parse_ms:>10.1f}")
+        
+    print("\nHTTP endpoints:")
+    print(f"  {'Endpoint':<52}{'Requests':>9}{'Errors':>8}{'Timeouts':>9}{'Retries':>8}{'Cached':>8}"
+          f"{'Avg ms':>9}{'p95 ms':>9}{'KB':>9}")
+    for label, stats in endpoints:
+        avg = stats.latency.total / stats.requests if stats.requests else 0
+        print(f"  {label:<52}{stats.requests:>9}{stats.errors:>8}{stats.timeouts:>9}{stats.retries:>8}{stats.cache_hits:>8}"
+              f"{avg:>9.0f}{stats.latency.quantile(0.95):>9.0f}{stats.bytes_downloaded / 1024:>9.0f}")
+        
+    expired = [(name, stats.deadlines_exceeded) for name, stats in operations if stats.deadlines_exceeded]
+    if expired:
+        print("\nReads not sent because the operation's deadline had passed: "
+              + ", ".join(f"{name} {count}" for name, count in expired))
+        
+    pacer = get_write_pacer().stats()
+    if pacer['enabled']:
+        print(f"\nFriend request pacer: one request every {pacer['interval']:.1f} seconds "
+              f"(up to {pacer['ceiling_per_minute']:.1f}/min), {pacer['writes']} accepted, "
+              f"{pacer['throttles']} throttled, {pacer['waiting']} waiting")
+        
+    if bot and bot.steam:
+        pools = bot.steam.session.pool_stats()
+        if pools:
+            print("\nConnection pools:")
+            for pool in pools:
+                reused = pool['requests'] - pool['connections_opened']
+                print(f"  {pool['host']}: {pool['in_use']}/{pool['size']} connections in use, "
+                      f"{pool['idle']} idle, {reused} of {pool['requests']} requests on a reused connection")
+        
+    if bot and bot.steam and bot.steam.session.page_cache is not None:
+        cache = bot.steam.session.page_cache.stats()
+        print(f"\nPage cache: {cache['hits']} hits, {cache['misses']} misses, "
+              f"{cache['bytes_saved'] / 1024:.0f} KB saved, {cache['entries']} pages cached")
+
+def format_account_status(entry, current_time):
+    """Describe an account's status for the account list."""
+    status = entry['status']
+    if status == COOLDOWN:
+        remaining = max(1, int((entry['until'] - current_time) / 60))
+        return f"[COOLDOWN: {remaining} min remaining]"
+    return f"[{status}]"
+
+def list_accounts(bot, status=None, page=1):
+    """List the accounts in the queue, a page at a time, optionally only those in one state.
     
-    # Get blacklist data to check for accounts in cooldown
-    blacklist = load_blacklist()
+    Statuses come from the bot's status table, so nothing is looked up on Steam.
+    """
+    table = bot.get_account_status()
+    if not len(table):
+        print("\nNo accounts in queue")
+        return
+        
     current_time = time.time()
-    cooldown_seconds = RETRY_COOLDOWN_MINUTES * 60
+    counts = table.counts(current_time)
+    summary = ", ".join(f"{count} {name.lower()}" for name, count in counts.items() if count)
+    print(f"\nAccounts in queue: {len(table)} ({summary})")
     
-    if accounts:
-        print("\nCurrent accounts in queue:")
-        for i, account in enumerate(accounts, start=1):
-            # Attempt to resolve the account to a Steam ID
-            steam_id = None
-            if bot.logged_in:
-                try:
-                    steam_id = bot.resolve_account(account)
-                except Exception:
-                    # If we can't resolve, just continue without Steam ID
-                    pass
-                
-            # Basic account display
-            account_info = f"  {i}. {account}"
-            
-            # Check if this account is in cooldown
-            if steam_id and steam_id in blacklist:
-                # Get blacklist info
-                bl_entry = blacklist[steam_id]
-                denied_count = bl_entry.get('count', 0)
-                last_attempt = bl_entry.get('last_attempt', 0)
-                
-                # Calculate remaining cooldown time
-                remaining_cooldown = 0
-                if current_time - last_attempt < cooldown_seconds:
-                    remaining_cooldown = int((cooldown_seconds - (current_time - last_attempt)) / 60)
-                
-                # Check if permanently blacklisted
-                if MAX_DENIED_REQUESTS > 0 and denied_count >= MAX_DENIED_REQUESTS:
-                    account_info += f" [BLACKLISTED: {denied_count} denials]"
-                # Check if in cooldown
-                elif remaining_cooldown > 0:
-                    account_info += f" [COOLDOWN: {remaining_cooldown} min remaining]"
-                else:
-                    account_info += f" [PROCESSED: {denied_count} attempts]"
-            elif steam_id:
-                account_info += " [READY]"
-            
-            print(account_info)
-            
-        # Show when the next check will occur
-        if hasattr(bot, 'last_check_time') and bot.last_check_time:
-            next_check_in = CHECK_INTERVAL - (current_time - bot.last_check_time)
-            if next_check_in < 0:
-                next_check_in = "now"
-            else:
-                next_check_in = f"~{int(next_check_in)} seconds"
-                
-            print(f"\nNext friend request check: {next_check_in}")
+    total, entries = table.page(status, (page - 1) * LIST_PAGE_SIZE, LIST_PAGE_SIZE, current_time)
+    pages = max(1, (total + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE)
+    label = f"{status.lower()} accounts" if status else "accounts"
+    if not entries:
+        print(f"No {label} on page {page} ({total} {label} on {pages} page{'s' if pages > 1 else ''})")
+        return
+        
+    # Other spellings of the same users
+    aliases = get_account_aliases()
+    
+    first = (page - 1) * LIST_PAGE_SIZE + 1
+    print(f"\nShowing {label} {first}-{first + len(entries) - 1} of {total} (page {page} of {pages}):")
+    for entry in entries:
+        account = entry['account']
+        account_info = f"  {entry['number']}. {account}"
+        if account in aliases:
+            account_info += f" (also added as: {', '.join(aliases[account])})"
+        account_info += f" {format_account_status(entry, current_time)}"
+        print(account_info)
+    if page < pages:
+        print(f"Use 'list {status.lower() + ' ' if status else ''}{page + 1}' for the next page")
+        
+    # Show when the next check will occur
+    if hasattr(bot, 'last_check_time') and bot.last_check_time:
+        next_check_in = CHECK_INTERVAL - (current_time - bot.last_check_time)
+        if next_check_in < 0:
+            next_check_in = "now"
         else:
-            print(f"\nNext friend request check: scheduled every {CHECK_INTERVAL} seconds")
+            next_check_in = f"~{int(next_check_in)} seconds"
+            
+        print(f"\nNext friend request check: {next_check_in}")
     else:
-        print("\nNo accounts in queue")
+        print(f"\nNext friend request check: scheduled every {CHECK_INTERVAL} seconds")
+
+def parse_list_args(args):
+    """Parse the arguments of the 'list' command into (status, page); None if they are invalid."""
+    status = None
+    page = 1
+    for arg in args:
+        if arg.isdigit() and int(arg) > 0:
+            page = int(arg)
+        elif arg.upper() in STATUSES:
+            status = arg.upper()
+        else:
+            print(f"Unknown list option: {arg}")
+            print(f"Usage: list [{'|'.join(s.lower() for s in STATUSES)}] [page]")
+            return None
+    return status, page
 
 def process_args(bot, args):
     """Process command-line arguments."""
@@ -131,6 +205,7 @@ def process_args(bot, args):
             if i + 1 < len(args):
                 account = args[i + 1]
                 remove_account_util(account)
+                bot.accounts_changed()
                 i += 2
             else:
                 logger.error("--remove requires an account name")
@@ -170,6 +245,38 @@ def process_command(command_args, main_bot=None):
             print("Failed to create session file")
         return
         
+    # Import/export of the text files doesn't need a session
+    if command == 'import':
+        if import_text_files():
+            reload_blacklist()
+            print("Imported accounts.txt and blacklist.txt")
+        else:
+            print("Text storage backend in use - nothing to import")
+        return
+        
+    if command == 'export':
+        flush_blacklist()
+        if export_text_files():
+            print("Exported state to accounts.txt and blacklist.txt")
+        else:
+            print("Text storage backend in use - files are already up to date")
+        return
+        
+    # Stats are process-wide and don't need a session
+    if command == 'stats':
+        if len(args) > 1 and args[1].lower() == 'reset':
+            get_metrics().reset()
+            print("Statistics reset")
+        elif len(args) > 1 and args[1].lower() == 'json':
+            path = get_metrics().dump(args[2] if len(args) > 2 else None)
+            if path:
+                print(f"Statistics written to {path}")
+            else:
+                print("Failed to write statistics")
+        else:
+            show_stats(main_bot)
+        return
+        
     # If we have a main bot instance passed in, use it
     if main_bot and main_bot.logged_in:
         bot = main_bot
@@ -241,56 +348,21 @@ def process_command(command_args, main_bot=None):
                 
             print(f"\nNext automatic check will occur {next_check_time}")
         
-        # Get and process any accounts from accounts.txt that are ready
-        accounts = load_accounts()
-        if accounts:
-            cooldown_accounts = []
-            blacklisted_accounts = []
-            ready_accounts = []
-            
-            # Check each account status
-            for account in accounts:
-                try:
-                    steam_id = bot.resolve_account(account)
-                    if not steam_id:
-                        continue
-                        
-                    # Check if already friends
-                    if steam_id in friends_after:
-                        continue
-                        
-                    # Check if already has pending request
-                    if steam_id in pending_after:
-                        continue
-                        
-                    # Check blacklist status
-                    if steam_id in blacklist_after:
-                        bl_entry = blacklist_after[steam_id]
-                        denied_count = bl_entry.get('count', 0)
-                        last_attempt = bl_entry.get('last_attempt', 0)
-                        
-                        # Calculate remaining cooldown time
-                        if current_time - last_attempt < RETRY_COOLDOWN_MINUTES * 60:
-                            cooldown_accounts.append(account)
-                        elif MAX_DENIED_REQUESTS > 0 and denied_count >= MAX_DENIED_REQUESTS:
-                            blacklisted_accounts.append(account)
-                        else:
-                            ready_accounts.append(account)
-                    else:
-                        ready_accounts.append(account)
-                except Exception:
-                    # Skip accounts that can't be resolved
-                    pass
-                    
-            if ready_accounts:
-                print(f"\nFound {len(ready_accounts)} accounts ready for processing")
+        # Summarize the stored accounts from the status table the check just updated
+        table = bot.get_account_status()
+        if len(table):
+            counts = table.counts()
+            if counts[READY]:
+                print(f"\nFound {counts[READY]} accounts ready for processing")
                 print("Use the 'process' command to send friend requests to these accounts")
             else:
                 print("\nNo accounts are ready to be processed at this time")
-                if cooldown_accounts:
-                    print(f"- {len(cooldown_accounts)} accounts are in cooldown")
-                if blacklisted_accounts:
-                    print(f"- {len(blacklisted_accounts)} accounts are blacklisted")
+                if counts[COOLDOWN]:
+                    print(f"- {counts[COOLDOWN]} accounts are in cooldown")
+                if counts[BLACKLISTED]:
+                    print(f"- {counts[BLACKLISTED]} accounts are blacklisted")
+                if counts[UNKNOWN]:
+                    print(f"- {counts[UNKNOWN]} accounts haven't been looked up yet")
             
     elif command == 'add':
         if len(args) < 2:
@@ -312,9 +384,12 @@ def process_command(command_args, main_bot=None):
             
         account = args[1]
         remove_account_util(account)
+        bot.accounts_changed()
         
     elif command == 'list':
-        list_accounts(bot)
+        list_args = parse_list_args(args[1:])
+        if list_args:
+            list_accounts(bot, *list_args)
             
     else:
         print(f"Unknown command: {command}")
@@ -336,7 +411,7 @@ def run_interactive_mode(bot):
         import readline
         # Enable tab completion if readline is available
         def completer(text, state):
-            commands = ['help', 'session', 'login', 'add', 'remove', 'list', 'process', 'check', 'exit', 'quit']
+            commands = ['help', 'session', 'login', 'add', 'remove', 'list', 'process', 'check', 'import', 'export', 'stats', 'exit', 'quit']
             matches = [cmd for cmd in commands if cmd.startswith(text)]
             if state < len(matches):
                 return matches[state]
@@ -441,8 +516,16 @@ def main():
         print("Login failed. No valid session found or session has expired.")
         print("Please use the 'session' command to create a new session.")
     
+    # Publish metrics if an exporter is configured
+    start_exporter(auto_friend)
+    
     # Run in interactive mode
-    run_interactive_mode(auto_friend)
+    try:
+        run_interactive_mode(auto_friend)
+    finally:
+        # Also reached on Ctrl+C; stop() does nothing if 'exit' already stopped the bot
+        auto_friend.stop()
+        stop_exporter(auto_friend)
 
 # Start the program if run directly
 if __name__ == "__main__":
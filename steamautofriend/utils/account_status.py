@@ -0,0 +1,173 @@
+import threading
+import time
+from typing import Any, Container, Dict, Iterable, List, Optional, Tuple
+
+from ..config import MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES
+from .blacklist import next_attempt_time
+
+# Account states, in the order they are listed in summaries
+READY = 'READY'
+COOLDOWN = 'COOLDOWN'
+PENDING = 'PENDING'
+FRIEND = 'FRIEND'
+BLACKLISTED = 'BLACKLISTED'
+UNKNOWN = 'UNKNOWN'  # Not looked up yet
+UNRESOLVED = 'UNRESOLVED'  # Looked up, but could not be resolved to a Steam ID
+STATUSES = (READY, COOLDOWN, PENDING, FRIEND, BLACKLISTED, UNKNOWN, UNRESOLVED)
+
+def classify_account(steam_id: Optional[str], friends: Container[str], pending: Container[str],
+                     now: Optional[float] = None) -> Tuple[str, Optional[float]]:
+    """Work out the (status, until) of an account from what is known locally.
+
+    until is the Unix time a COOLDOWN ends and None for the other states.
+    Nothing is fetched from Steam: friends and pending are whatever the caller
+    last saw, and cooldowns come from the in-memory blacklist. An account
+    without a Steam ID is UNKNOWN; callers whose lookup failed record
+    UNRESOLVED themselves.
+    """
+    if not steam_id:
+        return UNKNOWN, None
+    if steam_id in friends:
+        return FRIEND, None
+    if steam_id in pending:
+        return PENDING, None
+    due = next_attempt_time(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES)
+    if due is None:
+        return BLACKLISTED, None
+    now = time.time() if now is None else now
+    if due > now:
+        return COOLDOWN, due
+    return READY, None
+
+class AccountStatusTable:
+    """Materialized status of every stored account.
+
+    Kept up to date by the checker and the senders as they learn about
+    changes, so listing accounts is a read of this table rather than a round
+    of lookups. Entries are kept in storage order, which is also the numbering
+    the 'remove' command uses. A COOLDOWN whose time has passed reads as READY.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # account -> {'steam_id', 'status', 'until', 'updated'}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # steam_id -> accounts listed with it
+        self._by_steam_id: Dict[str, List[str]] = {}
+        self.built_at = 0.0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, account: str) -> bool:
+        with self._lock:
+            return account in self._entries
+
+    def _index(self, account: str, steam_id: Optional[str]) -> None:
+        """Add an account to the Steam ID index. Must be called with the lock held."""
+        if steam_id:
+            accounts = self._by_steam_id.setdefault(steam_id, [])
+            if account not in accounts:
+                accounts.append(account)
+
+    def _unindex(self, account: str, steam_id: Optional[str]) -> None:
+        """Remove an account from the Steam ID index. Must be called with the lock held."""
+        accounts = self._by_steam_id.get(steam_id) if steam_id else None
+        if accounts and account in accounts:
+            accounts.remove(account)
+            if not accounts:
+                del self._by_steam_id[steam_id]
+
+    def replace(self, entries: Iterable[Tuple[str, Optional[str], str, Optional[float]]]) -> None:
+        """Replace the table with (account, steam_id, status, until) rows, in storage order."""
+        now = time.time()
+        table = {}
+        by_steam_id: Dict[str, List[str]] = {}
+        for account, steam_id, status, until in entries:
+            table[account] = {'steam_id': steam_id, 'status': status, 'until': until, 'updated': now}
+            if steam_id:
+                by_steam_id.setdefault(steam_id, []).append(account)
+        with self._lock:
+            self._entries = table
+            self._by_steam_id = by_steam_id
+            self.built_at = now
+
+    def set(self, account: str, steam_id: Optional[str], status: str, until: Optional[float] = None) -> None:
+        """Record the status of one account, adding it if it isn't in the table."""
+        with self._lock:
+            entry = self._entries.get(account)
+            if entry is not None:
+                self._unindex(account, entry['steam_id'])
+            self._entries[account] = {'steam_id': steam_id, 'status': status, 'until': until, 'updated': time.time()}
+            self._index(account, steam_id)
+
+    def set_steam_id_status(self, steam_id: str, status: str, until: Optional[float] = None) -> int:
+        """Record the status of every account listed with a Steam ID. Returns how many there are."""
+        with self._lock:
+            accounts = self._by_steam_id.get(steam_id, [])
+            now = time.time()
+            for account in accounts:
+                entry = self._entries[account]
+                entry['status'] = status
+                entry['until'] = until
+                entry['updated'] = now
+            return len(accounts)
+
+    def remove(self, account: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(account, None)
+            if entry is not None:
+                self._unindex(account, entry['steam_id'])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+            self._by_steam_id = {}
+            self.built_at = 0.0
+
+    @staticmethod
+    def _effective_status(entry: Dict[str, Any], now: float) -> str:
+        if entry['status'] == COOLDOWN and (entry['until'] or 0) <= now:
+            return READY
+        return entry['status']
+
+    def get(self, account: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The status entry of an account, or None if it isn't in the table."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(account)
+            if entry is None:
+                return None
+            return {**entry, 'account': account, 'status': self._effective_status(entry, now)}
+
+    def counts(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Number of accounts in each state."""
+        now = time.time() if now is None else now
+        counts = {status: 0 for status in STATUSES}
+        with self._lock:
+            for entry in self._entries.values():
+                status = self._effective_status(entry, now)
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def page(self, status: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+             now: Optional[float] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        """One page of accounts, optionally only those in one state.
+
+        Returns (total matching, entries). Each entry has 'number' (the
+        account's position in storage, starting at 1), 'account', 'steam_id',
+        'status', 'until' and 'updated'.
+        """
+        now = time.time() if now is None else now
+        matching = 0
+        rows = []
+        with self._lock:
+            for number, (account, entry) in enumerate(self._entries.items(), start=1):
+                effective = self._effective_status(entry, now)
+                if status and effective != status:
+                    continue
+                if matching >= offset and (limit is None or len(rows) < limit):
+                    rows.append({**entry, 'number': number, 'account': account, 'status': effective})
+                matching += 1
+        return matching, rows
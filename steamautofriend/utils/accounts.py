@@ -1,69 +1,114 @@
 import re
 import json
-from typing import List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set
 from pathlib import Path
 
 from ..config import ACCOUNTS_FILE
 from .logging import logger
+from .storage import get_state_store, TextStateStore
 
 def ensure_accounts_file() -> None:
-    """Create accounts.txt if it doesn't exist."""
+    """Create accounts.txt if it doesn't exist and the text backend is in use.
+
+    The SQLite backend only reads accounts.txt when importing, so an empty one
+    would just suggest that editing it does something.
+    """
+    if not isinstance(get_state_store(), TextStateStore):
+        return
     if not ACCOUNTS_FILE.exists():
         ACCOUNTS_FILE.touch()
         logger.info("Created new accounts.txt file")
 
 def load_accounts() -> List[str]:
-    """Load accounts from the accounts file."""
+    """Load accounts from storage."""
     ensure_accounts_file()
     
     try:
-        with open(ACCOUNTS_FILE, 'r') as f:
-            content = f.read().strip()
-            
-        if not content:
-            logger.info("Accounts file is empty")
-            return []
-            
-        # Try to parse as JSON first (new format)
-        try:
-            accounts = json.loads(content)
-            if isinstance(accounts, list):
-                logger.info(f"Loaded {len(accounts)} accounts from JSON format")
-                return accounts
-        except json.JSONDecodeError:
-            # Not JSON, try line-by-line format (old format)
-            accounts = [line.strip() for line in content.split('\n') if line.strip()]
-            logger.info(f"Loaded {len(accounts)} accounts from text format")
-            return accounts
+        accounts = get_state_store().load_accounts()
+        if not accounts:
+            logger.info("No accounts stored")
+        return accounts
             
     except Exception as e:
         logger.error(f"Error loading accounts: {str(e)}")
         return []
 
+def iter_accounts() -> Iterator[str]:
+    """Yield stored accounts one at a time, reading storage as they are consumed."""
+    ensure_accounts_file()
+    
+    try:
+        yield from get_state_store().iter_accounts()
+    except Exception as e:
+        logger.error(f"Error loading accounts: {str(e)}")
+
+def count_accounts() -> int:
+    """Count the stored accounts without loading them."""
+    try:
+        return get_state_store().count_accounts()
+    except Exception as e:
+        logger.error(f"Error counting accounts: {str(e)}")
+        return 0
+
+def is_account_stored(account: str) -> bool:
+    """Check whether an account (or another spelling of it) is stored."""
+    try:
+        return get_state_store().has_account(str(account).strip())
+    except Exception as e:
+        logger.error(f"Error looking up account: {str(e)}")
+        return False
+
+def get_account_steam_id(account: str) -> Optional[str]:
+    """Get the canonical Steam ID of an account without asking Steam, if it is known."""
+    try:
+        return get_state_store().get_account_steam_id(str(account).strip())
+    except Exception as e:
+        logger.error(f"Error looking up account Steam ID: {str(e)}")
+        return None
+
+def link_account(account: str, steam_id: str) -> Optional[str]:
+    """Record the Steam ID a stored account resolved to.
+    
+    Accounts that resolve to the same Steam ID are collapsed into the one that
+    was added first; the others are kept as its aliases. Returns the account
+    the entry is listed as, or None if it isn't stored.
+    """
+    try:
+        listed = get_state_store().link_account(str(account).strip(), steam_id)
+        if listed and listed != account:
+            logger.debug(f"Account {account} is the same Steam user as {listed}")
+        return listed
+    except Exception as e:
+        logger.error(f"Error linking account: {str(e)}")
+        return None
+
+def get_account_aliases() -> Dict[str, List[str]]:
+    """Get the other spellings of stored accounts, keyed by the account they are listed as."""
+    try:
+        return get_state_store().account_aliases()
+    except Exception as e:
+        logger.error(f"Error loading account aliases: {str(e)}")
+        return {}
+
 def save_accounts(accounts: List[str]) -> None:
-    """Save accounts to the accounts file."""
+    """Replace the stored accounts with the given list."""
     ensure_accounts_file()
     
-    with open(ACCOUNTS_FILE, 'w') as f:
-        for account in accounts:
-            f.write(f"{account}\n")
-    logger.info(f"Saved {len(accounts)} accounts to file")
+    get_state_store().replace_accounts(accounts)
+    logger.info(f"Saved {len(accounts)} accounts")
 
 def add_account(account: str) -> bool:
-    """Add a new account to the accounts file."""
+    """Add a new account to storage."""
     try:
         # Ensure the account is a string
         account = str(account).strip()
         
-        # Check if account already exists
-        accounts = load_accounts()
-        if account in accounts:
+        # Add new account unless it already exists
+        ensure_accounts_file()
+        if not get_state_store().add_account(account):
             logger.info(f"Account {account} already exists in the file")
             return False
         
-        # Add new account
-        with open(ACCOUNTS_FILE, 'a') as f:
-            f.write(f"{account}\n")
         logger.info(f"Added new account: {account}")
         return True
     except Exception as e:
@@ -71,26 +116,21 @@ def add_account(account: str) -> bool:
         return False
 
 def remove_account(account_identifier: str) -> bool:
-    """Remove an account from the accounts file.
+    """Remove an account from storage.
     
     Args:
         account_identifier: Either a number (1-based index) or a string representing 
                            a Steam username/URL/ID
     """
     try:
-        # Load the current accounts
-        accounts = load_accounts()
-        if not accounts:
-            logger.warning("No accounts in the queue to remove")
-            return False
+        store = get_state_store()
             
-        # Check if the account is a number
-        if account_identifier.isdigit():
+        # Check if the account is a number (Steam IDs are matched as accounts below)
+        if account_identifier.isdigit() and len(account_identifier) <= 10:
             # Convert to 0-based index
             index = int(account_identifier) - 1
-            if 0 <= index < len(accounts):
-                removed = accounts.pop(index)
-                save_accounts(accounts)
+            removed = store.remove_account_at(index)
+            if removed is not None:
                 logger.info(f"Removed account {index + 1}: {removed}")
                 return True
             else:
@@ -98,12 +138,10 @@ def remove_account(account_identifier: str) -> bool:
                 return False
         else:
             # Try to find the account by name or URL
-            for i, acc in enumerate(accounts):
-                if account_identifier.lower() in acc.lower():
-                    removed = accounts.pop(i)
-                    save_accounts(accounts)
-                    logger.info(f"Removed account: {removed}")
-                    return True
+            removed = store.remove_account_matching(account_identifier)
+            if removed is not None:
+                logger.info(f"Removed account: {removed}")
+                return True
                     
             logger.error(f"Account not found: {account_identifier}")
             return False
@@ -124,25 +162,3 @@ def extract_steam_id_from_url(url: str) -> Optional[str]:
         return vanity_match.group(1)
     
     return None
-
-def clean_accounts_file() -> None:
-    """Remove duplicate accounts from the accounts file."""
-    try:
-        accounts = load_accounts()
-        if not accounts:
-            return
-            
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_accounts = []
-        for account in accounts:
-            if account not in seen:
-                seen.add(account)
-                unique_accounts.append(account)
-                
-        # Save cleaned list
-        save_accounts(unique_accounts)
-        logger.info(f"Cleaned accounts file: removed {len(accounts) - len(unique_accounts)} duplicates")
-        
-    except Exception as e:
-        logger.error(f"Error cleaning accounts file: {str(e)}")
@@ -1,9 +1,169 @@
+import atexit
+import threading
 import time
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Set, Callable, List, Tuple
 from pathlib import Path
 
-from ..config import BLACKLIST_FILE, DATE_FORMAT
+from ..config import BLACKLIST_FILE, DATE_FORMAT, BLACKLIST_FLUSH_INTERVAL
 from .logging import logger
+from .storage import get_state_store
+
+class BlacklistIndex:
+    """Thread-safe in-memory copy of the blacklist with write-behind flushing.
+
+    The blacklist is read from storage once. Lookups are served from memory and
+    changes are collected and written back in batches by a timer, on flush()
+    and at shutdown.
+    """
+
+    def __init__(self, flush_interval: float = BLACKLIST_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        self._flush_timer: Optional[threading.Timer] = None
+        # After close(), changes are written straight away instead of batched
+        self._closed = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load entries from storage on first use. Must be called with the lock held."""
+        if self._entries is None:
+            try:
+                ensure_blacklist_file()
+                self._entries = get_state_store().load_blacklist()
+                logger.debug(f"Loaded {len(self._entries)} blacklist entries into memory")
+            except Exception as e:
+                logger.error(f"Error loading blacklist: {str(e)}")
+                self._entries = {}
+        return self._entries
+
+    def _schedule_flush(self) -> None:
+        """Start the write-behind timer if it isn't running. Must be called with the lock held."""
+        if self._closed:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def __contains__(self, steam_id: str) -> bool:
+        with self._lock:
+            return steam_id in self._load()
+
+    def __getitem__(self, steam_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._load()[steam_id]
+
+    def __setitem__(self, steam_id: str, data: Dict[str, Any]) -> None:
+        self.set(steam_id, data)
+
+    def __delitem__(self, steam_id: str) -> None:
+        self.delete(steam_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def get(self, steam_id: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._load().get(steam_id, default)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return a point-in-time list of (steam_id, entry) pairs, safe to iterate."""
+        with self._lock:
+            return list(self._load().items())
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a deep-enough copy of the blacklist for comparisons."""
+        with self._lock:
+            return {steam_id: dict(data) for steam_id, data in self._load().items()}
+
+    def find(self, predicate: Callable[[str, Dict[str, Any]], bool]) -> List[str]:
+        """Return the Steam IDs of all entries matching predicate."""
+        with self._lock:
+            return [steam_id for steam_id, data in self._load().items() if predicate(steam_id, data)]
+
+    def set(self, steam_id: str, data: Dict[str, Any]) -> None:
+        """Insert or update an entry and mark it for writing."""
+        with self._lock:
+            self._load()[steam_id] = data
+            self._deleted.discard(steam_id)
+            self._dirty.add(steam_id)
+            self._schedule_flush()
+
+    def delete(self, steam_id: str) -> None:
+        """Remove an entry and mark the removal for writing."""
+        with self._lock:
+            if self._load().pop(steam_id, None) is not None:
+                self._dirty.discard(steam_id)
+                self._deleted.add(steam_id)
+                self._schedule_flush()
+
+    def replace(self, blacklist: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the whole blacklist."""
+        with self._lock:
+            entries = self._load()
+            self._deleted.update(steam_id for steam_id in entries if steam_id not in blacklist)
+            self._deleted.difference_update(blacklist)
+            entries.clear()
+            entries.update(blacklist)
+            self._dirty = set(blacklist)
+            self._schedule_flush()
+
+    def flush(self) -> None:
+        """Write all pending changes to storage."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty and not self._deleted:
+                return
+            entries = self._load()
+            updates = {steam_id: dict(entries[steam_id]) for steam_id in self._dirty if steam_id in entries}
+            deletions = set(self._deleted)
+            self._dirty.clear()
+            self._deleted.clear()
+
+            try:
+                ensure_blacklist_file()
+                get_state_store().apply_blacklist_changes(updates, deletions)
+                logger.info(f"Blacklist saved successfully ({len(updates)} updated, {len(deletions)} removed)")
+            except Exception as e:
+                logger.error(f"Error saving blacklist: {str(e)}")
+                # Keep the changes so the next flush retries them
+                self._dirty.update(updates)
+                self._deleted.update(deletions)
+
+    def close(self) -> None:
+        """Write all pending changes and switch to writing changes as they are made.
+        
+        Called at shutdown, so updates from background work that finishes after
+        the final flush are still saved.
+        """
+        with self._lock:
+            self._closed = True
+            self.flush()
+
+    def reload(self) -> None:
+        """Flush pending changes and re-read the blacklist from storage."""
+        with self._lock:
+            self.flush()
+            self._entries = None
+            self._load()
+
+_index: Optional[BlacklistIndex] = None
+_index_lock = threading.Lock()
+
+def get_blacklist_index() -> BlacklistIndex:
+    """Get the shared in-memory blacklist index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = BlacklistIndex()
+            # Make sure batched changes are written when the program exits
+            atexit.register(_index.flush)
+        return _index
 
 def ensure_blacklist_file() -> None:
     """Create blacklist.txt if it doesn't exist."""
@@ -12,65 +172,80 @@ def ensure_blacklist_file() -> None:
         logger.info("Created new blacklist.txt file")
 
 def load_blacklist() -> Dict[str, Dict[str, Any]]:
-    """Load blacklist from file."""
+    """Get a copy of the current blacklist."""
     try:
-        ensure_blacklist_file()
-            
-        blacklist = {}
-        with open(BLACKLIST_FILE, 'r') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) >= 3:
-                    steam_id = parts[0]
-                    reason = parts[1]
-                    timestamp = parts[2]
-                    count = int(parts[3]) if len(parts) > 3 else 1
-                    last_attempt = float(parts[4]) if len(parts) > 4 else time.time()
-                    blacklist[steam_id] = {
-                        'reason': reason,
-                        'timestamp': timestamp,
-                        'count': count,
-                        'last_attempt': last_attempt
-                    }
-        return blacklist
+        return get_blacklist_index().snapshot()
     except Exception as e:
         logger.error(f"Error loading blacklist: {str(e)}")
         return {}
 
 def save_blacklist(blacklist: Dict[str, Dict[str, Any]]) -> None:
-    """Save blacklist to file."""
+    """Replace the blacklist with the given dictionary."""
     try:
-        ensure_blacklist_file()
-        
-        with open(BLACKLIST_FILE, 'w') as f:
-            for steam_id, data in blacklist.items():
-                f.write(f"{steam_id}|{data['reason']}|{data['timestamp']}|{data['count']}|{data['last_attempt']}\n")
-        logger.info("Blacklist saved successfully")
+        get_blacklist_index().replace(blacklist)
     except Exception as e:
         logger.error(f"Error saving blacklist: {str(e)}")
 
+def flush_blacklist() -> None:
+    """Write any batched blacklist changes to storage immediately."""
+    get_blacklist_index().flush()
+
+def close_blacklist() -> None:
+    """Write batched blacklist changes and write any later changes straight away."""
+    get_blacklist_index().close()
+
+def reload_blacklist() -> None:
+    """Re-read the blacklist from storage, e.g. after an import."""
+    get_blacklist_index().reload()
+
+def get_blacklist_entry(steam_id: str) -> Optional[Dict[str, Any]]:
+    """Get the blacklist entry for a single Steam ID, or None."""
+    try:
+        return get_blacklist_index().get(steam_id)
+    except Exception as e:
+        logger.error(f"Error reading blacklist entry: {str(e)}")
+        return None
+
+def update_blacklist_entry(steam_id: str, data: Dict[str, Any]) -> None:
+    """Insert or update a single blacklist entry."""
+    try:
+        get_blacklist_index().set(steam_id, data)
+        logger.debug(f"Updated blacklist entry for {steam_id}")
+    except Exception as e:
+        logger.error(f"Error updating blacklist entry: {str(e)}")
+
+def remove_from_blacklist(steam_id: str) -> None:
+    """Remove a single Steam ID from the blacklist."""
+    try:
+        get_blacklist_index().delete(steam_id)
+        logger.debug(f"Removed {steam_id} from blacklist")
+    except Exception as e:
+        logger.error(f"Error removing from blacklist: {str(e)}")
+
 def add_to_blacklist(steam_id: str, reason: str = "", count: int = 1, last_attempt: float = None) -> None:
-    """Add a Steam ID to the blacklist file."""
+    """Add a Steam ID to the blacklist."""
     try:
-        ensure_blacklist_file()
-            
         timestamp = time.strftime(DATE_FORMAT)
         last_attempt = last_attempt or time.time()
-        
+
         # Check if already in blacklist
-        blacklist = load_blacklist()
-        if steam_id in blacklist:
+        entry = get_blacklist_entry(steam_id)
+        if entry:
             # Update existing entry
-            blacklist[steam_id]['count'] = count
-            blacklist[steam_id]['last_attempt'] = last_attempt
+            entry['count'] = count
+            entry['last_attempt'] = last_attempt
             if reason:
-                blacklist[steam_id]['reason'] = reason
-            save_blacklist(blacklist)
+                entry['reason'] = reason
         else:
             # Add new entry
-            with open(BLACKLIST_FILE, 'a') as f:
-                f.write(f"{steam_id}|{reason}|{timestamp}|{count}|{last_attempt}\n")
-                
+            entry = {
+                'reason': reason,
+                'timestamp': timestamp,
+                'count': count,
+                'last_attempt': last_attempt
+            }
+        update_blacklist_entry(steam_id, entry)
+
         logger.info(f"Added/updated {steam_id} in blacklist with count {count}")
     except Exception as e:
         logger.error(f"Error adding to blacklist: {str(e)}")
@@ -78,33 +253,45 @@ def add_to_blacklist(steam_id: str, reason: str = "", count: int = 1, last_attem
 def is_blacklisted(steam_id: str) -> bool:
     """Check if a Steam ID is in the blacklist."""
     try:
-        blacklist = load_blacklist()
-        return steam_id in blacklist
+        return steam_id in get_blacklist_index()
     except Exception as e:
         logger.error(f"Error checking blacklist: {str(e)}")
         return False
 
+def next_attempt_time(steam_id: str, max_denied_requests: int, cooldown_minutes: int) -> Optional[float]:
+    """Get the Unix time a friend request to steam_id may next be sent.
+    
+    Returns 0 if there is no blacklist entry, and None if the user is
+    blacklisted for good (denied max_denied_requests times).
+    """
+    entry = get_blacklist_entry(steam_id)
+    if entry is None:
+        return 0.0
+    if max_denied_requests > 0 and entry.get('count', 0) >= max_denied_requests:
+        return None
+    return entry.get('last_attempt', 0) + cooldown_minutes * 60
+
 def should_retry(steam_id: str, max_denied_requests: int, cooldown_minutes: int) -> bool:
     """Check if we should retry a denied friend request."""
     try:
-        blacklist = load_blacklist()
-        if steam_id not in blacklist:
+        entry = get_blacklist_entry(steam_id)
+        if entry is None:
             return True
-            
+
         # Check if we've reached max denials
-        denied_count = blacklist[steam_id].get('count', 0)
+        denied_count = entry.get('count', 0)
         if max_denied_requests > 0 and denied_count >= max_denied_requests:
             logger.info(f"Skipping {steam_id}: Already denied {denied_count} times")
             return False
-            
+
         # Check if cooldown period has passed
-        last_attempt = blacklist[steam_id].get('last_attempt', 0)
+        last_attempt = entry.get('last_attempt', 0)
         cooldown_seconds = cooldown_minutes * 60
         if time.time() - last_attempt < cooldown_seconds:
             remaining_time = cooldown_seconds - (time.time() - last_attempt)
             logger.info(f"Friend request for {steam_id} is on cooldown for {int(remaining_time / 60)} more minutes")
             return False
-            
+
         return True
     except Exception as e:
         logger.error(f"Error checking retry status: {str(e)}")
@@ -0,0 +1,177 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from ..config import (
+    BREAKER_AUTH_COOLDOWN,
+    BREAKER_CAPTCHA_COOLDOWN,
+    BREAKER_THROTTLE_COOLDOWN,
+    BREAKER_MAX_COOLDOWN
+)
+from .logging import logger
+from .request_policy import is_paced
+
+# Why the breaker is open, strongest first
+AUTH = 'auth'
+CAPTCHA = 'captcha'
+THROTTLED = 'throttled'
+REASONS = (AUTH, CAPTCHA, THROTTLED)
+
+DESCRIPTIONS = {
+    AUTH: "the Steam session has expired",
+    CAPTCHA: "Steam wants a CAPTCHA solved before more friend requests",
+    THROTTLED: "Steam is rejecting friend requests as too many",
+}
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+    def __init__(self, reason: str, retry_in: float):
+        super().__init__(f"Not sending: {DESCRIPTIONS[reason]} (trying again in {max(0, retry_in):.0f} seconds)")
+        self.reason = reason
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Stops requests that Steam is going to refuse anyway.
+
+    It opens when Steam shows that the session has expired (AUTH), wants a
+    CAPTCHA solved (CAPTCHA) or is throttling friend requests (THROTTLED).
+    While open, requests fail fast with CircuitOpen instead of being sent: all
+    of them for AUTH, only friend requests (the PACED_PATHS writes) for the
+    other two, since reading pages and searching still work then.
+
+    Once the cooldown has passed, one request is let through as a trial. For
+    AUTH that is the probe, a single cheap check of the login; for the others
+    it is the next friend request. If the trial goes through (succeeded()), the breaker
+    closes; if it trips again, the breaker stays open with twice the cooldown,
+    up to max_cooldown.
+    """
+
+    # A trial that neither succeeded nor tripped within this time (e.g. it raised) no longer holds up the next one
+    TRIAL_TIMEOUT = 60.0
+
+    def __init__(self, probe: Optional[Callable[[], bool]] = None,
+                 cooldowns: Optional[Dict[str, float]] = None, max_cooldown: float = BREAKER_MAX_COOLDOWN):
+        self.probe = probe
+        self.cooldowns = cooldowns or {
+            AUTH: BREAKER_AUTH_COOLDOWN,
+            CAPTCHA: BREAKER_CAPTCHA_COOLDOWN,
+            THROTTLED: BREAKER_THROTTLE_COOLDOWN,
+        }
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self.reason: Optional[str] = None
+        self._open_until = 0.0
+        self._cooldown = 0.0
+        self._trial_thread: Optional[int] = None
+        self._trial_started = 0.0
+        self.trips = 0
+        self.rejected = 0
+
+    def _blocks(self, reason: Optional[str], method: str, url: Optional[str]) -> bool:
+        return reason is not None and (reason == AUTH or is_paced(method, url))
+
+    def _trial_running(self, now: float) -> bool:
+        """Must be called with the lock held."""
+        return self._trial_thread is not None and now - self._trial_started < self.TRIAL_TIMEOUT
+
+    def is_blocking(self, method: str = 'POST', url: Optional[str] = None) -> bool:
+        """Whether a request would fail fast right now. Without a url, a write is taken to be a friend request."""
+        with self._lock:
+            if not self._blocks(self.reason, method, url) or self._trial_thread == threading.get_ident():
+                return False
+            now = time.monotonic()
+            return now < self._open_until or self._trial_running(now)
+
+    def check(self, method: str, url: Optional[str] = None) -> None:
+        """Let a request through, or fail fast with CircuitOpen.
+
+        After the cooldown the first caller becomes the trial; for AUTH it runs
+        the probe first.
+        """
+        with self._lock:
+            reason = self.reason
+            if not self._blocks(reason, method, url) or self._trial_thread == threading.get_ident():
+                return
+            now = time.monotonic()
+            if now < self._open_until or self._trial_running(now):
+                self.rejected += 1
+                raise CircuitOpen(reason, self._open_until - now)
+            self._trial_thread = threading.get_ident()
+            self._trial_started = now
+            run_probe = reason == AUTH and self.probe is not None
+
+        if not run_probe:
+            return
+        logger.info("Checking whether the Steam session works again")
+        try:
+            ok = self.probe()
+        except Exception as e:
+            logger.warning(f"Session probe failed: {str(e)}")
+            ok = False
+        if ok:
+            self.succeeded()
+        else:
+            self.trip(AUTH)
+            with self._lock:
+                self.rejected += 1
+                raise CircuitOpen(AUTH, self._open_until - time.monotonic())
+
+    def trip(self, reason: str, retry_after: Optional[float] = None) -> None:
+        """Record that Steam refused a request for reason, opening the breaker.
+
+        Reports about the same episode from requests that were already under
+        way don't extend the cooldown; a failed trial doubles it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            failed_trial = self._trial_thread == threading.get_ident()
+            if self.reason is not None and not failed_trial:
+                # Another thread's request ran into the same problem
+                if REASONS.index(reason) < REASONS.index(self.reason):
+                    self.reason = reason
+                    self._cooldown = max(self._cooldown, self.cooldowns[reason])
+                    self._open_until = max(self._open_until, now + self._cooldown)
+                return
+            if failed_trial:
+                self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+            else:
+                self._cooldown = self.cooldowns[reason]
+                self.trips += 1
+            if self.reason is None or REASONS.index(reason) < REASONS.index(self.reason):
+                self.reason = reason
+            self._open_until = now + max(self._cooldown, retry_after or 0)
+            self._trial_thread = None
+            wait = self._open_until - now
+            description = DESCRIPTIONS[self.reason]
+        logger.warning(f"Pausing: {description}. Trying again in {wait:.0f} seconds")
+        print(f"\n[!] Pausing: {description}. Trying again in {wait:.0f} seconds")
+
+    def succeeded(self) -> None:
+        """Record that the trial went through, closing the breaker."""
+        with self._lock:
+            if self.reason is None or self._trial_thread != threading.get_ident():
+                return
+            self.reason = None
+            self._trial_thread = None
+            self._cooldown = 0.0
+        logger.info("Steam is accepting requests again, resuming")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            if self.reason is None:
+                state = 'closed'
+            elif now < self._open_until:
+                state = 'open'
+            else:
+                state = 'half-open'
+            return {
+                'state': state,
+                'reason': self.reason,
+                'retry_in': max(0.0, self._open_until - now) if self.reason else 0.0,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
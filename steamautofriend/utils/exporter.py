@@ -0,0 +1,293 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import (
+    METRICS_EXPORTER,
+    METRICS_EXPORTER_HOST,
+    METRICS_EXPORTER_PORT,
+    METRICS_TEXTFILE,
+    METRICS_TEXTFILE_INTERVAL
+)
+from .logging import logger
+from .metrics import get_metrics
+from .resolve_cache import get_resolve_cache_stats
+from .pacer import get_write_pacer
+from .circuit_breaker import REASONS
+from .accounts import count_accounts
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class MetricsWriter:
+    """Builds a page in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def header(self, name: str, metric_type: str, help_text: str) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        if labels:
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+            name = f"{name}{{{label_text}}}"
+        self.lines.append(f"{name} {_format_value(value)}")
+
+    def metric(self, name: str, metric_type: str, help_text: str, value: float) -> None:
+        self.header(name, metric_type, help_text)
+        self.sample(name, value)
+
+    def histogram(self, name: str, histogram: Dict[str, Any], labels: Optional[Dict[str, str]] = None) -> None:
+        """Write a histogram from Histogram.to_dict(), converting milliseconds to seconds."""
+        labels = labels or {}
+        cumulative = 0
+        for bucket in histogram['buckets']:
+            cumulative += bucket['count']
+            le = '+Inf' if bucket['le'] == 'inf' else _format_value(bucket['le'] / 1000)
+            self.sample(f"{name}_bucket", cumulative, {**labels, 'le': le})
+        self.sample(f"{name}_sum", histogram['sum_ms'] / 1000, labels)
+        self.sample(f"{name}_count", histogram['count'], labels)
+
+    def text(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def render_metrics(bot) -> str:
+    """Render the bot's state and the instrumentation data as Prometheus metrics."""
+    out = MetricsWriter()
+
+    out.metric('steamautofriend_session_valid', 'gauge', 'Whether a valid Steam session is loaded.', bool(bot.logged_in))
+    out.metric('steamautofriend_queue_depth', 'gauge', 'Accounts waiting in the in-memory processing queue.',
+               bot.account_queue.qsize())
+    out.metric('steamautofriend_accounts', 'gauge', 'Accounts in the stored account queue.', count_accounts())
+    out.metric('steamautofriend_accounts_scheduled', 'gauge', 'Stored accounts on the readiness schedule of the periodic check.',
+               len(bot.scheduler))
+    out.header('steamautofriend_accounts_by_status', 'gauge', 'Stored accounts by status, as last seen by the checker.')
+    for status, count in bot.account_status.counts().items():
+        out.sample('steamautofriend_accounts_by_status', count, {'status': status.lower()})
+
+    # Friend requests
+    out.metric('steamautofriend_friend_requests_sent_total', 'counter', 'Friend requests sent.', bot.requests_sent)
+    out.metric('steamautofriend_friend_requests_outstanding', 'gauge', 'Sent friend requests not yet accepted or denied.',
+               len(bot.sent_requests))
+    out.metric('steamautofriend_friend_requests_accepted_total', 'counter', 'Sent friend requests that were accepted.',
+               bot.requests_accepted)
+    out.metric('steamautofriend_friend_requests_denied_total', 'counter', 'Sent friend requests confirmed denied or ignored.',
+               bot.requests_denied)
+    out.metric('steamautofriend_blacklist_size', 'gauge', 'Entries in the blacklist.', len(bot.blacklist))
+    pacer = get_write_pacer().stats()
+    if pacer['enabled']:
+        out.metric('steamautofriend_friend_request_rate', 'gauge', 'Current pace of friend requests, in requests per second.',
+                   pacer['rate_per_minute'] / 60)
+        out.metric('steamautofriend_friend_request_rate_ceiling', 'gauge',
+                   'Highest pace the friend request pacer currently allows, in requests per second.',
+                   pacer['ceiling_per_minute'] / 60)
+    out.metric('steamautofriend_friend_request_throttled_total', 'counter',
+               'Times Steam answered a request with error 25 or HTTP 429.', pacer['throttles'])
+    out.metric('steamautofriend_friend_request_waiting', 'gauge', 'Friend requests waiting for their turn from the pacer.',
+               pacer['waiting'])
+    if bot.steam is not None:
+        breaker = bot.steam.session.breaker.stats()
+        out.header('steamautofriend_circuit_open', 'gauge',
+                   'Whether requests are paused because Steam would refuse them, by reason.')
+        for reason in REASONS:
+            out.sample('steamautofriend_circuit_open', breaker['reason'] == reason, {'reason': reason})
+        out.metric('steamautofriend_circuit_trips_total', 'counter', 'Times requests were paused because Steam refused them.',
+                   breaker['trips'])
+        out.metric('steamautofriend_circuit_rejected_total', 'counter', 'Requests not sent while paused.',
+                   breaker['rejected'])
+        relationships = bot.steam.relationships
+        out.metric('steamautofriend_friends', 'gauge', 'Friends in the last fetched friends list.',
+                   len(relationships.friends_list()))
+        out.metric('steamautofriend_pending_requests', 'gauge', 'Outgoing requests in the last fetched pending list.',
+                   len(relationships.pending_list()))
+
+    # Check cycles
+    out.metric('steamautofriend_check_cycles_total', 'counter', 'Friend request check cycles run.', bot.check_cycles)
+    out.metric('steamautofriend_check_cycle_last_duration_seconds', 'gauge', 'Duration of the last check cycle.',
+               bot.last_check_duration)
+    out.metric('steamautofriend_last_check_timestamp_seconds', 'gauge', 'Unix time the last check cycle started.',
+               bot.last_check_time)
+
+    snapshot = get_metrics().snapshot()
+    check = snapshot['operations'].get('check_friend_requests')
+    if check:
+        out.header('steamautofriend_check_cycle_duration_seconds', 'histogram', 'Duration of friend request check cycles.')
+        out.histogram('steamautofriend_check_cycle_duration_seconds', check['latency'])
+
+    out.header('steamautofriend_deadlines_exceeded_total', 'counter',
+               "Reads not sent because their operation's deadline had passed, by operation.")
+    for name, data in snapshot['operations'].items():
+        out.sample('steamautofriend_deadlines_exceeded_total', data['deadlines_exceeded'], {'operation': name})
+
+    # HTTP requests by endpoint
+    endpoints = snapshot['endpoints']
+    if endpoints:
+        out.header('steamautofriend_http_requests_total', 'counter', 'HTTP requests by endpoint and status.')
+        for label, data in endpoints.items():
+            method, endpoint = label.split(' ', 1)
+            for status, count in sorted(data['statuses'].items()):
+                out.sample('steamautofriend_http_requests_total', count,
+                           {'method': method, 'endpoint': endpoint, 'status': status})
+        out.header('steamautofriend_http_timeouts_total', 'counter', 'HTTP requests that timed out, by endpoint.')
+        for label, data in endpoints.items():
+            method, endpoint = label.split(' ', 1)
+            out.sample('steamautofriend_http_timeouts_total', data['timeouts'], {'method': method, 'endpoint': endpoint})
+        out.header('steamautofriend_http_retries_total', 'counter', 'HTTP requests sent again after a failed attempt, by endpoint.')
+        for label, data in endpoints.items():
+            method, endpoint = label.split(' ', 1)
+            out.sample('steamautofriend_http_retries_total', data['retries'], {'method': method, 'endpoint': endpoint})
+        out.header('steamautofriend_http_response_bytes_total', 'counter', 'Response bytes downloaded by endpoint.')
+        for label, data in endpoints.items():
+            method, endpoint = label.split(' ', 1)
+            out.sample('steamautofriend_http_response_bytes_total', data['bytes_downloaded'],
+                       {'method': method, 'endpoint': endpoint})
+        out.header('steamautofriend_http_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint.')
+        for label, data in endpoints.items():
+            method, endpoint = label.split(' ', 1)
+            out.histogram('steamautofriend_http_request_duration_seconds', data['latency'],
+                          {'method': method, 'endpoint': endpoint})
+
+    # Connection pools
+    pools = bot.steam.session.pool_stats() if bot.steam is not None else []
+    if pools:
+        out.header('steamautofriend_http_pool_size', 'gauge', 'Connections kept open per host.')
+        for pool in pools:
+            out.sample('steamautofriend_http_pool_size', pool['size'], {'host': pool['host']})
+        out.header('steamautofriend_http_pool_in_use', 'gauge', 'Connections checked out by a request per host.')
+        for pool in pools:
+            out.sample('steamautofriend_http_pool_in_use', pool['in_use'], {'host': pool['host']})
+        out.header('steamautofriend_http_pool_idle', 'gauge', 'Open connections waiting in the pool per host.')
+        for pool in pools:
+            out.sample('steamautofriend_http_pool_idle', pool['idle'], {'host': pool['host']})
+        out.header('steamautofriend_http_pool_connections_opened_total', 'counter', 'New connections opened per host.')
+        for pool in pools:
+            out.sample('steamautofriend_http_pool_connections_opened_total', pool['connections_opened'], {'host': pool['host']})
+        out.header('steamautofriend_http_pool_requests_total', 'counter', 'Requests sent through the connection pool per host.')
+        for pool in pools:
+            out.sample('steamautofriend_http_pool_requests_total', pool['requests'], {'host': pool['host']})
+
+    # Caches
+    page_cache = bot.steam.session.page_cache if bot.steam is not None else None
+    if page_cache is not None:
+        stats = page_cache.stats()
+        out.metric('steamautofriend_page_cache_hits_total', 'counter', 'Page requests answered 304 and served from the cache.',
+                   stats['hits'])
+        out.metric('steamautofriend_page_cache_misses_total', 'counter', 'Page requests downloaded in full.', stats['misses'])
+        out.metric('steamautofriend_page_cache_hit_ratio', 'gauge', 'Fraction of page requests served from the cache.',
+                   stats['hit_ratio'])
+        out.metric('steamautofriend_page_cache_bytes', 'gauge', 'Size of the cached page bodies.', stats['bytes'])
+
+    resolve = get_resolve_cache_stats()
+    lookups = resolve['hits'] + resolve['misses']
+    out.metric('steamautofriend_resolve_cache_hits_total', 'counter', 'Vanity URL lookups answered from the cache.',
+               resolve['hits'])
+    out.metric('steamautofriend_resolve_cache_misses_total', 'counter', 'Vanity URL lookups that went to Steam.',
+               resolve['misses'])
+    out.metric('steamautofriend_resolve_cache_hit_ratio', 'gauge', 'Fraction of vanity URL lookups answered from the cache.',
+               resolve['hits'] / lookups if lookups else 0.0)
+    out.metric('steamautofriend_resolve_cache_entries', 'gauge', 'Vanity URLs in the resolve cache.', resolve['entries'])
+
+    return out.text()
+
+def write_textfile(bot, path: Path = METRICS_TEXTFILE) -> bool:
+    """Write the metrics to a file for the node_exporter textfile collector."""
+    try:
+        # Write to a temporary file and rename it so the collector never reads a partial file
+        temp_path = Path(f"{path}.tmp")
+        with open(temp_path, 'w') as f:
+            f.write(render_metrics(bot))
+        os.replace(temp_path, path)
+        return True
+    except Exception as e:
+        logger.error(f"Error writing metrics file: {str(e)}")
+        return False
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics."""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        try:
+            body = render_metrics(self.server.bot).encode('utf-8')
+        except Exception as e:
+            logger.error(f"Error rendering metrics: {str(e)}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics request: {format % args}")
+
+_server: Optional[ThreadingHTTPServer] = None
+_textfile_stop: Optional[threading.Event] = None
+
+def start_exporter(bot, mode: Optional[str] = METRICS_EXPORTER) -> bool:
+    """Start the metrics exporter configured by METRICS_EXPORTER ("http", "textfile" or None)."""
+    global _server, _textfile_stop
+    if not mode:
+        return False
+
+    if mode == 'http':
+        if _server is not None:
+            return True
+        try:
+            _server = ThreadingHTTPServer((METRICS_EXPORTER_HOST, METRICS_EXPORTER_PORT), _MetricsHandler)
+            _server.daemon_threads = True
+            _server.bot = bot
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-exporter").start()
+            logger.info(f"Serving metrics on http://{METRICS_EXPORTER_HOST}:{METRICS_EXPORTER_PORT}/metrics")
+            return True
+        except Exception as e:
+            logger.error(f"Error starting metrics exporter: {str(e)}")
+            _server = None
+            return False
+
+    if mode == 'textfile':
+        if _textfile_stop is not None:
+            return True
+        _textfile_stop = threading.Event()
+        stop_event = _textfile_stop
+
+        def write_loop():
+            while not stop_event.is_set():
+                write_textfile(bot)
+                stop_event.wait(METRICS_TEXTFILE_INTERVAL)
+
+        threading.Thread(target=write_loop, daemon=True, name="metrics-textfile").start()
+        logger.info(f"Writing metrics to {METRICS_TEXTFILE} every {METRICS_TEXTFILE_INTERVAL} seconds")
+        return True
+
+    logger.error(f"Unknown METRICS_EXPORTER setting: {mode}")
+    return False
+
+def stop_exporter(bot=None) -> None:
+    """Stop the metrics exporter. With the textfile exporter, bot's final state is written once more."""
+    global _server, _textfile_stop
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+    if _textfile_stop is not None:
+        _textfile_stop.set()
+        _textfile_stop = None
+        if bot is not None:
+            write_textfile(bot)
@@ -0,0 +1,174 @@
+import re
+import time
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional
+
+from .metrics import get_metrics
+
+# Offset between a 32-bit account ID (miniprofile) and a 64-bit Steam ID
+STEAM_ID64_BASE = 76561197960265728
+
+# Relationship states reported by the extractor
+STATE_UNKNOWN = 'unknown'
+STATE_PENDING = 'pending'
+
+# Precompiled patterns. Each starts with a literal and has no unbounded
+# wildcards, so every scan is linear in the page size and can't backtrack
+# across the page like the old DOTALL '.*?' patterns did.
+_USER_RE = re.compile(r'data-(miniprofile|steamid)=["\'](\d+)["\']')
+_LINK_RE = re.compile(r'href="(?:https://steamcommunity\.com)?/profiles/(\d+)"')
+_INVITE_RE = re.compile(r'[Ii]nvite(?:\s+[Ss]ent|_sent|_SentRequest)')
+_DIV_TAG_RE = re.compile(r'<(/?)div[\s>]')
+
+# Literal anchors for pending markers. str.find on a literal is much faster than
+# a regex alternation, so markers are located with find and confirmed with _INVITE_RE
+_PENDING_TEXT = 'Pending...'
+_INVITE_ANCHOR = 'nvite'
+
+_INVITES_SECTION = '<div class="friends_invites_section">'
+_LOGIN_TEXT = "You'll need to sign in"
+
+class PageRecord:
+    """A user found on a friends or pending page."""
+
+    __slots__ = ('steam_id', 'miniprofile', 'state')
+
+    def __init__(self, steam_id: str, miniprofile: Optional[str] = None, state: str = STATE_UNKNOWN):
+        self.steam_id = steam_id
+        self.miniprofile = miniprofile
+        self.state = state
+
+    def __repr__(self) -> str:
+        return f"PageRecord({self.steam_id!r}, miniprofile={self.miniprofile!r}, state={self.state!r})"
+
+class PageExtract:
+    """Everything extracted from a single page."""
+
+    def __init__(self):
+        self.records: Dict[str, PageRecord] = {}
+        self.profile_links: List[str] = []
+        self.invite_section_ids: List[str] = []
+        self.invites_section_found = False
+        # Whether the invites section's closing tag was found, so invite_section_ids lists all of it
+        self.invites_section_complete = False
+        self.login_required = False
+
+    def miniprofile_ids(self, exclude: Optional[str] = None) -> List[str]:
+        """Steam IDs of every user identified by a data-miniprofile attribute."""
+        return [r.steam_id for r in self.records.values()
+                if r.miniprofile is not None and r.steam_id != exclude]
+
+    def pending_ids(self) -> List[str]:
+        """Steam IDs of users marked with a pending/invite-sent indicator."""
+        return [r.steam_id for r in self.records.values() if r.state == STATE_PENDING]
+
+def _find_all(html: str, needle: str) -> Iterator[int]:
+    """Yield every position of a literal in the page."""
+    pos = html.find(needle)
+    while pos != -1:
+        yield pos
+        pos = html.find(needle, pos + len(needle))
+
+def _pending_marker_positions(html: str) -> List[int]:
+    """Positions of all pending/invite-sent markers, in page order."""
+    positions = list(_find_all(html, _PENDING_TEXT))
+    for pos in _find_all(html, _INVITE_ANCHOR):
+        if pos > 0 and _INVITE_RE.match(html, pos - 1):
+            positions.append(pos)
+    positions.sort()
+    return positions
+
+def _matching_div_end(html: str, pos: int) -> int:
+    """Position of the </div> that closes a div whose opening tag ends at pos, or -1 if it isn't closed."""
+    depth = 1
+    for match in _DIV_TAG_RE.finditer(html, pos):
+        depth += -1 if match.group(1) else 1
+        if depth == 0:
+            return match.start()
+    return -1
+
+def extract_page(html: str) -> PageExtract:
+    """Extract users and their relationship state from a friends/pending page.
+
+    Users are identified by data-miniprofile or data-steamid attributes, in page
+    order. A pending marker (Invite Sent, Pending..., etc.) applies to the last
+    user that appears before it. Profile links are collected separately, and
+    links inside the friends_invites_section block (up to its matching
+    closing tag, nested divs included) are recorded as the pending invites list.
+
+    This deliberately differs from the regex parser it replaced (see
+    tests/test_parser_parity.py): markers used to be matched from the first
+    data-steamid up to the next marker anywhere after it, crediting whichever
+    user started that run, and the friends page accepted "pending" anywhere
+    in any case. Only "Pending..." and invite-sent markers count now.
+    """
+    metrics = get_metrics()
+    if metrics.enabled:
+        start = time.perf_counter()
+        page = _extract_page(html)
+        metrics.record_parse((time.perf_counter() - start) * 1000, len(html))
+        return page
+    return _extract_page(html)
+
+def _extract_page(html: str) -> PageExtract:
+    page = PageExtract()
+    records = page.records
+    page.login_required = _LOGIN_TEXT in html
+
+    # Pending markers are located first so user positions are only tracked
+    # when there is something to attach
+    markers = _pending_marker_positions(html)
+
+    # Users, in page order
+    user_positions: List[int] = []
+    user_records: List[PageRecord] = []
+    if markers:
+        matches = ((m.start(), m.group(1), m.group(2)) for m in _USER_RE.finditer(html))
+    else:
+        matches = ((0, kind, raw_id) for kind, raw_id in _USER_RE.findall(html))
+
+    for pos, kind, raw_id in matches:
+        if kind == 'miniprofile':
+            steam_id = str(int(raw_id) + STEAM_ID64_BASE)
+            record = records.get(steam_id)
+            if record is None:
+                record = records[steam_id] = PageRecord(steam_id, raw_id)
+            elif record.miniprofile is None:
+                record.miniprofile = raw_id
+        else:
+            record = records.get(raw_id)
+            if record is None:
+                record = records[raw_id] = PageRecord(raw_id)
+        if markers:
+            user_positions.append(pos)
+            user_records.append(record)
+
+    # Attach each pending marker to the user right before it
+    for pos in markers:
+        index = bisect_left(user_positions, pos) - 1
+        if index >= 0:
+            user_records[index].state = STATE_PENDING
+
+    # Profile links, and the ones inside the invites section
+    section_start = html.find(_INVITES_SECTION)
+    section_end = -1
+    if section_start != -1:
+        page.invites_section_found = True
+        section_end = _matching_div_end(html, section_start + len(_INVITES_SECTION))
+        if section_end == -1:
+            # Cut off before the section closed: whatever is there still counts
+            section_end = len(html)
+        else:
+            page.invites_section_complete = True
+
+    if section_start == -1:
+        page.profile_links = list(dict.fromkeys(_LINK_RE.findall(html)))
+    else:
+        for match in _LINK_RE.finditer(html):
+            steam_id = match.group(1)
+            page.profile_links.append(steam_id)
+            if section_start < match.start() < section_end:
+                page.invite_section_ids.append(steam_id)
+        page.profile_links = list(dict.fromkeys(page.profile_links))
+
+    return page
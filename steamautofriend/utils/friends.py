@@ -1,41 +1,64 @@
+import contextvars
 import json
-import random
 import re
 import time
 import requests
 import traceback
-from typing import List, Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Set, Tuple
 
 from ..config import (
-    MIN_DELAY_BETWEEN_REQUESTS, 
-    MAX_DELAY_BETWEEN_REQUESTS,
     MAX_DENIED_REQUESTS,
-    RETRY_COOLDOWN_MINUTES
+    RETRY_COOLDOWN_MINUTES,
+    PROFILE_CHECK_CONCURRENCY,
+    PROFILE_CHECK_DEADLINE,
+    PENDING_SOURCE_CONCURRENCY,
+    RELATIONSHIPS_DEADLINE,
+    FRIEND_REQUEST_DEADLINE
 )
 from .logging import logger
-from .blacklist import should_retry, add_to_blacklist, load_blacklist, save_blacklist
+from .extractor import extract_page
+from .metrics import instrumented, propagate
+from .request_policy import request_deadline, with_deadline
+from .blacklist import should_retry, add_to_blacklist, get_blacklist_index
+from .circuit_breaker import AUTH, CAPTCHA, THROTTLED
 
-def random_delay(interactive=False) -> None:
-    """
-    Add a random delay between requests.
-    
-    Args:
-        interactive (bool): If True, use a shorter delay for interactive commands.
-    """
-    if interactive:
-        # Use a shorter delay for interactive operations
-        delay = random.uniform(1, 3)  # Use 1-3 seconds for interactive operations
-    else:
-        # Use the standard delay for background operations
-        delay = random.uniform(MIN_DELAY_BETWEEN_REQUESTS, MAX_DELAY_BETWEEN_REQUESTS)
-        
-    time.sleep(delay)
+def failed_invite_code(response_text: str) -> Optional[int]:
+    """The error code in an AddFriendAjax response's failed_invites_result, if it has one."""
+    try:
+        data = json.loads(response_text)
+    except ValueError:
+        return None
+    codes = data.get('failed_invites_result') if isinstance(data, dict) else None
+    if isinstance(codes, list) and codes:
+        return codes[0]
+    return None
+
+# JavaScript variables that may hold the friends list, used when the page has no miniprofile IDs
+FRIENDS_JS_PATTERNS = [
+    re.compile(r'g_rgFriends\s*=\s*(\[.*?\]);', re.DOTALL),
+    re.compile(r'InitFriendsList\s*\(\s*(\[.*?\])', re.DOTALL),
+    re.compile(r'"friends":\s*(\[.*?\])', re.DOTALL),
+    re.compile(r'var\s+friendsList\s*=\s*(\[.*?\]);', re.DOTALL)
+]
 
 def get_friends(steam_session) -> List[str]:
-    """Get the list of friends for the logged-in account."""
+    """Get the list of friends for the logged-in account, empty if it couldn't be fetched."""
+    return fetch_friends(steam_session) or []
+
+@instrumented('get_friends')
+@with_deadline(RELATIONSHIPS_DEADLINE)
+def fetch_friends(steam_session) -> Optional[List[str]]:
+    """Get the list of friends for the logged-in account.
+    
+    Returns:
+        Optional[List[str]]: The friends' Steam IDs, or None if the list
+        couldn't be fetched (as opposed to an empty friends list)
+    """
     if not steam_session or not steam_session.logged_in:
         logger.error("Not logged in")
-        return []
+        return None
         
     try:
         # Get our own Steam ID
@@ -56,49 +79,36 @@ def get_friends(steam_session) -> List[str]:
                     
         if not own_steam_id:
             logger.error("Could not determine own Steam ID")
-            return []
+            return None
                 
         # Get friends list
         friends_url = f"https://steamcommunity.com/profiles/{own_steam_id}/friends"
         response = steam_session.session.get(friends_url)
+        if response.status_code != 200:
+            logger.error(f"Error accessing friends page: HTTP {response.status_code}")
+            return None
         
-        # Extract miniprofile IDs from the HTML (this is a reliable way to get profileIDs)
-        miniprofile_pattern = re.findall(r'data-miniprofile="(\d+)"', response.text)
-        if miniprofile_pattern:
-            # Convert miniprofile IDs to Steam IDs
-            # The formula is: steamID64 = miniprofile + 76561197960265728
-            steam_ids = []
-            for miniprofile in miniprofile_pattern:
-                if miniprofile:
-                    try:
-                        # Skip the current user's profile that appears in the header
-                        if own_miniprofile_id and miniprofile == own_miniprofile_id:
-                            logger.debug(f"Skipping own miniprofile ID: {miniprofile}")
-                            continue
-                        
-                        steam_id = str(int(miniprofile) + 76561197960265728)
-                        steam_ids.append(steam_id)
-                    except ValueError:
-                        continue
-            
-            if steam_ids:
-                # Remove duplicates and sort
-                steam_ids = sorted(list(set(steam_ids)))
-                logger.debug(f"Found {len(steam_ids)} friends from miniprofile IDs")
-                return steam_ids
+        # Scan the page once for miniprofile IDs and profile links
+        page = extract_page(response.text)
+        if page.login_required:
+            logger.error("Session expired - redirected to login page")
+            steam_session.session.breaker.trip(AUTH)
+            return None
+        
+        # Miniprofile IDs are a reliable way to get profile IDs. Skip the current
+        # user's profile that appears in the header
+        steam_ids = page.miniprofile_ids(exclude=own_steam_id)
+        if steam_ids:
+            # Remove duplicates and sort
+            steam_ids = sorted(set(steam_ids))
+            logger.debug(f"Found {len(steam_ids)} friends from miniprofile IDs")
+            return steam_ids
         
         # Try the JavaScript variable patterns as a fallback
         friends_data_match = None
         
-        patterns = [
-            r'g_rgFriends\s*=\s*(\[.*?\]);',
-            r'InitFriendsList\s*\(\s*(\[.*?\])',
-            r'"friends":\s*(\[.*?\])',
-            r'var\s+friendsList\s*=\s*(\[.*?\]);'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, response.text, re.DOTALL)
+        for pattern in FRIENDS_JS_PATTERNS:
+            match = pattern.search(response.text)
             if match:
                 friends_data_match = match
                 break
@@ -121,7 +131,7 @@ def get_friends(steam_session) -> List[str]:
                 logger.error("Failed to parse friends data JSON")
         
         # If we get here, try to extract from direct profile links
-        profile_links = re.findall(r'href="https://steamcommunity\.com/profiles/(\d+)"', response.text)
+        profile_links = page.profile_links
         if profile_links:
             # Remove duplicates and sort
             steam_ids = sorted(list(set(profile_links)))
@@ -133,15 +143,195 @@ def get_friends(steam_session) -> List[str]:
         
     except Exception as e:
         logger.error(f"Error getting friends list: {str(e)}")
-        return []
+        return None
+
+def is_pending_on_profile(steam_session, steam_id: str) -> Optional[bool]:
+    """Check a user's profile page for an outgoing pending friend request.
+    
+    Returns:
+        Optional[bool]: True if the profile shows a pending invite, False if it
+        doesn't, None if the profile could not be checked
+    """
+    try:
+        profile_url = f"https://steamcommunity.com/profiles/{steam_id}"
+        profile_resp = steam_session.session.get(profile_url)
+        if profile_resp.status_code != 200:
+            return None
+        return "invite_sent" in profile_resp.text or "Pending..." in profile_resp.text
+    except Exception as e:
+        logger.warning(f"Error checking profile for {steam_id}: {str(e)}")
+        return None
+
+# Monotonic time the profile checks of the current check cycle must be done by, if one is running
+_profile_check_deadline: contextvars.ContextVar = contextvars.ContextVar('steamautofriend_profile_check_deadline',
+                                                                          default=None)
 
+@contextmanager
+def profile_check_cycle(seconds: float = PROFILE_CHECK_DEADLINE) -> Iterator[None]:
+    """Give all verify_pending_via_profiles() calls made inside the block seconds in total.
+    
+    Like request_deadline(), this carries over to threads the work is passed to
+    with propagate().
+    """
+    token = _profile_check_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _profile_check_deadline.reset(token)
+
+@instrumented('verify_pending_via_profiles')
+def verify_pending_via_profiles(steam_session, steam_ids: Iterable[str],
+                                max_workers: int = PROFILE_CHECK_CONCURRENCY,
+                                deadline: float = PROFILE_CHECK_DEADLINE) -> Dict[str, Optional[bool]]:
+    """Check several profile pages for pending invites concurrently.
+    
+    Profiles are fetched by a bounded worker pool. Any check that hasn't finished
+    by the deadline is reported as None (unknown), so the caller is never blocked
+    for longer than the deadline regardless of how many IDs are passed in. Inside
+    profile_check_cycle() the deadline is also cut to what the cycle has left.
+    
+    Returns:
+        Dict[str, Optional[bool]]: Result of is_pending_on_profile per Steam ID,
+        in the same order as steam_ids
+    """
+    steam_ids = list(dict.fromkeys(steam_ids))
+    results: Dict[str, Optional[bool]] = {steam_id: None for steam_id in steam_ids}
+    if not steam_ids:
+        return results
+        
+    cycle_deadline = _profile_check_deadline.get()
+    if cycle_deadline is not None:
+        deadline = min(deadline, cycle_deadline - time.monotonic())
+    if deadline <= 0:
+        logger.warning(f"Profile check time for this cycle is used up, skipping {len(steam_ids)} checks")
+        return results
+        
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(steam_ids))))
+    try:
+        # The page loads are held to the deadline too, so checks still running at it give up
+        with request_deadline(deadline):
+            check = propagate(is_pending_on_profile)
+        futures = {executor.submit(check, steam_session, steam_id): steam_id for steam_id in steam_ids}
+        done, not_done = wait(futures, timeout=deadline)
+        
+        for future in done:
+            results[futures[future]] = future.result()
+            
+        if not_done:
+            logger.warning(f"Profile verification deadline reached, {len(not_done)} of {len(steam_ids)} checks unfinished")
+            for future in not_done:
+                future.cancel()
+    finally:
+        # Don't wait for stragglers - their results are discarded anyway
+        executor.shutdown(wait=False)
+        
+    logger.debug(f"Verified {len(steam_ids)} profiles: "
+                 f"{sum(1 for r in results.values() if r)} pending, "
+                 f"{sum(1 for r in results.values() if r is None)} unknown")
+    return results
+
+def _fetch_pending_invites_page(steam_session, own_steam_id: str) -> Tuple[Set[str], bool]:
+    """METHOD 1: Visit pending invites page for our profile.
+    
+    Returns:
+        Tuple[Set[str], bool]: Steam IDs found, and whether the page contained the
+        complete pending invites section (an authoritative list)
+    """
+    found = set()
+    authoritative = False
+    try:
+        pending_url = f'https://steamcommunity.com/profiles/{own_steam_id}/friends/pending'
+        response = steam_session.session.get(pending_url)
+        
+        if response.status_code == 200:
+            # Scan the page once
+            page = extract_page(response.text)
+            
+            # Check if we're sent to the login page
+            if page.login_required:
+                logger.error("Session expired - redirected to login page")
+                steam_session.session.breaker.trip(AUTH)
+            elif not page.invites_section_found:
+                # If we can't find the pending invites section, use the users
+                # marked with an "Invite Sent" indicator instead
+                pending_ids = page.pending_ids()
+                if pending_ids:
+                    found.update(pending_ids)
+                    logger.debug(f"Found {len(pending_ids)} pending outgoing requests from miniprofile IDs")
+            else:
+                # The invites section lists every pending invite, so no other
+                # page can add anything to it - unless the page was cut off
+                # before the section ended
+                authoritative = page.invites_section_complete
+                
+                # Get direct Steam IDs from pending friends URLs
+                steam_ids = page.invite_section_ids
+                if steam_ids:
+                    # Add all found IDs to our set
+                    found.update(steam_ids)
+                    logger.debug(f"Found {len(steam_ids)} pending requests by profile URL")
+        else:
+            logger.error(f"Error accessing pending page: HTTP {response.status_code}")
+    except Exception as e:
+        logger.warning(f"Error checking pending invites page: {str(e)}")
+    return found, authoritative
+
+def _fetch_manage_friends_page(steam_session, own_steam_id: str) -> Tuple[Set[str], bool]:
+    """METHOD 2: Check "Manage Friends" page which shows outbound requests."""
+    found = set()
+    try:
+        manage_url = 'https://steamcommunity.com/my/friends/pending'
+        manage_resp = steam_session.session.get(manage_url)
+        
+        if manage_resp.status_code == 200:
+            # Users marked as sent requests (older UI) or "Pending..." (newer UI)
+            sent_ids = extract_page(manage_resp.text).pending_ids()
+            if sent_ids:
+                # Add all found IDs to our set
+                found.update(sent_ids)
+                logger.debug(f"Found {len(sent_ids)} pending sent requests from manage page")
+    except Exception as e:
+        logger.warning(f"Error checking manage friends page: {str(e)}")
+    return found, False
+
+def _fetch_friends_page_pending(steam_session, own_steam_id: str) -> Tuple[Set[str], bool]:
+    """METHOD 3: Check the community friends page."""
+    found = set()
+    try:
+        friends_url = f'https://steamcommunity.com/profiles/{own_steam_id}/friends/'
+        friends_resp = steam_session.session.get(friends_url)
+        
+        if friends_resp.status_code == 200:
+            # Look for pending request indicators
+            pending_ids = extract_page(friends_resp.text).pending_ids()
+            
+            if pending_ids:
+                found.update(pending_ids)
+                logger.debug(f"Found {len(pending_ids)} pending requests from friends page")
+    except Exception as e:
+        logger.warning(f"Error checking friends page: {str(e)}")
+    return found, False
+
+# Pending request page sources, in order of preference
+PENDING_SOURCES = [
+    _fetch_pending_invites_page,
+    _fetch_manage_friends_page,
+    _fetch_friends_page_pending,
+]
+
+@instrumented('get_pending_requests')
+@with_deadline(RELATIONSHIPS_DEADLINE)
 def get_pending_requests(steam_session) -> List[str]:
     """Get the list of pending friend requests.
     
     This function checks multiple sources to find pending friend requests:
     1. The pending invites page
     2. The manage friends page
-    3. Direct profile checks for suspicious cases
+    3. The community friends page
+    4. Direct profile checks for suspicious cases
+    
+    The pages are fetched concurrently and parsed as they arrive. Sources that
+    haven't started yet are skipped once an authoritative list has been found.
     
     Returns:
         List[str]: List of Steam IDs with pending requests
@@ -160,117 +350,50 @@ def get_pending_requests(steam_session) -> List[str]:
             logger.error("Could not determine own Steam ID")
             return []
         
-        # METHOD 1: Visit pending invites page for our profile
+        # METHODS 1-3: Fetch the pending request pages. The first two sources start
+        # right away; later sources only start if no authoritative list has arrived
+        remaining_sources = list(PENDING_SOURCES)
+        running = set()
+        have_authoritative = False
+        executor = ThreadPoolExecutor(max_workers=PENDING_SOURCE_CONCURRENCY, thread_name_prefix="pending-source")
         try:
-            pending_url = f'https://steamcommunity.com/profiles/{own_steam_id}/friends/pending'
-            response = steam_session.session.get(pending_url)
-            
-            if response.status_code == 200:
-                # Check if we're sent to the login page
-                if "You'll need to sign in to see this" in response.text:
-                    logger.error("Session expired - redirected to login page")
-                else:
-                    # Look for pending invites in the HTML
-                    # Search for specific divs with pending invites
-                    pending_section = re.search(r'<div class="friends_invites_section">(.*?)</div>', response.text, re.DOTALL)
+            while True:
+                # Start more sources while there are free slots and no complete list yet
+                while remaining_sources and len(running) < PENDING_SOURCE_CONCURRENCY and not have_authoritative:
+                    running.add(executor.submit(propagate(remaining_sources.pop(0)), steam_session, own_steam_id))
+                if not running:
+                    break
                     
-                    # If we can't find the pending invites section, try alternate method
-                    if not pending_section:
-                        # Try to find the pending invites by looking for miniprofile IDs in specific sections
-                        # Look for specific IDs of account we've sent requests to
-                        mini_pattern = r'data-miniprofile=["\'](.*?)["\'][^>]*>.*?<span\s+class="friend_blocked_text">Invite\s+Sent'
-                        pending_profile_ids = re.findall(mini_pattern, response.text, re.DOTALL | re.IGNORECASE)
-                        
-                        # Convert miniprofile IDs to Steam IDs
-                        if pending_profile_ids:
-                            for miniprofile_id in pending_profile_ids:
-                                steam_id = convert_miniprofile_id(miniprofile_id)
-                                if steam_id:
-                                    all_pending_requests.add(steam_id)
-                                    
-                            logger.debug(f"Found {len(pending_profile_ids)} pending outgoing requests from miniprofile IDs")
-                    else:
-                        # Get direct Steam IDs from pending friends URLs
-                        profile_pattern = r'href="(?:https://steamcommunity\.com)?/profiles/(\d+)"[^>]*>'
-                        steam_ids = re.findall(profile_pattern, pending_section.group(1))
-                        
-                        if steam_ids:
-                            # Add all found IDs to our set
-                            all_pending_requests.update(steam_ids)
-                            logger.debug(f"Found {len(steam_ids)} pending requests by profile URL")
-            else:
-                logger.error(f"Error accessing pending page: HTTP {response.status_code}")
-        except Exception as e:
-            logger.warning(f"Error checking pending invites page: {str(e)}")
-            
-        # METHOD 2: Check "Manage Friends" page which shows outbound requests
-        try:
-            manage_url = 'https://steamcommunity.com/my/friends/pending'
-            manage_resp = steam_session.session.get(manage_url)
-            
-            if manage_resp.status_code == 200:
-                # Check for sent requests pattern
-                if 'class="friendInvite_SentRequest' in manage_resp.text:
-                    # Extract Steam IDs from sent requests
-                    sent_pattern = r'data-steamid="(\d+)"[^>]*>.*?class="friendInvite_SentRequest'
-                    sent_ids = re.findall(sent_pattern, manage_resp.text, re.DOTALL)
+                # Parse each page as soon as it arrives
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, authoritative = future.result()
+                    all_pending_requests.update(found)
+                    have_authoritative = have_authoritative or authoritative
                     
-                    if sent_ids:
-                        # Add all found IDs to our set
-                        all_pending_requests.update(sent_ids)
-                        logger.debug(f"Found {len(sent_ids)} pending sent requests from manage page")
-                
-                # Also check for the newer UI version
-                newer_pattern = r'data-steamid="(\d+)"[^>]*>.*?Pending\.\.\..*?</span>'
-                newer_ids = re.findall(newer_pattern, manage_resp.text, re.DOTALL | re.IGNORECASE)
-                if newer_ids:
-                    all_pending_requests.update(newer_ids)
-                    logger.debug(f"Found {len(newer_ids)} pending requests from newer UI")
-        except Exception as e:
-            logger.warning(f"Error checking manage friends page: {str(e)}")
-            
-        # METHOD 3: Check the community friends page
-        try:
-            friends_url = f'https://steamcommunity.com/profiles/{own_steam_id}/friends/'
-            friends_resp = steam_session.session.get(friends_url)
-            
-            if friends_resp.status_code == 200:
-                # Look for pending request indicators
-                pending_pattern = r'data-steamid="(\d+)"[^>]*>.*?Pending.*?</span>'
-                pending_ids = re.findall(pending_pattern, friends_resp.text, re.DOTALL | re.IGNORECASE)
-                
-                if pending_ids:
-                    all_pending_requests.update(pending_ids)
-                    logger.debug(f"Found {len(pending_ids)} pending requests from friends page")
-        except Exception as e:
-            logger.warning(f"Error checking friends page: {str(e)}")
+            if have_authoritative and remaining_sources:
+                logger.debug(f"Authoritative pending list found, skipped {len(remaining_sources)} remaining sources")
+        finally:
+            executor.shutdown(wait=True)
             
         # METHOD 4: Check blacklist for recent additions that might be pending
         # This helps address the race condition where we thought a request was denied
         # but it was just a temporary API glitch
         try:
-            blacklist = load_blacklist()
             current_time = time.time()
-            for steam_id, data in blacklist.items():
-                # If this is a recent addition with a low count and was marked as 
-                # potentially denied rather than confirmed, double-check it
-                if (data.get('count', 0) <= 1 and 
+            # If this is a recent addition with a low count and was marked as 
+            # potentially denied rather than confirmed, double-check it
+            candidates = get_blacklist_index().find(
+                lambda steam_id, data: (data.get('count', 0) <= 1 and 
                     data.get('failure_is_confirmed', True) == False and
                     data.get('reason', '') == 'Friend request potentially denied' and
-                    current_time - data.get('last_attempt', 0) < 3600):  # Added in the last hour
-                    
-                    # Verify by visiting the profile directly
-                    try:
-                        profile_url = f"https://steamcommunity.com/profiles/{steam_id}"
-                        profile_resp = steam_session.session.get(profile_url, timeout=10)
-                        
-                        if profile_resp.status_code == 200:
-                            # Check for pending indicator in profile
-                            if "invite_sent" in profile_resp.text or "Pending..." in profile_resp.text:
-                                all_pending_requests.add(steam_id)
-                                logger.debug(f"Found pending request to {steam_id} via profile verification")
-                    except Exception as profile_err:
-                        logger.warning(f"Error checking profile for {steam_id}: {str(profile_err)}")
+                    current_time - data.get('last_attempt', 0) < 3600)  # Added in the last hour
+            )
+            # Verify by visiting the profiles directly, a few at a time
+            for steam_id, is_pending in verify_pending_via_profiles(steam_session, candidates).items():
+                if is_pending:
+                    all_pending_requests.add(steam_id)
+                    logger.debug(f"Found pending request to {steam_id} via profile verification")
         except Exception as e:
             logger.warning(f"Error checking blacklist for potential pending requests: {str(e)}")
         
@@ -287,20 +410,42 @@ def get_pending_requests(steam_session) -> List[str]:
         traceback.print_exc()
         return []
 
-def send_friend_request(steam_session, steam_id: str, account_name: str = None) -> bool:
-    """Send a friend request to a Steam user."""
+class PreparedFriendRequest:
+    """The read side of a friend request, done before (possibly well before) sending it.
+    
+    result is set when no request needs to or can be sent: True if the user is
+    already a friend or has a pending request, False if it failed. Otherwise
+    session_id and profile_url are what the AddFriendAjax POST needs.
+    """
+    
+    def __init__(self, steam_id: str, display_name: str, result: Optional[bool] = None,
+                 session_id: Optional[str] = None, profile_url: Optional[str] = None):
+        self.steam_id = steam_id
+        self.display_name = display_name
+        self.result = result
+        self.session_id = session_id
+        self.profile_url = profile_url
+
+@instrumented('prepare_friend_request')
+@with_deadline(FRIEND_REQUEST_DEADLINE)
+def prepare_friend_request(steam_session, steam_id: str, account_name: str = None) -> PreparedFriendRequest:
+    """Do the read-side work of a friend request: the local checks and the profile page visit.
+    
+    Nothing is sent to the user, so this isn't paced and can run ahead of the
+    paced POST in send_friend_request().
+    """
     # Static variable to track recently successful requests to prevent duplicate messages
     if not hasattr(send_friend_request, "recent_successes"):
         send_friend_request.recent_successes = {}
     
+    # Use account name in messages if provided, otherwise use steam_id
+    display_name = account_name or steam_id
+    
     if not steam_session or not steam_session.logged_in:
         logger.error("Not logged in")
-        return False
+        return PreparedFriendRequest(steam_id, display_name, False)
         
     try:
-        # Use account name in messages if provided, otherwise use steam_id
-        display_name = account_name or steam_id
-        
         # Check if we've recently sent a successful request to this account
         current_time = time.time()
         if steam_id in send_friend_request.recent_successes:
@@ -309,11 +454,11 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
             # return success without printing duplicate message
             if current_time - last_success_time < 1800:  # 30 minutes in seconds (increased from 10)
                 logger.debug(f"Skipping duplicate success message for {display_name} (within 30 min cooldown)")
-                return True
+                return PreparedFriendRequest(steam_id, display_name, True)
         
         # Check if this account is in the blacklist
         if not should_retry(steam_id, MAX_DENIED_REQUESTS, RETRY_COOLDOWN_MINUTES):
-            return False
+            return PreparedFriendRequest(steam_id, display_name, False)
         
         # Track if we've already shown a success message to prevent duplicates 
         # within the same function call
@@ -329,88 +474,87 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
                 if own_steam_id == steam_id:
                     logger.error(f"Cannot send friend request to yourself ({display_name})")
                     print(f"Failed: Cannot send friend request to yourself ({display_name}) (Error code: 40)")
-                    return False
+                    return PreparedFriendRequest(steam_id, display_name, False)
         except Exception as e:
             logger.warning(f"Could not retrieve own Steam ID: {str(e)}")
         
-        # First check if a request is already pending by checking the pending requests list
-        pending_requests = get_pending_requests(steam_session)
-        if pending_requests and steam_id in pending_requests:
+        # First check if a request is already pending using the shared relationship
+        # snapshot (only refetched from Steam when it has expired)
+        relationships = steam_session.relationships.current(steam_session)
+        if relationships.is_pending(steam_id):
             logger.info(f"Friend request already pending for {display_name}")
             print(f"Friend request already pending for {display_name} (verified in pending list)")
             # Track this success
             send_friend_request.recent_successes[steam_id] = current_time
             success_shown = True
-            return True
+            return PreparedFriendRequest(steam_id, display_name, True)
             
         # Also check if we're already friends
-        friends = get_friends(steam_session)
-        if friends and steam_id in friends:
+        if relationships.is_friend(steam_id):
             logger.info(f"Already friends with {display_name}")
             print(f"Already friends with {display_name}")
             # Track this success
             send_friend_request.recent_successes[steam_id] = current_time
             success_shown = True
-            return True
+            return PreparedFriendRequest(steam_id, display_name, True)
             
-        # Add random delay before request
-        random_delay()
-        
         # Get session ID from cookies
         session_id = steam_session.session.cookies.get('sessionid')
         if not session_id:
             logger.error("No session ID found in cookies")
-            return False
+            return PreparedFriendRequest(steam_id, display_name, False)
             
         # First visit the profile page to set up the request and check for friend list status
         profile_url = f"https://steamcommunity.com/profiles/{steam_id}"
         try:
-            profile_resp = steam_session.session.get(profile_url, timeout=10)
+            profile_resp = steam_session.session.get(profile_url)
             logger.debug(f"Profile page status: {profile_resp.status_code}")
             
             # Check if profile page was loaded successfully
             if profile_resp.status_code >= 300:
                 logger.error(f"Error accessing profile page for {display_name}: HTTP {profile_resp.status_code}")
                 print(f"Failed to load profile page for {display_name}: HTTP {profile_resp.status_code}")
-                return False
+                return PreparedFriendRequest(steam_id, display_name, False)
             
             # Check for full friends list indicators
             if "has reached the maximum number of friends" in profile_resp.text or "friends list is full" in profile_resp.text:
                 logger.info(f"User {display_name} has a full friends list")
                 print(f"Cannot add {display_name}: Friends list is full")
-                return False
+                return PreparedFriendRequest(steam_id, display_name, False)
                 
             # Check if there's a Family View PIN input in the page
             if "familyViewPINForm" in profile_resp.text or "FamilyView" in profile_resp.text:
                 logger.error("Family View is enabled and blocking access")
                 print(f"Failed: Family View is enabled and blocking access to {display_name}")
-                return False
+                return PreparedFriendRequest(steam_id, display_name, False)
                 
             # Check if already friends (from the profile page)
             if "are_friends" in profile_resp.text or 'class="friendRelationship"' in profile_resp.text:
                 logger.info(f"Already friends with {display_name} (detected in profile)")
+                relationships.mark_friend(steam_id)
                 if not success_shown:
                     print(f"Already friends with {display_name}")
                     success_shown = True
                 # Track this success
                 send_friend_request.recent_successes[steam_id] = current_time
-                return True
+                return PreparedFriendRequest(steam_id, display_name, True)
                 
             # Check if request is already pending (from the profile page)
             if "invite_sent" in profile_resp.text or "Pending..." in profile_resp.text:
                 logger.info(f"Friend request already pending for {display_name} (detected in profile)")
+                relationships.mark_pending(steam_id)
                 if not success_shown:
                     print(f"Friend request already pending for {display_name}")
                     success_shown = True
                 # Track this success
                 send_friend_request.recent_successes[steam_id] = current_time
-                return True
+                return PreparedFriendRequest(steam_id, display_name, True)
                 
             # Check if the profile has proper friend capabilities
             if "This user has not yet set up their Steam profile" in profile_resp.text:
                 logger.warning(f"User {display_name} has not set up their profile")
                 print(f"Failed: {display_name} has not set up their profile")
-                return False
+                return PreparedFriendRequest(steam_id, display_name, False)
                 
             # Update the session ID from the response cookies if available
             new_session_id = profile_resp.cookies.get('sessionid')
@@ -420,8 +564,42 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
         except Exception as e:
             logger.error(f"Error visiting profile page for {display_name}: {str(e)}")
             print(f"Error visiting profile page for {display_name}: {str(e)}")
-            return False
+            return PreparedFriendRequest(steam_id, display_name, False)
+        
+        return PreparedFriendRequest(steam_id, display_name, session_id=session_id, profile_url=profile_url)
+        
+    except Exception as e:
+        logger.error(f"Error preparing friend request to {steam_id}: {str(e)}")
+        return PreparedFriendRequest(steam_id, display_name, False)
+
+@instrumented('send_friend_request')
+def send_friend_request(steam_session, steam_id: str, account_name: str = None,
+                        prepared: Optional[PreparedFriendRequest] = None) -> bool:
+    """Send a friend request to a Steam user.
+    
+    prepared is the prepare_friend_request() result for this user if the read
+    side was done ahead of time; otherwise it is done first. The POST waits
+    for its turn from the session's write pacer.
+    """
+    if prepared is None:
+        prepared = prepare_friend_request(steam_session, steam_id, account_name)
+    if prepared.result is not None:
+        return prepared.result
         
+    try:
+        display_name = prepared.display_name
+        session_id = prepared.session_id
+        profile_url = prepared.profile_url
+        current_time = time.time()
+        success_shown = False
+        
+        # The profile may have been visited a while ago: don't send if the user has
+        # since shown up as a friend or with a pending request
+        relationships = steam_session.relationships
+        if relationships.is_friend(steam_id) or relationships.is_pending(steam_id):
+            logger.info(f"No friend request needed for {display_name} any more")
+            return True
+            
         # Send friend request
         logger.info(f"Sending friend request to {display_name}")
         
@@ -453,8 +631,7 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
             response = steam_session.session.post(
                 "https://steamcommunity.com/actions/AddFriendAjax",
                 data=payload,
-                headers=headers,
-                timeout=15
+                headers=headers
             )
             
             # Log detailed response information for debugging
@@ -467,6 +644,20 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
             
             logger.info(f"Response status: HTTP {response.status_code}")
             
+            # Tell the pacer and the circuit breaker how Steam took the request: error 25
+            # means we are sending too many (HTTP 429 is reported by the session itself)
+            breaker = steam_session.session.breaker
+            if failed_invite_code(response_text) == 25:
+                steam_session.session.write_pacer.throttled()
+                breaker.trip(THROTTLED)
+            elif "Please verify your humanity" in response_text:
+                breaker.trip(CAPTCHA)
+            elif "You'll need to sign in to add a friend" in response_text:
+                breaker.trip(AUTH)
+            elif response.status_code < 500 and response.status_code != 429:
+                steam_session.session.write_pacer.succeeded()
+                breaker.succeeded()
+            
             # Map error codes to descriptive messages
             error_descriptions = {
                 1: "Success",
@@ -495,6 +686,7 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
                     # Handle success cases
                     if data is True or (isinstance(data, dict) and data.get('success') == 1 and not data.get('failed_invites')):
                         logger.info(f"Successfully sent friend request to {display_name}")
+                        relationships.mark_pending(steam_id)
                         if not success_shown:
                             print(f"Friend request sent successfully to {display_name}")
                             success_shown = True
@@ -517,8 +709,7 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
                         # by checking the pending list, not just relying on the error code
                         if error_code == 15:
                             # Refresh the pending requests list to see if our request appears
-                            updated_pending = get_pending_requests(steam_session)
-                            if steam_id in updated_pending:
+                            if steam_session.relationships.refresh(steam_session).is_pending(steam_id):
                                 logger.info(f"Friend request to {display_name} was confirmed in pending list")
                                 if not success_shown:
                                     print(f"Friend request sent to {display_name} (verified in pending list)")
@@ -535,6 +726,7 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
                         # Code 41 with "invite pending" text is also a success
                         if error_code == 41 and "invite pending" in response_text.lower():
                             logger.info(f"Friend request was already sent to {display_name}")
+                            relationships.mark_pending(steam_id)
                             if not success_shown:
                                 print(f"Friend request was already sent to {display_name}")
                                 success_shown = True
@@ -554,6 +746,7 @@ def send_friend_request(steam_session, steam_id: str, account_name: str = None)
             # Check for success patterns in HTML response
             if "friend invite has been sent" in response_text:
                 logger.info(f"Successfully sent friend request to {display_name} (detected in HTML)")
+                relationships.mark_pending(steam_id)
                 if not success_shown:
                     print(f"Friend request sent successfully to {display_name}")
                     success_shown = True
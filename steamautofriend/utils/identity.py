@@ -0,0 +1,53 @@
+import re
+from typing import Optional
+
+from .resolve_cache import get_cached_resolution
+
+_PROFILE_RE = re.compile(r'/profiles/(\d+)')
+_VANITY_RE = re.compile(r'/id/([^/?#]+)')
+
+# Prefix for keys of vanity names, so they can't collide with Steam IDs
+VANITY_PREFIX = 'id:'
+
+def account_key(account: str) -> str:
+    """Normalized identity of an account as it was entered, used to detect duplicates.
+
+    Steam IDs and profile URLs map to the SteamID64; vanity names and vanity
+    URLs map to the lowercased vanity name (Steam treats them case-insensitively).
+    This follows the same rules as resolve_account(), without any lookups.
+    """
+    account = str(account).strip()
+
+    # Check if it's already a Steam ID
+    if account.isdigit() and len(account) > 10:
+        return account
+
+    if '/' in account:
+        match = _PROFILE_RE.search(account)
+        if match:
+            return match.group(1)
+        match = _VANITY_RE.search(account)
+        if match:
+            return VANITY_PREFIX + match.group(1).lower()
+        # Not something resolve_account() understands; only exact duplicates match
+        return account.lower().rstrip('/')
+
+    # Assume it's a vanity name
+    return VANITY_PREFIX + account.lower()
+
+def steam_id_from_key(key: str) -> Optional[str]:
+    """The SteamID64 an account_key() stands for, if it is one."""
+    return key if key.isdigit() else None
+
+def known_steam_id(account: str) -> Optional[str]:
+    """The canonical SteamID64 of an account, if it is known without asking Steam.
+
+    Steam IDs and profile URLs carry it themselves; vanity names and URLs are
+    looked up in the resolve cache.
+    """
+    key = account_key(account)
+    steam_id = steam_id_from_key(key)
+    if steam_id or not key.startswith(VANITY_PREFIX):
+        return steam_id
+    hit, steam_id = get_cached_resolution(key[len(VANITY_PREFIX):], count_lookup=False)
+    return steam_id if hit else None
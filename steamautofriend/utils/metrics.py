@@ -0,0 +1,322 @@
+import contextvars
+import functools
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from ..config import METRICS_ENABLED, METRICS_FILE
+from .logging import logger
+
+# Latency histogram bucket upper bounds (in milliseconds)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf'))
+
+# Name used for work that happens outside any instrumented operation
+UNATTRIBUTED = 'other'
+
+# Stack of instrumented operations the current code is running under
+_operation_stack: contextvars.ContextVar = contextvars.ContextVar('steamautofriend_operation', default=())
+
+_PROFILE_ID_RE = re.compile(r'/profiles/\d+')
+_VANITY_RE = re.compile(r'/id/[^/]+')
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile: the upper bound of the bucket holding it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum_ms': self.total,
+            'max_ms': self.max,
+            'buckets': [{'le': 'inf' if bound == float('inf') else bound, 'count': count}
+                        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)],
+        }
+
+class OperationStats:
+    """Everything recorded for one operation."""
+
+    __slots__ = ('calls', 'errors', 'latency', 'http_requests', 'http_errors', 'bytes_downloaded',
+                 'cache_hits', 'http_timeouts', 'http_retries', 'deadlines_exceeded',
+                 'parse_count', 'parse_ms', 'parse_bytes')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+        # HTTP requests made inside this operation, including nested operations
+        self.http_requests = 0
+        self.http_errors = 0
+        self.bytes_downloaded = 0
+        self.cache_hits = 0
+        self.http_timeouts = 0
+        self.http_retries = 0
+        # Reads not sent because the operation's deadline had passed
+        self.deadlines_exceeded = 0
+        # Page parsing done inside this operation, including nested operations
+        self.parse_count = 0
+        self.parse_ms = 0.0
+        self.parse_bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'latency': self.latency.to_dict(),
+            'http_requests': self.http_requests,
+            'http_errors': self.http_errors,
+            'bytes_downloaded': self.bytes_downloaded,
+            'cache_hits': self.cache_hits,
+            'http_timeouts': self.http_timeouts,
+            'http_retries': self.http_retries,
+            'deadlines_exceeded': self.deadlines_exceeded,
+            'parse_count': self.parse_count,
+            'parse_ms': self.parse_ms,
+            'parse_bytes': self.parse_bytes,
+        }
+
+class EndpointStats:
+    """HTTP requests to one endpoint."""
+
+    __slots__ = ('requests', 'errors', 'statuses', 'bytes_downloaded', 'cache_hits', 'timeouts', 'retries', 'latency')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.statuses: Dict[str, int] = {}
+        self.bytes_downloaded = 0
+        self.cache_hits = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.latency = Histogram()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'statuses': dict(self.statuses),
+            'bytes_downloaded': self.bytes_downloaded,
+            'cache_hits': self.cache_hits,
+            'timeouts': self.timeouts,
+            'retries': self.retries,
+            'latency': self.latency.to_dict(),
+        }
+
+def endpoint_label(method: str, url: str) -> str:
+    """Group URLs into endpoints, e.g. 'GET steamcommunity.com/profiles/<id>/friends'."""
+    parts = urlsplit(url)
+    path = _PROFILE_ID_RE.sub('/profiles/<id>', parts.path)
+    path = _VANITY_RE.sub('/id/<vanity>', path).rstrip('/') or '/'
+    return f"{method.upper()} {parts.hostname or ''}{path}"
+
+class Metrics:
+    """Process-wide counters and histograms for operations, HTTP requests and parsing.
+
+    HTTP requests and parse time are attributed to every instrumented operation
+    they happen under, so both a high-level action (e.g. process_accounts) and
+    the calls it makes (e.g. get_pending_requests) show what they cost. When
+    disabled, instrumented code only pays for a flag check.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self.operations: Dict[str, OperationStats] = {}
+            self.endpoints: Dict[str, EndpointStats] = {}
+
+    def _operation(self, name: str) -> OperationStats:
+        """Must be called with the lock held."""
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+        return stats
+
+    @staticmethod
+    def current_operations() -> Tuple[str, ...]:
+        """Every operation the current code is running under, outermost first."""
+        stack = _operation_stack.get()
+        if not stack:
+            return (UNATTRIBUTED,)
+        # An operation can appear more than once, e.g. resolve_account -> resolve_vanity_url -> ...
+        return tuple(dict.fromkeys(stack))
+
+    @contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        """Time a block as an operation and attribute the work inside it."""
+        if not self.enabled:
+            yield
+            return
+        token = _operation_stack.set(_operation_stack.get() + (name,))
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _operation_stack.reset(token)
+            with self._lock:
+                stats = self._operation(name)
+                stats.calls += 1
+                stats.errors += failed
+                stats.latency.observe(elapsed_ms)
+
+    def _endpoint(self, label: str) -> EndpointStats:
+        """Must be called with the lock held."""
+        endpoint = self.endpoints.get(label)
+        if endpoint is None:
+            endpoint = self.endpoints[label] = EndpointStats()
+        return endpoint
+
+    def record_http(self, method: str, url: str, status: Optional[int], elapsed_ms: float,
+                    size: int = 0, from_cache: bool = False, timed_out: bool = False) -> None:
+        """Record one HTTP request. status is None if the request raised."""
+        label = endpoint_label(method, url)
+        operations = self.current_operations()
+        failed = status is None or status >= 400
+        with self._lock:
+            endpoint = self._endpoint(label)
+            endpoint.requests += 1
+            endpoint.errors += failed
+            status_key = str(status) if status is not None else 'error'
+            endpoint.statuses[status_key] = endpoint.statuses.get(status_key, 0) + 1
+            endpoint.bytes_downloaded += size
+            endpoint.cache_hits += from_cache
+            endpoint.timeouts += timed_out
+            endpoint.latency.observe(elapsed_ms)
+
+            for name in operations:
+                stats = self._operation(name)
+                stats.http_requests += 1
+                stats.http_errors += failed
+                stats.bytes_downloaded += size
+                stats.cache_hits += from_cache
+                stats.http_timeouts += timed_out
+
+    def record_retry(self, method: str, url: str) -> None:
+        """Record that a request is being sent again after a failed attempt."""
+        label = endpoint_label(method, url)
+        operations = self.current_operations()
+        with self._lock:
+            self._endpoint(label).retries += 1
+            for name in operations:
+                self._operation(name).http_retries += 1
+
+    def record_deadline_exceeded(self) -> None:
+        """Record a read that wasn't sent because its operation's deadline had passed."""
+        operations = self.current_operations()
+        with self._lock:
+            for name in operations:
+                self._operation(name).deadlines_exceeded += 1
+
+    def record_parse(self, elapsed_ms: float, size: int) -> None:
+        """Record time spent parsing a page."""
+        operations = self.current_operations()
+        with self._lock:
+            for name in operations:
+                stats = self._operation(name)
+                stats.parse_count += 1
+                stats.parse_ms += elapsed_ms
+                stats.parse_bytes += size
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All metrics as plain data, suitable for JSON."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'started_at': self.started_at,
+                'uptime_seconds': time.time() - self.started_at,
+                'operations': {name: stats.to_dict() for name, stats in sorted(self.operations.items())},
+                'endpoints': {label: stats.to_dict() for label, stats in sorted(self.endpoints.items())},
+            }
+
+    def operation_rows(self) -> List[Tuple[str, OperationStats]]:
+        with self._lock:
+            return sorted(self.operations.items(), key=lambda item: -item[1].http_requests)
+
+    def endpoint_rows(self) -> List[Tuple[str, EndpointStats]]:
+        with self._lock:
+            return sorted(self.endpoints.items(), key=lambda item: -item[1].requests)
+
+    def dump(self, path: Optional[Path] = None) -> Optional[Path]:
+        """Write the metrics snapshot to a JSON file."""
+        path = Path(path) if path else METRICS_FILE
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            logger.info(f"Metrics written to {path}")
+            return path
+        except Exception as e:
+            logger.error(f"Error writing metrics: {str(e)}")
+            return None
+
+_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """Get the process-wide metrics registry."""
+    return _metrics
+
+def instrumented(name: str) -> Callable:
+    """Decorator that records calls to a function as the operation name."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _metrics.enabled:
+                return func(*args, **kwargs)
+            with _metrics.operation(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def propagate(func: Callable) -> Callable:
+    """Wrap func so it runs in the caller's context when called on another thread.
+
+    Worker threads don't inherit the caller's context, so pass work to thread
+    pools through this to keep its HTTP requests attributed to the caller's
+    operation and held to the caller's request deadline.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call gets its own copy
+        return context.copy().run(func, *args, **kwargs)
+    return run
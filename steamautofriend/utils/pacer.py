@@ -0,0 +1,159 @@
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ..config import (
+    MIN_DELAY_BETWEEN_REQUESTS,
+    MAX_DELAY_BETWEEN_REQUESTS,
+    FRIEND_REQUEST_FASTEST_INTERVAL,
+    FRIEND_REQUEST_SLOWEST_INTERVAL,
+    FRIEND_REQUEST_BACKOFF,
+    FRIEND_REQUEST_RECOVERY
+)
+from .logging import logger
+
+class PacingCancelled(Exception):
+    """Raised when a wait for the pacer is cancelled."""
+
+class WritePacer:
+    """Process-wide token bucket pacing friend requests.
+
+    Every thread that sends friend requests takes its turn from the same
+    bucket, so more sending threads never raise the combined rate. The rate
+    adapts to Steam: when it says we are sending too many requests (error 25
+    or HTTP 429) the rate is cut by `backoff` and just under the rate that was
+    throttled becomes a ceiling. Each accepted write regains `recovery` of the
+    fastest rate until the ceiling is reached, after which the ceiling is
+    raised slowly, never past the fastest rate. That keeps the rate just below
+    what Steam accepts instead of alternating between bursts and penalties.
+
+    Each write costs a random 1 +/- jitter tokens, so requests aren't sent at
+    exactly regular intervals.
+    """
+
+    # How far below the throttled rate the new ceiling is set
+    CEILING_MARGIN = 0.9
+    # How much the ceiling is raised after each accepted write at the ceiling
+    PROBE = 0.02
+
+    def __init__(self, fastest_interval: float = max(MIN_DELAY_BETWEEN_REQUESTS, FRIEND_REQUEST_FASTEST_INTERVAL),
+                 initial_interval: float = (MIN_DELAY_BETWEEN_REQUESTS + MAX_DELAY_BETWEEN_REQUESTS) / 2,
+                 slowest_interval: float = FRIEND_REQUEST_SLOWEST_INTERVAL,
+                 backoff: float = FRIEND_REQUEST_BACKOFF, recovery: float = FRIEND_REQUEST_RECOVERY,
+                 jitter: float = 0.5, burst: float = 1.0):
+        self._lock = threading.Lock()
+        self.configure(fastest_interval, initial_interval, slowest_interval, backoff, recovery, jitter, burst)
+
+    def configure(self, fastest_interval: float, initial_interval: float, slowest_interval: float,
+                  backoff: float = FRIEND_REQUEST_BACKOFF, recovery: float = FRIEND_REQUEST_RECOVERY,
+                  jitter: float = 0.5, burst: float = 1.0) -> None:
+        """Set the pacing limits and start over. A fastest_interval of 0 turns pacing off."""
+        with self._lock:
+            self.enabled = fastest_interval > 0
+            self.max_rate = 1 / fastest_interval if self.enabled else float('inf')
+            self.min_rate = min(self.max_rate, 1 / max(slowest_interval, fastest_interval, 1e-9))
+            self.rate = min(self.max_rate, max(self.min_rate, 1 / initial_interval if initial_interval > 0 else self.max_rate))
+            self.ceiling = self.max_rate
+            self.backoff = backoff
+            self.recovery = recovery
+            self.jitter = jitter
+            self.burst = burst
+            self._tokens = burst
+            self._updated = time.monotonic()
+            self._last_throttle = 0.0
+            self.writes = 0
+            self.throttles = 0
+            self.waiting = 0
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens earned since the last update. Must be called with the lock held."""
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> float:
+        """Wait for this thread's turn to write. Returns how long it waited.
+
+        Turns are handed out in the order threads ask for them. If cancel_event
+        is set while waiting, the wait ends early with PacingCancelled.
+        """
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= random.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else 1.0
+            # Tokens only start refilling at _updated, which is in the future during a pause
+            wait = (self._updated - now) + max(0.0, -self._tokens) / self.rate
+            self.waiting += 1
+        try:
+            if wait > 0:
+                if cancel_event is None:
+                    time.sleep(wait)
+                elif cancel_event.wait(wait):
+                    raise PacingCancelled("Write cancelled while waiting for its turn")
+            return wait
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def succeeded(self) -> None:
+        """Record a write Steam accepted, regaining some of the rate."""
+        with self._lock:
+            self.writes += 1
+            if not self.enabled:
+                return
+            if self.rate < self.ceiling:
+                self.rate = min(self.ceiling, self.rate + self.recovery * self.max_rate)
+            else:
+                self.ceiling = min(self.max_rate, self.ceiling * (1 + self.PROBE))
+                self.rate = self.ceiling
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """Record that Steam said we are sending too many requests, and slow down.
+
+        Reports from several threads about the same burst only slow down once.
+        Nothing more is written until retry_after seconds (or one interval at
+        the new rate) have passed.
+        """
+        with self._lock:
+            self.throttles += 1
+            if not self.enabled:
+                return
+            now = time.monotonic()
+            if now - self._last_throttle < 1 / self.rate and not retry_after:
+                return
+            self._last_throttle = now
+            self.ceiling = max(self.min_rate, self.rate * self.CEILING_MARGIN)
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            pause = retry_after if retry_after else 1 / self.rate
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = max(self._updated, now + pause)
+            rate = self.rate
+        logger.warning(f"Steam is throttling requests, slowing down to one friend request every {1 / rate:.1f} seconds "
+                       f"(pausing {pause:.0f} seconds)")
+
+    def interval(self) -> float:
+        """Current average time between writes, in seconds."""
+        with self._lock:
+            return 0.0 if not self.enabled else 1 / self.rate
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'rate_per_minute': self.rate * 60 if self.enabled else None,
+                'interval': 1 / self.rate if self.enabled else 0.0,
+                'ceiling_per_minute': self.ceiling * 60 if self.enabled else None,
+                'writes': self.writes,
+                'throttles': self.throttles,
+                'waiting': self.waiting,
+            }
+
+_write_pacer = WritePacer()
+
+def get_write_pacer() -> WritePacer:
+    """Get the process-wide write pacer."""
+    return _write_pacer
@@ -0,0 +1,140 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+from ..config import PAGE_CACHE_MAX_BYTES
+from .logging import logger
+
+class CachedPage:
+    """A stored response body together with its validators."""
+
+    __slots__ = ('url', 'content', 'encoding', 'content_type', 'etag', 'last_modified')
+
+    def __init__(self, url: str, content: bytes, encoding: Optional[str], content_type: str,
+                 etag: Optional[str], last_modified: Optional[str]):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+
+class PageCache:
+    """Size-bounded LRU cache of GET responses, revalidated with conditional requests.
+
+    Entries are keyed by URL and a hash of the login cookie, so pages fetched under
+    one account are never served to another. A cached body is only reused when Steam
+    answers a conditional request with 304 Not Modified.
+    """
+
+    def __init__(self, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: 'OrderedDict[str, CachedPage]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict[str, Any]], cookie_identity: str) -> str:
+        """Build a cache key from the URL, query parameters and login cookie."""
+        if params:
+            url = f"{url}?{urlencode(sorted(params.items()))}"
+        identity = hashlib.sha1(cookie_identity.encode('utf-8')).hexdigest()[:16]
+        return f"{identity}:{url}"
+
+    def get(self, key: str) -> Optional[CachedPage]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def conditional_headers(entry: CachedPage) -> Dict[str, str]:
+        """Headers that ask the server to reply 304 if the page hasn't changed."""
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, key: str, response) -> None:
+        """Store a 200 response if it carries validators."""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            with self._lock:
+                self.uncacheable += 1
+            return
+
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+
+        entry = CachedPage(response.url, content, response.encoding,
+                           response.headers.get('Content-Type', ''), etag, last_modified)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.content)
+            self._entries[key] = entry
+            self.size += len(content)
+
+            # Evict least recently used pages until we're back under the limit
+            while self.size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.content)
+                self.evictions += 1
+
+    def handle_response(self, key: str, entry: Optional[CachedPage], response):
+        """Update the cache from a response, filling in the body on 304."""
+        if response.status_code == 304 and entry is not None:
+            # Rebuild the response from the cached copy
+            response.status_code = 200
+            response.reason = 'OK'
+            response._content = entry.content
+            response.encoding = entry.encoding
+            if entry.content_type:
+                response.headers['Content-Type'] = entry.content_type
+            response.from_cache = True
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += len(entry.content)
+            logger.debug(f"Page cache hit (304): {entry.url}")
+            return response
+
+        with self._lock:
+            self.misses += 1
+        if response.status_code == 200:
+            self.store(key, response)
+        return response
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache metrics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'uncacheable': self.uncacheable,
+                'evictions': self.evictions,
+                'bytes_saved': self.bytes_saved,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+            }
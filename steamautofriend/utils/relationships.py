@@ -0,0 +1,173 @@
+import threading
+import time
+from typing import Callable, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from ..config import RELATIONSHIP_SNAPSHOT_TTL
+from .logging import logger
+from .friends import fetch_friends, get_pending_requests
+
+class RelationshipDiff:
+    """Changes in the friends and pending sets between two snapshots."""
+
+    def __init__(self, previous_friends: FrozenSet[str], previous_pending: FrozenSet[str],
+                 friends: FrozenSet[str], pending: FrozenSet[str]):
+        self.friends_added = friends - previous_friends
+        self.friends_removed = previous_friends - friends
+        self.pending_added = pending - previous_pending
+        self.pending_removed = previous_pending - pending
+
+    def changed(self) -> Set[str]:
+        """All Steam IDs whose relationship state changed."""
+        return self.friends_added | self.friends_removed | self.pending_added | self.pending_removed
+
+    def __bool__(self) -> bool:
+        return bool(self.friends_added or self.friends_removed or self.pending_added or self.pending_removed)
+
+    def __str__(self) -> str:
+        return (f"+{len(self.friends_added)}/-{len(self.friends_removed)} friends, "
+                f"+{len(self.pending_added)}/-{len(self.pending_removed)} pending")
+
+class RelationshipSnapshot:
+    """Shared view of the friends list and outgoing pending requests.
+
+    One snapshot is kept per SteamSession. It is fetched at most once per
+    RELATIONSHIP_SNAPSHOT_TTL seconds and updated in place when we learn about
+    changes ourselves (e.g. a friend request was sent), so callers don't have to
+    reload the friends and pending pages before every action.
+
+    Only one refresh runs at a time, and the pages are fetched without holding
+    the lock that guards the lists, so readers aren't held up by the network.
+    A caller that waited for someone else's refresh uses its result instead of
+    fetching again.
+    """
+
+    def __init__(self, ttl: float = RELATIONSHIP_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self.friends: Set[str] = set()
+        self.pending: Set[str] = set()
+        self.version = 0
+        self.fetched_at = 0.0
+        self._lock = threading.RLock()
+        # Held while fetching; _refresh_started is when the last fetch began (monotonic)
+        self._refresh_lock = threading.Lock()
+        self._refresh_started = float('-inf')
+
+    def age(self) -> float:
+        """Seconds since the snapshot was last fetched from Steam."""
+        if not self.fetched_at:
+            return float('inf')
+        return time.time() - self.fetched_at
+
+    def is_stale(self) -> bool:
+        return self.age() >= self.ttl
+
+    def refresh(self, steam_session,
+                fetch: Optional[Callable[[], Tuple[Optional[Iterable[str]], Iterable[str]]]] = None
+                ) -> 'RelationshipSnapshot':
+        """Fetch the friends list and pending requests from Steam.
+        
+        fetch returns the (friends, pending) lists, with friends None if it
+        couldn't be fetched; by default they are fetched one after the other.
+        If another refresh started after this call, its result is used instead.
+        """
+        requested = time.monotonic()
+        with self._refresh_lock:
+            if self._refresh_started < requested:
+                self._fetch(steam_session, fetch)
+        return self
+
+    def _fetch(self, steam_session,
+               fetch: Optional[Callable[[], Tuple[Optional[Iterable[str]], Iterable[str]]]]) -> None:
+        """Fetch and store the lists. Call with _refresh_lock held.
+        
+        While the session has expired the lists would come back empty, so the
+        snapshot is kept as it is instead. The same goes for a friends list
+        that couldn't be fetched: the snapshot stays stale, so the next
+        current() tries again. An empty friends list that was fetched is
+        stored and trusted like any other.
+        """
+        self._refresh_started = time.monotonic()
+        breaker = steam_session.session.breaker
+        if breaker.is_blocking('GET'):
+            return
+        if fetch is None:
+            friends, pending = fetch_friends(steam_session), get_pending_requests(steam_session)
+        else:
+            friends, pending = fetch()
+        if breaker.is_blocking('GET'):
+            logger.warning("Session expired while fetching relationships, keeping the previous snapshot")
+            return
+        if friends is None:
+            logger.warning("Could not fetch the friends list, keeping the previous snapshot")
+            return
+        self.update(friends, pending)
+
+    def update(self, friends: Iterable[str], pending: Iterable[str]) -> 'RelationshipSnapshot':
+        """Replace the snapshot contents with freshly fetched lists."""
+        with self._lock:
+            self.friends = set(friends)
+            self.pending = set(pending)
+            self.fetched_at = time.time()
+            self.version += 1
+            logger.debug(f"Relationship snapshot v{self.version}: {len(self.friends)} friends, {len(self.pending)} pending")
+            return self
+
+    def current(self, steam_session,
+                fetch: Optional[Callable[[], Tuple[Optional[Iterable[str]], Iterable[str]]]] = None
+                ) -> 'RelationshipSnapshot':
+        """Return the snapshot, refreshing it first if it has expired."""
+        if not self.is_stale():
+            return self
+        requested = time.monotonic()
+        with self._refresh_lock:
+            # Someone else may have refreshed (or tried to) while we waited
+            if self.is_stale() and self._refresh_started < requested:
+                self._fetch(steam_session, fetch)
+        return self
+
+    def invalidate(self) -> None:
+        """Force the next current() call to refetch."""
+        with self._lock:
+            self.fetched_at = 0.0
+
+    def is_friend(self, steam_id: str) -> bool:
+        with self._lock:
+            return steam_id in self.friends
+
+    def is_pending(self, steam_id: str) -> bool:
+        with self._lock:
+            return steam_id in self.pending
+
+    def friends_list(self) -> List[str]:
+        with self._lock:
+            return list(self.friends)
+
+    def pending_list(self) -> List[str]:
+        with self._lock:
+            return list(self.pending)
+
+    def state(self) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """Return an immutable copy of (friends, pending) for later diffing."""
+        with self._lock:
+            return frozenset(self.friends), frozenset(self.pending)
+
+    def diff(self, previous_state: Optional[Tuple[FrozenSet[str], FrozenSet[str]]]) -> RelationshipDiff:
+        """Compute what changed since previous_state (as returned by state())."""
+        previous_friends, previous_pending = previous_state or (frozenset(), frozenset())
+        friends, pending = self.state()
+        return RelationshipDiff(previous_friends, previous_pending, friends, pending)
+
+    def mark_pending(self, steam_id: str) -> None:
+        """Record that a friend request to steam_id is now pending."""
+        with self._lock:
+            if steam_id not in self.pending:
+                self.pending.add(steam_id)
+                self.version += 1
+
+    def mark_friend(self, steam_id: str) -> None:
+        """Record that steam_id is now a friend."""
+        with self._lock:
+            if steam_id not in self.friends:
+                self.pending.discard(steam_id)
+                self.friends.add(steam_id)
+                self.version += 1
@@ -0,0 +1,137 @@
+import contextvars
+import functools
+import random
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+
+from ..config import (
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    ENDPOINT_READ_TIMEOUTS,
+    REQUEST_RETRIES,
+    RETRY_BACKOFF
+)
+from .metrics import endpoint_label
+
+# Methods that only read. Only these are retried; the others change something on Steam
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Endpoints that send friend requests. Only writes to these are paced, and
+# only these are held back while Steam is throttling us or wants a CAPTCHA
+PACED_PATHS = ('/actions/AddFriendAjax',)
+
+# Monotonic time the reads of the current operation must be done by, if it has a deadline
+_deadline: contextvars.ContextVar = contextvars.ContextVar('steamautofriend_deadline', default=None)
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of sending a read once the deadline of its operation has passed."""
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """Give the reads made inside the block seconds to finish, retries included.
+
+    Applies to the reads made on this thread and on threads the work is passed
+    to with propagate(). A nested deadline can only shorten the outer one.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def with_deadline(seconds: float) -> Callable:
+    """Decorator that runs a function under request_deadline(seconds)."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request_deadline(seconds):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def is_paced(method: str, url: Optional[str] = None) -> bool:
+    """Whether a request sends a friend request. Without a url, any write is taken to be one."""
+    return method.upper() not in READ_METHODS and (url is None or urlsplit(url).path.startswith(PACED_PATHS))
+
+def deadline_remaining() -> Optional[float]:
+    """Seconds left until the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+class RequestPolicy:
+    """Timeouts and retries for every request a PoliteSession sends.
+
+    Each request gets a connect timeout and a read timeout for its endpoint
+    (the longest matching prefix in ENDPOINT_READ_TIMEOUTS, otherwise
+    READ_TIMEOUT). Reads are also held to the deadline of the operation they
+    belong to: their timeouts are cut to the time left, and once it has run
+    out they fail with DeadlineExceeded without being sent.
+
+    Reads that fail to connect, time out or get a 5xx answer are retried after
+    a jittered, doubling backoff, as long as the deadline leaves time for it.
+    Writes are never retried, since Steam may have acted on them.
+    """
+
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 endpoint_read_timeouts: Optional[dict] = None, retries: int = REQUEST_RETRIES,
+                 backoff: float = RETRY_BACKOFF):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        endpoint_read_timeouts = ENDPOINT_READ_TIMEOUTS if endpoint_read_timeouts is None else endpoint_read_timeouts
+        # Longest prefix first, so the most specific endpoint wins
+        self.endpoint_read_timeouts = sorted(endpoint_read_timeouts.items(), key=lambda item: -len(item[0]))
+        self.retries = retries
+        self.backoff = backoff
+
+    def timeout(self, method: str, url: str,
+                requested: Union[None, float, Tuple[float, float]] = None) -> Tuple[float, float]:
+        """The (connect, read) timeout for a request, cut to the deadline if it is a read.
+
+        requested is a timeout the caller passed explicitly; it replaces the
+        endpoint's timeout but not the deadline.
+        """
+        if requested is None:
+            endpoint = endpoint_label(method, url).split(' ', 1)[1]
+            read = next((timeout for prefix, timeout in self.endpoint_read_timeouts if endpoint.startswith(prefix)),
+                        self.read_timeout)
+            connect = self.connect_timeout
+        elif isinstance(requested, tuple):
+            connect, read = requested
+        else:
+            connect = read = requested
+
+        remaining = deadline_remaining() if method.upper() in READ_METHODS else None
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Deadline passed, not sending {method} {url}")
+            connect, read = min(connect, remaining), min(read, remaining)
+        return connect, read
+
+    def attempts(self, method: str) -> int:
+        """How many times a request may be sent."""
+        return 1 + (self.retries if method.upper() in READ_METHODS else 0)
+
+    def should_retry(self, response: Optional[requests.Response] = None,
+                     error: Optional[Exception] = None) -> bool:
+        """Whether a failed attempt at a read is worth repeating."""
+        if error is not None:
+            if isinstance(error, DeadlineExceeded):
+                return False
+            return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        return response is not None and response.status_code in self.RETRY_STATUSES
+
+    def retry_delay(self, attempt: int) -> Optional[float]:
+        """How long to wait before retry number attempt (starting at 1), or None if the deadline doesn't allow it."""
+        delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        remaining = deadline_remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
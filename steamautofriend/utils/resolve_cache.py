@@ -0,0 +1,128 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from ..config import RESOLVE_CACHE_FILE, RESOLVE_CACHE_TTL_HOURS, RESOLVE_CACHE_NEGATIVE_TTL_MINUTES
+from .logging import logger
+
+# In-memory copy of the resolve cache, loaded lazily from RESOLVE_CACHE_FILE.
+# Maps normalized vanity name -> (steam_id or None, resolved_at)
+_cache: Optional[Dict[str, Tuple[Optional[str], float]]] = None
+_cache_lock = threading.Lock()
+
+# Number of lines in the file that have been superseded by newer entries.
+# The file is compacted once this grows larger than the live entry count.
+_stale_lines = 0
+
+# Lookup counters for monitoring
+_hits = 0
+_misses = 0
+
+def normalize_vanity(vanity_name: str) -> str:
+    """Normalize a vanity name for use as a cache key (vanity URLs are case-insensitive)."""
+    return vanity_name.strip().strip('/').lower()
+
+def ensure_resolve_cache_file() -> None:
+    """Create the resolve cache file if it doesn't exist."""
+    if not RESOLVE_CACHE_FILE.exists():
+        RESOLVE_CACHE_FILE.touch()
+        logger.info("Created new resolve cache file")
+
+def _load() -> Dict[str, Tuple[Optional[str], float]]:
+    """Load the resolve cache from disk. Must be called with _cache_lock held."""
+    global _cache, _stale_lines
+    if _cache is not None:
+        return _cache
+
+    _cache = {}
+    _stale_lines = 0
+    try:
+        ensure_resolve_cache_file()
+        with open(RESOLVE_CACHE_FILE, 'r') as f:
+            for line in f:
+                # Format: vanity|steam_id|resolved_at (empty steam_id = failed lookup)
+                parts = line.strip().split('|')
+                if len(parts) < 3:
+                    continue
+                try:
+                    resolved_at = float(parts[2])
+                except ValueError:
+                    continue
+                if parts[0] in _cache:
+                    _stale_lines += 1
+                _cache[parts[0]] = (parts[1] or None, resolved_at)
+        logger.debug(f"Loaded {len(_cache)} entries from resolve cache")
+    except Exception as e:
+        logger.error(f"Error loading resolve cache: {str(e)}")
+    return _cache
+
+def _compact() -> None:
+    """Rewrite the cache file with only live entries. Must be called with _cache_lock held."""
+    global _stale_lines
+    try:
+        with open(RESOLVE_CACHE_FILE, 'w') as f:
+            for key, (steam_id, resolved_at) in _cache.items():
+                f.write(f"{key}|{steam_id or ''}|{resolved_at}\n")
+        _stale_lines = 0
+        logger.debug(f"Compacted resolve cache to {len(_cache)} entries")
+    except Exception as e:
+        logger.error(f"Error compacting resolve cache: {str(e)}")
+
+def get_cached_resolution(vanity_name: str, count_lookup: bool = True) -> Tuple[bool, Optional[str]]:
+    """Look up a vanity name in the resolve cache.
+
+    Args:
+        count_lookup: Whether the lookup counts towards the hit/miss statistics
+
+    Returns:
+        Tuple[bool, Optional[str]]: (hit, steam_id). A hit with steam_id None means
+        the vanity name is known not to resolve and should not be looked up again yet.
+    """
+    global _hits, _misses
+    key = normalize_vanity(vanity_name)
+    with _cache_lock:
+        entry = _load().get(key)
+        if entry is not None:
+            steam_id, resolved_at = entry
+            ttl = RESOLVE_CACHE_TTL_HOURS * 3600 if steam_id else RESOLVE_CACHE_NEGATIVE_TTL_MINUTES * 60
+            # Expired entries count as misses - the caller should revalidate
+            if time.time() - resolved_at < ttl:
+                _hits += count_lookup
+                return True, steam_id
+        _misses += count_lookup
+    return False, None
+
+def cache_resolution(vanity_name: str, steam_id: Optional[str]) -> None:
+    """Store the result of a vanity name lookup (None for a failed lookup)."""
+    key = normalize_vanity(vanity_name)
+    if not key or '|' in key:
+        return
+
+    global _stale_lines
+    with _cache_lock:
+        cache = _load()
+        if key in cache:
+            _stale_lines += 1
+        cache[key] = (steam_id, time.time())
+        try:
+            # Append instead of rewriting so each new resolution costs O(1)
+            with open(RESOLVE_CACHE_FILE, 'a') as f:
+                f.write(f"{key}|{steam_id or ''}|{cache[key][1]}\n")
+        except Exception as e:
+            logger.error(f"Error saving resolve cache entry: {str(e)}")
+        if _stale_lines > max(len(cache), 100):
+            _compact()
+
+def invalidate_resolution(vanity_name: str) -> None:
+    """Forget a cached resolution so the next lookup goes to Steam."""
+    key = normalize_vanity(vanity_name)
+    with _cache_lock:
+        cache = _load()
+        if key in cache:
+            del cache[key]
+            _compact()
+
+def get_resolve_cache_stats() -> Dict[str, int]:
+    """Return the number of cached entries and lookup hits/misses."""
+    with _cache_lock:
+        return {'entries': len(_load()), 'hits': _hits, 'misses': _misses}
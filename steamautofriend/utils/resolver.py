@@ -2,8 +2,16 @@ import json
 import re
 from typing import Optional
 
+import requests
+
+from ..config import RESOLVE_DEADLINE
 from .logging import logger
+from .metrics import instrumented
+from .request_policy import with_deadline
+from .resolve_cache import get_cached_resolution, cache_resolution
 
+@instrumented('resolve_account')
+@with_deadline(RESOLVE_DEADLINE)
 def resolve_account(account: str, steam_session) -> Optional[str]:
     """Resolve a username, URL, or Steam ID to a Steam ID."""
     if not steam_session or not steam_session.logged_in:
@@ -34,12 +42,28 @@ def resolve_account(account: str, steam_session) -> Optional[str]:
         
     return None
 
+def _raise_for_outage(response: requests.Response) -> None:
+    """Raise for answers that say Steam couldn't answer right now (5xx or 429), rather than that it doesn't know the name."""
+    if response.status_code >= 500 or response.status_code == 429:
+        raise requests.exceptions.HTTPError(f"HTTP {response.status_code}", response=response)
+
+@instrumented('resolve_vanity_url')
 def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
     """Resolve a vanity URL to a Steam ID."""
     if not steam_session or not steam_session.logged_in:
         logger.error("Not logged in")
         return None
         
+    # Serve from the on-disk cache if we've seen this vanity name recently
+    hit, cached_steam_id = get_cached_resolution(vanity_url)
+    if hit:
+        logger.debug(f"Resolved vanity URL from cache: {vanity_url} -> {cached_steam_id}")
+        return cached_steam_id
+        
+    # Track whether any lookup failed for transient reasons, so we don't
+    # cache a negative result that might just be a network hiccup
+    had_errors = False
+        
     try:
         # Clean up input
         vanity_url = vanity_url.strip()
@@ -52,6 +76,7 @@ def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
         try:
             profile_url = f"https://steamcommunity.com/id/{vanity_url}"
             response = steam_session.session.get(profile_url, allow_redirects=True)
+            _raise_for_outage(response)
             
             # Check if redirected to a /profiles/ URL (meaning it's a valid vanity URL)
             if '/profiles/' in response.url:
@@ -61,8 +86,10 @@ def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
                     # Validate that this is not our own Steam ID
                     if own_steam_id and steam_id == own_steam_id:
                         logger.warning(f"Vanity URL '{vanity_url}' resolved to our own Steam ID, likely invalid")
+                        cache_resolution(vanity_url, None)
                         return None
                     logger.info(f"Resolved vanity URL via redirect: {vanity_url} -> {steam_id}")
+                    cache_resolution(vanity_url, steam_id)
                     return steam_id
             
             # Look for the Steam ID in the page content
@@ -72,8 +99,10 @@ def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
                 # Validate that this is not our own Steam ID
                 if own_steam_id and steam_id == own_steam_id:
                     logger.warning(f"Vanity URL '{vanity_url}' resolved to our own Steam ID, likely invalid")
+                    cache_resolution(vanity_url, None)
                     return None
                 logger.info(f"Resolved vanity URL via page content: {vanity_url} -> {steam_id}")
+                cache_resolution(vanity_url, steam_id)
                 return steam_id
             
             # If we got here, try looking for g_rgProfileData
@@ -86,14 +115,17 @@ def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
                         # Validate that this is not our own Steam ID
                         if own_steam_id and steam_id == own_steam_id:
                             logger.warning(f"Vanity URL '{vanity_url}' resolved to our own Steam ID, likely invalid")
+                            cache_resolution(vanity_url, None)
                             return None
                         logger.info(f"Resolved vanity URL via g_rgProfileData: {vanity_url} -> {steam_id}")
+                        cache_resolution(vanity_url, steam_id)
                         return steam_id
                 except json.JSONDecodeError:
                     logger.error(f"Failed to parse g_rgProfileData JSON for vanity URL: {vanity_url}")
         
         except Exception as e:
             logger.error(f"Error resolving vanity URL '{vanity_url}' via profile page: {str(e)}")
+            had_errors = True
         
         # Last resort: try looking up by account data, might be a username
         try:
@@ -109,6 +141,7 @@ def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
                 'sessionid': session_id
             }
             response = steam_session.session.post('https://steamcommunity.com/search/SearchCommunityAjax', data=form_data)
+            _raise_for_outage(response)
             search_data = response.json()
             
             if search_data.get('success', 0) == 1 and search_data.get('html'):
@@ -123,11 +156,14 @@ def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
                     # Validate that this is not our own Steam ID
                     if own_steam_id and steam_id == own_steam_id:
                         logger.warning(f"Vanity URL '{vanity_url}' resolved to our own Steam ID, likely invalid")
+                        cache_resolution(vanity_url, None)
                         return None
                     logger.info(f"Resolved vanity URL via search: {vanity_url} -> {steam_id}")
+                    cache_resolution(vanity_url, steam_id)
                     return steam_id
         except Exception as e:
             logger.error(f"Error resolving vanity URL '{vanity_url}' via search: {str(e)}")
+            had_errors = True
         
         try:
             api_url = "https://api.steampowered.com/ISteamUser/ResolveVanityURL/v1/"
@@ -136,20 +172,35 @@ def resolve_vanity_url(vanity_url: str, steam_session) -> Optional[str]:
                 "url_type": 1  # 1 for individual profile
             }
             response = steam_session.session.get(api_url, params=params)
-            data = response.json()
+            # Without an API key Steam normally refuses with a 403 page that isn't JSON.
+            # That is no answer rather than an error, so it doesn't keep a name that every
+            # other source answered for from being remembered as unknown
+            _raise_for_outage(response)
+            try:
+                data = response.json() if response.status_code < 400 else {}
+            except ValueError:
+                data = {}
+            if not data:
+                logger.debug(f"Steam API gave no answer for vanity URL '{vanity_url}' (HTTP {response.status_code})")
             
             if data.get("response", {}).get("success") == 1:
                 steam_id = data["response"]["steamid"]
                 # Validate that this is not our own Steam ID
                 if own_steam_id and steam_id == own_steam_id:
                     logger.warning(f"Vanity URL '{vanity_url}' resolved to our own Steam ID, likely invalid")
+                    cache_resolution(vanity_url, None)
                     return None
                 logger.info(f"Resolved vanity URL using Steam API: {vanity_url} -> {steam_id}")
+                cache_resolution(vanity_url, steam_id)
                 return steam_id
         except Exception as e:
             logger.error(f"Error using Steam API to resolve vanity URL: {str(e)}")
+            had_errors = True
         
         logger.error(f"Failed to resolve vanity URL: {vanity_url}")
+        if not had_errors:
+            # Every source answered and none knew this name - remember that
+            cache_resolution(vanity_url, None)
         return None
         
     except Exception as e:
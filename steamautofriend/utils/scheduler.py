@@ -0,0 +1,95 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class ReadinessScheduler:
+    """Accounts ordered by the time they are next eligible for a friend request.
+
+    A heap keyed by next-eligible time, so taking the accounts that are due is
+    O(log n) each and accounts in cooldown aren't looked at again until their
+    time comes. Rescheduling an account leaves its old heap entry behind; stale
+    entries are skipped when they reach the top.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, str]] = []
+        # Current (due time, sequence number) of every scheduled account
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, account: str) -> bool:
+        with self._lock:
+            return account in self._entries
+
+    def schedule(self, account: str, due: float = 0.0) -> None:
+        """Schedule an account to become due at a Unix time, replacing any earlier schedule."""
+        with self._lock:
+            entry = (due, next(self._counter))
+            self._entries[account] = entry
+            heapq.heappush(self._heap, (entry[0], entry[1], account))
+            # Rebuild once stale entries make up most of the heap
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._compact()
+
+    def schedule_many(self, accounts: Iterable[Tuple[str, float]]) -> None:
+        """Schedule (account, due) pairs in one go."""
+        with self._lock:
+            for account, due in accounts:
+                self._entries[account] = (due, next(self._counter))
+            self._compact()
+
+    def remove(self, account: str) -> None:
+        """Stop tracking an account."""
+        with self._lock:
+            self._entries.pop(account, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap = []
+            self._entries = {}
+
+    def _compact(self) -> None:
+        """Rebuild the heap from the live entries. Must be called with the lock held."""
+        self._heap = [(due, seq, account) for account, (due, seq) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def _drop_stale(self) -> None:
+        """Pop superseded entries off the top of the heap. Must be called with the lock held."""
+        while self._heap:
+            due, seq, account = self._heap[0]
+            if self._entries.get(account) == (due, seq):
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: Optional[float] = None) -> Optional[str]:
+        """Remove and return the account that has been due the longest, or None if none is due.
+
+        The caller reschedules the account if it should be looked at again.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return None
+            _, _, account = heapq.heappop(self._heap)
+            del self._entries[account]
+            return account
+
+    def next_due(self) -> Optional[float]:
+        """When the next account becomes due, or None if nothing is scheduled."""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def due_count(self, now: Optional[float] = None) -> int:
+        """How many accounts are due. O(n); meant for status output."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return sum(1 for due, _ in self._entries.values() if due <= now)
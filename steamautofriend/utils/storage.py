@@ -0,0 +1,894 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from ..config import ACCOUNTS_FILE, BLACKLIST_FILE, STATE_DB_FILE, STORAGE_BACKEND
+from .logging import logger
+from .identity import account_key, known_steam_id
+
+# --- Text file formats -------------------------------------------------------
+# accounts.txt: one account per line (or a JSON list)
+# blacklist.txt: steam_id|reason|timestamp|count|last_attempt
+
+# Size of the reads used to stream accounts files
+ACCOUNTS_READ_CHUNK = 64 * 1024
+
+def _normalize_account(value: Any) -> Optional[str]:
+    account = str(value).strip()
+    return account or None
+
+def _iter_json_accounts(f, buf: str) -> Iterator[str]:
+    """Yield the items of a JSON list one at a time, reading f only as far as needed.
+
+    buf holds what has been read so far, starting at the opening bracket.
+    Raises ValueError if the list is malformed.
+    """
+    decoder = json.JSONDecoder()
+    pos = 1
+    eof = False
+    expect_value = True
+    lookahead = ACCOUNTS_READ_CHUNK
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        # Keep some unread text after pos so a value is never cut off at the end of the buffer
+        if not eof and len(buf) - pos < lookahead:
+            chunk = f.read(ACCOUNTS_READ_CHUNK)
+            eof = not chunk
+            # Drop what has been consumed so the buffer stays small
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        if pos == len(buf):
+            raise ValueError("Unterminated JSON account list")
+
+        char = buf[pos]
+        if char == ']':
+            return
+        if not expect_value:
+            if char != ',':
+                raise ValueError(f"Expected ',' in JSON account list, found {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = len(buf)
+        if end == len(buf) and not eof:
+            # The value may be longer than the lookahead; read further and try again
+            lookahead = len(buf) - pos + ACCOUNTS_READ_CHUNK
+            continue
+        pos = end
+        lookahead = ACCOUNTS_READ_CHUNK
+        expect_value = False
+        account = _normalize_account(value)
+        if account:
+            yield account
+
+def iter_accounts_file(path: Path) -> Iterator[str]:
+    """Yield accounts from a text or JSON accounts file as it is read.
+
+    Only a chunk of the file is held in memory at a time, so callers can start
+    working on the first accounts of a very large file straight away. Accounts
+    are stripped and blank entries are skipped.
+    """
+    if not path.exists():
+        return
+
+    with open(path, 'r') as f:
+        # Look at the first non-blank character to tell the formats apart
+        head = f.read(ACCOUNTS_READ_CHUNK)
+        while head and not head.strip():
+            head = f.read(ACCOUNTS_READ_CHUNK)
+        head = head.lstrip()
+        if not head:
+            logger.info("Accounts file is empty")
+            return
+
+        count = 0
+        # Try to parse as JSON first (new format)
+        if head.startswith('['):
+            records = _iter_json_accounts(f, head)
+            try:
+                first = next(records, None)
+            except ValueError:
+                # Not a JSON list after all; read it as lines
+                records = None
+            if records is not None:
+                if first is not None:
+                    yield first
+                    count = 1
+                    try:
+                        for account in records:
+                            count += 1
+                            yield account
+                    except ValueError as e:
+                        logger.error(f"Error reading accounts file after {count} accounts: {str(e)}")
+                logger.info(f"Loaded {count} accounts from JSON format")
+                return
+
+        # Not JSON, read line-by-line format (old format)
+        f.seek(0)
+        for line in f:
+            account = _normalize_account(line)
+            if account:
+                count += 1
+                yield account
+        logger.info(f"Loaded {count} accounts from text format")
+
+def is_json_accounts_file(path: Path) -> bool:
+    """Whether an accounts file holds a JSON list rather than one account per line."""
+    with open(path, 'r') as f:
+        for chunk in iter(lambda: f.read(ACCOUNTS_READ_CHUNK), ''):
+            chunk = chunk.lstrip()
+            if chunk:
+                return chunk.startswith('[')
+    return False
+
+def read_accounts_file(path: Path) -> List[str]:
+    """Read accounts from a text or JSON accounts file."""
+    return list(iter_accounts_file(path))
+
+def _write_lines(path: Path, lines: Iterable[str]) -> None:
+    """Replace a file with the given lines in one step.
+
+    The lines go to a temporary file next to it that is then renamed over it,
+    so a reader streaming the file sees either the old or the new version,
+    never one that is half written.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'w') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_accounts_file(path: Path, accounts: List[str]) -> None:
+    """Write accounts to a text file, one per line."""
+    _write_lines(path, (f"{account}\n" for account in accounts))
+
+def read_blacklist_file(path: Path) -> Dict[str, Dict[str, Any]]:
+    """Read a blacklist text file into a dictionary keyed by Steam ID."""
+    blacklist = {}
+    if not path.exists():
+        return blacklist
+
+    with open(path, 'r') as f:
+        for line in f:
+            parts = line.strip().split('|')
+            if len(parts) >= 3:
+                steam_id = parts[0]
+                reason = parts[1]
+                timestamp = parts[2]
+                count = int(parts[3]) if len(parts) > 3 else 1
+                last_attempt = float(parts[4]) if len(parts) > 4 else time.time()
+                blacklist[steam_id] = {
+                    'reason': reason,
+                    'timestamp': timestamp,
+                    'count': count,
+                    'last_attempt': last_attempt
+                }
+    return blacklist
+
+def format_blacklist_line(steam_id: str, data: Dict[str, Any]) -> str:
+    """Format a single blacklist entry as a line of blacklist.txt."""
+    return f"{steam_id}|{data['reason']}|{data['timestamp']}|{data['count']}|{data['last_attempt']}\n"
+
+def write_blacklist_file(path: Path, blacklist: Dict[str, Dict[str, Any]]) -> None:
+    """Write a blacklist dictionary to a text file."""
+    _write_lines(path, (format_blacklist_line(steam_id, data) for steam_id, data in blacklist.items()))
+
+# --- Storage backends --------------------------------------------------------
+
+class StateStore(ABC):
+    """Base class for account queue and blacklist storage backends."""
+
+    @abstractmethod
+    def load_blacklist(self) -> Dict[str, Dict[str, Any]]:
+        """All blacklist entries, by Steam ID."""
+
+    @abstractmethod
+    def get_blacklist_entry(self, steam_id: str) -> Optional[Dict[str, Any]]:
+        """The blacklist entry for a Steam ID, or None if there isn't one."""
+
+    @abstractmethod
+    def set_blacklist_entry(self, steam_id: str, data: Dict[str, Any]) -> None:
+        """Add or replace the blacklist entry for a Steam ID."""
+
+    @abstractmethod
+    def delete_blacklist_entry(self, steam_id: str) -> None:
+        """Remove the blacklist entry for a Steam ID, if there is one."""
+
+    @abstractmethod
+    def replace_blacklist(self, blacklist: Dict[str, Dict[str, Any]]) -> None:
+        """Replace the whole blacklist."""
+
+    def apply_blacklist_changes(self, updates: Dict[str, Dict[str, Any]], deletions: Set[str]) -> None:
+        """Apply a batch of blacklist updates and deletions."""
+        for steam_id in deletions:
+            self.delete_blacklist_entry(steam_id)
+        for steam_id, data in updates.items():
+            self.set_blacklist_entry(steam_id, data)
+
+    # Accounts that turn out to be the same Steam user (e.g. a vanity name and a
+    # /profiles/ URL) are aliases: only the first one added is listed and
+    # processed, and the others are kept as alternative spellings of it.
+
+    @abstractmethod
+    def load_accounts(self) -> List[str]:
+        """The stored accounts, one per Steam user."""
+
+    def iter_accounts(self) -> Iterator[str]:
+        """Yield the stored accounts in order without loading them all at once."""
+        return iter(self.load_accounts())
+
+    def has_account(self, account: str) -> bool:
+        """Whether an account (or another spelling of it) is stored."""
+        key = account_key(account)
+        return any(account_key(stored) == key for stored in self.load_accounts())
+
+    def get_account_steam_id(self, account: str) -> Optional[str]:
+        """The canonical SteamID64 recorded for an account, if known."""
+        return known_steam_id(account)
+
+    def link_account(self, account: str, steam_id: str) -> Optional[str]:
+        """Record the SteamID64 a stored account resolved to, merging it with any
+        other account for the same user. Returns the account it is now listed as,
+        or None if the account isn't stored."""
+        return None
+
+    def account_aliases(self) -> Dict[str, List[str]]:
+        """Other spellings of stored accounts, by the account they are listed as."""
+        return {}
+
+    def count_accounts(self) -> int:
+        return sum(1 for _ in self.iter_accounts())
+
+    @abstractmethod
+    def add_account(self, account: str) -> bool:
+        """Add an account. Returns False if it was already present, possibly under another spelling."""
+
+    @abstractmethod
+    def remove_account_at(self, index: int) -> Optional[str]:
+        """Remove the account at a 0-based position, with its aliases. Returns the removed account."""
+
+    @abstractmethod
+    def remove_account_matching(self, text: str) -> Optional[str]:
+        """Remove the first account containing text (case-insensitive), with its aliases."""
+
+    @abstractmethod
+    def replace_accounts(self, accounts: List[str]) -> None:
+        """Replace the stored accounts with a list."""
+
+    def close(self) -> None:
+        pass
+
+class TextStateStore(StateStore):
+    """Stores state directly in accounts.txt and blacklist.txt.
+
+    Every update rewrites the whole file; kept for compatibility and manual editing.
+    Accounts are the exception: they are kept in memory with an index by
+    account_key(), reloaded when the file changes on disk, so adding an account
+    is a lookup and an append.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Every line of accounts.txt, and the index of their account_key()s
+        self._accounts: List[str] = []
+        self._account_index: Dict[str, str] = {}
+        self._accounts_json = False
+        self._accounts_file_state = None
+        # Steam IDs recorded by link_account(), by account_key()
+        self._steam_ids: Dict[str, str] = {}
+        # Accounts grouped by Steam user, rebuilt when _groups_stale is set
+        self._primary_accounts: List[str] = []
+        self._aliases: Dict[str, List[str]] = {}
+        self._primary_of: Dict[str, str] = {}
+        self._steam_id_index: Dict[str, str] = {}
+        self._groups_stale = True
+
+    def load_blacklist(self) -> Dict[str, Dict[str, Any]]:
+        return read_blacklist_file(BLACKLIST_FILE)
+
+    def get_blacklist_entry(self, steam_id: str) -> Optional[Dict[str, Any]]:
+        return self.load_blacklist().get(steam_id)
+
+    def set_blacklist_entry(self, steam_id: str, data: Dict[str, Any]) -> None:
+        blacklist = self.load_blacklist()
+        if steam_id in blacklist:
+            blacklist[steam_id] = data
+            write_blacklist_file(BLACKLIST_FILE, blacklist)
+        else:
+            with open(BLACKLIST_FILE, 'a') as f:
+                f.write(format_blacklist_line(steam_id, data))
+
+    def delete_blacklist_entry(self, steam_id: str) -> None:
+        blacklist = self.load_blacklist()
+        if steam_id in blacklist:
+            del blacklist[steam_id]
+            write_blacklist_file(BLACKLIST_FILE, blacklist)
+
+    def replace_blacklist(self, blacklist: Dict[str, Dict[str, Any]]) -> None:
+        write_blacklist_file(BLACKLIST_FILE, blacklist)
+
+    def apply_blacklist_changes(self, updates: Dict[str, Dict[str, Any]], deletions: Set[str]) -> None:
+        # One read and one rewrite for the whole batch
+        blacklist = self.load_blacklist()
+        for steam_id in deletions:
+            blacklist.pop(steam_id, None)
+        blacklist.update(updates)
+        write_blacklist_file(BLACKLIST_FILE, blacklist)
+
+    @staticmethod
+    def _file_state(path: Path) -> Optional[tuple]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _sync_accounts(self) -> None:
+        """Reload the accounts and their index if accounts.txt changed. Call with the lock held."""
+        state = self._file_state(ACCOUNTS_FILE)
+        if state == self._accounts_file_state:
+            return
+        self._accounts = []
+        self._account_index = {}
+        for account in iter_accounts_file(ACCOUNTS_FILE):
+            self._account_index.setdefault(account_key(account), account)
+            self._accounts.append(account)
+        self._accounts_json = state is not None and is_json_accounts_file(ACCOUNTS_FILE)
+        self._accounts_file_state = state
+        self._groups_stale = True
+
+    def _account_identity(self, key: str, account: str) -> str:
+        """The Steam ID an account is known to belong to, or its key if there isn't one."""
+        return self._steam_ids.get(key) or known_steam_id(account) or key
+
+    def _sync_groups(self) -> None:
+        """Group the accounts by Steam user if anything changed. Call with the lock held."""
+        self._sync_accounts()
+        if not self._groups_stale:
+            return
+        self._primary_accounts = []
+        self._aliases = {}
+        self._primary_of = {}
+        self._steam_id_index = {}
+        for key, account in self._account_index.items():
+            identity = self._account_identity(key, account)
+            primary = self._steam_id_index.get(identity)
+            if primary is None:
+                self._steam_id_index[identity] = account
+                self._primary_accounts.append(account)
+                primary = account
+            else:
+                self._aliases.setdefault(primary, []).append(account)
+            self._primary_of[key] = primary
+        self._groups_stale = False
+
+    def _write_accounts(self, accounts: List[str]) -> None:
+        """Rewrite accounts.txt from a list and rebuild the index. Call with the lock held."""
+        write_accounts_file(ACCOUNTS_FILE, accounts)
+        self._accounts_file_state = None
+        self._sync_accounts()
+
+    def _remove_group(self, primary: str) -> None:
+        """Rewrite accounts.txt without an account and its aliases. Call with the lock held."""
+        removed = {primary, *self._aliases.get(primary, ())}
+        self._write_accounts([account for account in self._accounts if account not in removed])
+
+    def load_accounts(self) -> List[str]:
+        with self._lock:
+            self._sync_groups()
+            return list(self._primary_accounts)
+
+    def iter_accounts(self) -> Iterator[str]:
+        # Stream the file, skipping accounts for a Steam user that was already yielded.
+        # Rewrites replace the file rather than truncating it, so this keeps reading
+        # the version it opened
+        seen = set()
+        for account in iter_accounts_file(ACCOUNTS_FILE):
+            key = account_key(account)
+            identity = self._account_identity(key, account)
+            if identity not in seen:
+                seen.add(identity)
+                yield account
+
+    def count_accounts(self) -> int:
+        with self._lock:
+            self._sync_groups()
+            return len(self._primary_accounts)
+
+    def has_account(self, account: str) -> bool:
+        with self._lock:
+            self._sync_accounts()
+            return account_key(account) in self._account_index
+
+    def get_account_steam_id(self, account: str) -> Optional[str]:
+        return self._steam_ids.get(account_key(account)) or known_steam_id(account)
+
+    def link_account(self, account: str, steam_id: str) -> Optional[str]:
+        key = account_key(account)
+        with self._lock:
+            self._sync_accounts()
+            if key not in self._account_index:
+                return None
+            if self._steam_ids.get(key) != steam_id:
+                self._steam_ids[key] = steam_id
+                # Regroup lazily, so linking a whole queue costs one pass
+                self._groups_stale = True
+            self._sync_groups()
+            return self._primary_of.get(key)
+
+    def account_aliases(self) -> Dict[str, List[str]]:
+        with self._lock:
+            self._sync_groups()
+            return {primary: list(aliases) for primary, aliases in self._aliases.items()}
+
+    def add_account(self, account: str) -> bool:
+        key = account_key(account)
+        with self._lock:
+            self._sync_groups()
+            if key in self._account_index:
+                return False
+            steam_id = known_steam_id(account)
+            primary = self._steam_id_index.get(steam_id) if steam_id else None
+            if self._accounts_json:
+                # Appending a line would break a JSON list; switch the file to one account per line
+                self._write_accounts(self._accounts + [account])
+                return primary is None
+            with open(ACCOUNTS_FILE, 'a') as f:
+                f.write(f"{account}\n")
+            self._accounts.append(account)
+            self._account_index[key] = account
+            self._accounts_file_state = self._file_state(ACCOUNTS_FILE)
+            if primary is None:
+                self._primary_accounts.append(account)
+                self._steam_id_index[steam_id or key] = account
+                primary = account
+            else:
+                # Another spelling of an account that is already stored
+                self._aliases.setdefault(primary, []).append(account)
+            self._primary_of[key] = primary
+        return primary == account
+
+    def remove_account_at(self, index: int) -> Optional[str]:
+        with self._lock:
+            self._sync_groups()
+            if not 0 <= index < len(self._primary_accounts):
+                return None
+            removed = self._primary_accounts[index]
+            self._remove_group(removed)
+        return removed
+
+    def remove_account_matching(self, text: str) -> Optional[str]:
+        with self._lock:
+            self._sync_groups()
+            # An account with the same identity first, then any account containing text
+            target = self._primary_of.get(account_key(text))
+            if target is None:
+                needle = text.lower()
+                match = next((acc for acc in self._accounts if needle in acc.lower()), None)
+                target = self._primary_of.get(account_key(match)) if match is not None else None
+            if target is None:
+                return None
+            self._remove_group(target)
+        return target
+
+    def replace_accounts(self, accounts: List[str]) -> None:
+        with self._lock:
+            self._write_accounts(accounts)
+
+class SQLiteStateStore(StateStore):
+    """Stores state in an indexed SQLite database.
+
+    Lookups and updates touch a single row, so the cost no longer grows with
+    the size of the blacklist or the account queue.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blacklist (
+            steam_id TEXT PRIMARY KEY,
+            reason TEXT NOT NULL DEFAULT '',
+            timestamp TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            last_attempt REAL NOT NULL DEFAULT 0,
+            consecutive_missing INTEGER,
+            failure_is_confirmed INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_blacklist_last_attempt ON blacklist(last_attempt);
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account TEXT NOT NULL UNIQUE,
+            account_key TEXT,
+            steam_id TEXT,
+            alias_of INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    # Accounts read per query by iter_accounts()
+    ACCOUNT_BATCH_SIZE = 1000
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate_accounts()
+        self._conn.commit()
+
+        # Import existing text files the first time the database is used
+        if not self._get_meta('text_imported'):
+            self.import_text_files()
+            self._set_meta('text_imported', time.strftime('%Y-%m-%d %H:%M:%S'))
+        else:
+            self._warn_if_text_files_changed()
+
+    def _migrate_accounts(self) -> None:
+        """Add the identity columns to databases created before they existed.
+
+        Accounts get their account_key() (dropping duplicates) and, where it is
+        known without asking Steam, their Steam ID, so aliases are merged.
+        """
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(accounts)")}
+        for column, definition in (('account_key', 'TEXT'), ('steam_id', 'TEXT'), ('alias_of', 'INTEGER')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE accounts ADD COLUMN {column} {definition}")
+        rows = self._conn.execute("SELECT id, account FROM accounts WHERE account_key IS NULL ORDER BY id").fetchall()
+        if rows:
+            seen = {row['account_key'] for row in
+                    self._conn.execute("SELECT account_key FROM accounts WHERE account_key IS NOT NULL")}
+            duplicates = []
+            for row in rows:
+                key = account_key(row['account'])
+                if key in seen:
+                    duplicates.append((row['id'],))
+                else:
+                    seen.add(key)
+                    self._conn.execute("UPDATE accounts SET account_key = ? WHERE id = ?", (key, row['id']))
+            self._conn.executemany("DELETE FROM accounts WHERE id = ?", duplicates)
+            logger.info(f"Indexed {len(rows)} accounts, removed {len(duplicates)} duplicates")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_key ON accounts(account_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accounts_steam_id ON accounts(steam_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accounts_alias_of ON accounts(alias_of)")
+
+        if 'steam_id' not in columns:
+            for row in self._conn.execute("SELECT id, account FROM accounts ORDER BY id").fetchall():
+                steam_id = known_steam_id(row['account'])
+                if steam_id:
+                    self._link(row['id'], steam_id)
+
+    def _link(self, row_id: int, steam_id: str) -> int:
+        """Record a row's Steam ID and merge its group with any other group for
+        the same user; the earliest account stays the listed one. Call with the
+        lock held, in a transaction. Returns the id of the listed account."""
+        row = self._conn.execute("SELECT id, alias_of, steam_id FROM accounts WHERE id = ?", (row_id,)).fetchone()
+        primary = row['alias_of'] or row['id']
+        if row['steam_id'] != steam_id:
+            self._conn.execute("UPDATE accounts SET steam_id = ? WHERE id = ?", (steam_id, row_id))
+        while True:
+            other = self._conn.execute(
+                "SELECT COALESCE(alias_of, id) AS group_id FROM accounts "
+                "WHERE steam_id = ? AND COALESCE(alias_of, id) != ? LIMIT 1",
+                (steam_id, primary)
+            ).fetchone()
+            if not other:
+                return primary
+            keep, merge = sorted((primary, other['group_id']))
+            self._conn.execute("UPDATE accounts SET alias_of = ? WHERE id = ? OR alias_of = ?", (keep, merge, merge))
+            primary = keep
+
+    def _insert_account(self, account: str) -> bool:
+        """Insert an account, linking it to the same user's account if there is one.
+        Call with the lock held, in a transaction. Returns False unless it is a new user."""
+        steam_id = known_steam_id(account)
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO accounts (account, account_key) VALUES (?, ?)",
+            (account, account_key(account))
+        )
+        if cursor.rowcount == 0:
+            return False
+        if steam_id is None:
+            return True
+        return self._link(cursor.lastrowid, steam_id) == cursor.lastrowid
+
+    def _set_text_synced(self) -> None:
+        """Record that the text files and the database match as of now. Call with the lock held, in a transaction."""
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('text_synced', ?)", (str(time.time()),))
+
+    def _warn_if_text_files_changed(self) -> None:
+        """Warn if accounts.txt or blacklist.txt were edited since they were last imported or exported,
+        as the database doesn't pick such edits up by itself."""
+        synced = self._get_meta('text_synced')
+        if synced is None:
+            return
+        for path in (ACCOUNTS_FILE, BLACKLIST_FILE):
+            try:
+                modified = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if modified > float(synced):
+                logger.warning(f"{path.name} changed since it was last imported into {self.path.name}; "
+                               f"run 'import' to merge the changes")
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = {
+            'reason': row['reason'],
+            'timestamp': row['timestamp'],
+            'count': row['count'],
+            'last_attempt': row['last_attempt']
+        }
+        # Only include the optional fields when they were set, so callers'
+        # .get() defaults behave the same as with the text backend
+        if row['consecutive_missing'] is not None:
+            entry['consecutive_missing'] = row['consecutive_missing']
+        if row['failure_is_confirmed'] is not None:
+            entry['failure_is_confirmed'] = bool(row['failure_is_confirmed'])
+        return entry
+
+    @staticmethod
+    def _entry_params(steam_id: str, data: Dict[str, Any]) -> tuple:
+        failure_is_confirmed = data.get('failure_is_confirmed')
+        return (
+            steam_id,
+            data.get('reason', ''),
+            data.get('timestamp', ''),
+            int(data.get('count', 0)),
+            float(data.get('last_attempt', 0)),
+            data.get('consecutive_missing'),
+            None if failure_is_confirmed is None else int(bool(failure_is_confirmed))
+        )
+
+    def load_blacklist(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM blacklist").fetchall()
+        return {row['steam_id']: self._row_to_entry(row) for row in rows}
+
+    def get_blacklist_entry(self, steam_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM blacklist WHERE steam_id = ?", (steam_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def set_blacklist_entry(self, steam_id: str, data: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blacklist VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._entry_params(steam_id, data)
+            )
+
+    def delete_blacklist_entry(self, steam_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM blacklist WHERE steam_id = ?", (steam_id,))
+
+    def replace_blacklist(self, blacklist: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM blacklist")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO blacklist VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._entry_params(steam_id, data) for steam_id, data in blacklist.items()]
+            )
+
+    def apply_blacklist_changes(self, updates: Dict[str, Dict[str, Any]], deletions: Set[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM blacklist WHERE steam_id = ?",
+                [(steam_id,) for steam_id in deletions]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO blacklist VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._entry_params(steam_id, data) for steam_id, data in updates.items()]
+            )
+
+    def load_accounts(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT account FROM accounts WHERE alias_of IS NULL ORDER BY id").fetchall()
+        return [row['account'] for row in rows]
+
+    def iter_accounts(self) -> Iterator[str]:
+        # Read in batches by id so the lock isn't held while the caller works on each account
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, account FROM accounts WHERE id > ? AND alias_of IS NULL ORDER BY id LIMIT ?",
+                    (last_id, self.ACCOUNT_BATCH_SIZE)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row['account']
+            last_id = rows[-1]['id']
+
+    def count_accounts(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM accounts WHERE alias_of IS NULL").fetchone()[0]
+
+    def has_account(self, account: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM accounts WHERE account_key = ?", (account_key(account),)
+            ).fetchone()
+        return row is not None
+
+    def get_account_steam_id(self, account: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT steam_id FROM accounts WHERE account_key = ?", (account_key(account),)
+            ).fetchone()
+        if row and row['steam_id']:
+            return row['steam_id']
+        return known_steam_id(account)
+
+    def link_account(self, account: str, steam_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, alias_of, steam_id FROM accounts WHERE account_key = ?", (account_key(account),)
+            ).fetchone()
+            if not row:
+                return None
+            if row['steam_id'] == steam_id:
+                # Already linked; nothing to write
+                primary = row['alias_of'] or row['id']
+            else:
+                with self._conn:
+                    primary = self._link(row['id'], steam_id)
+            listed = self._conn.execute("SELECT account FROM accounts WHERE id = ?", (primary,)).fetchone()
+        return listed['account']
+
+    def account_aliases(self) -> Dict[str, List[str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT listed.account AS listed, alias.account AS alias FROM accounts alias "
+                "JOIN accounts listed ON alias.alias_of = listed.id ORDER BY alias.id"
+            ).fetchall()
+        aliases: Dict[str, List[str]] = {}
+        for row in rows:
+            aliases.setdefault(row['listed'], []).append(row['alias'])
+        return aliases
+
+    def add_account(self, account: str) -> bool:
+        # The unique index on account_key makes this a single indexed lookup
+        with self._lock, self._conn:
+            return self._insert_account(account)
+
+    def _delete_group(self, primary: int) -> None:
+        self._conn.execute("DELETE FROM accounts WHERE id = ? OR alias_of = ?", (primary, primary))
+
+    def remove_account_at(self, index: int) -> Optional[str]:
+        if index < 0:
+            return None
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, account FROM accounts WHERE alias_of IS NULL ORDER BY id LIMIT 1 OFFSET ?", (index,)
+            ).fetchone()
+            if not row:
+                return None
+            self._delete_group(row['id'])
+        return row['account']
+
+    def remove_account_matching(self, text: str) -> Optional[str]:
+        with self._lock, self._conn:
+            # An account with the same identity is found through the index;
+            # only fall back to a substring scan if there isn't one
+            row = self._conn.execute(
+                "SELECT id, alias_of FROM accounts WHERE account_key = ?", (account_key(text),)
+            ).fetchone()
+            if not row:
+                row = self._conn.execute(
+                    "SELECT id, alias_of FROM accounts WHERE instr(lower(account), lower(?)) > 0 ORDER BY id LIMIT 1",
+                    (text,)
+                ).fetchone()
+            if not row:
+                return None
+            listed = self._conn.execute(
+                "SELECT id, account FROM accounts WHERE id = ?", (row['alias_of'] or row['id'],)
+            ).fetchone()
+            self._delete_group(listed['id'])
+        return listed['account']
+
+    def replace_accounts(self, accounts: List[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM accounts")
+            for account in accounts:
+                self._insert_account(account)
+
+    def import_text_files(self) -> None:
+        """Merge accounts.txt and blacklist.txt into the database."""
+        blacklist = read_blacklist_file(BLACKLIST_FILE)
+        with self._lock, self._conn:
+            # Stream accounts.txt straight into the table instead of reading it into a list first
+            imported = sum(self._insert_account(account) for account in iter_accounts_file(ACCOUNTS_FILE))
+            # blacklist.txt only has these columns; keep what the database knows
+            # beyond them (consecutive_missing, failure_is_confirmed) for existing entries
+            self._conn.executemany(
+                "INSERT INTO blacklist (steam_id, reason, timestamp, count, last_attempt) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(steam_id) DO UPDATE SET reason = excluded.reason, timestamp = excluded.timestamp, "
+                "count = excluded.count, last_attempt = excluded.last_attempt",
+                [self._entry_params(steam_id, data)[:5] for steam_id, data in blacklist.items()]
+            )
+            self._set_text_synced()
+        logger.info(f"Imported {imported} new accounts and {len(blacklist)} blacklist entries into {self.path.name}")
+
+    def export_text_files(self) -> None:
+        """Write the database contents out as accounts.txt and blacklist.txt."""
+        # Every spelling, so aliases survive a round trip through the text files
+        with self._lock:
+            accounts = [row['account'] for row in self._conn.execute("SELECT account FROM accounts ORDER BY id")]
+        blacklist = self.load_blacklist()
+        write_accounts_file(ACCOUNTS_FILE, accounts)
+        write_blacklist_file(BLACKLIST_FILE, blacklist)
+        with self._lock, self._conn:
+            self._set_text_synced()
+        logger.info(f"Exported {len(accounts)} accounts and {len(blacklist)} blacklist entries to text files")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+def get_state_store() -> StateStore:
+    """Get the configured state store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STORAGE_BACKEND == 'sqlite':
+                try:
+                    _store = SQLiteStateStore(STATE_DB_FILE)
+                    logger.info(f"Using SQLite state store: {STATE_DB_FILE}")
+                except Exception as e:
+                    logger.error(f"Error opening SQLite state store, falling back to text files: {str(e)}")
+                    _store = TextStateStore()
+            else:
+                _store = TextStateStore()
+        return _store
+
+def import_text_files() -> bool:
+    """Import accounts.txt and blacklist.txt into the configured store."""
+    store = get_state_store()
+    if not isinstance(store, SQLiteStateStore):
+        logger.info("Text storage backend in use - nothing to import")
+        return False
+    store.import_text_files()
+    return True
+
+def export_text_files() -> bool:
+    """Export the configured store to accounts.txt and blacklist.txt."""
+    store = get_state_store()
+    if not isinstance(store, SQLiteStateStore):
+        logger.info("Text storage backend in use - files are already up to date")
+        return False
+    store.export_text_files()
+    return True
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List
+
+from .logging import logger
+from .metrics import propagate
+
+class BackgroundWorkers:
+    """A fixed number of daemon threads working through a bounded queue of tasks.
+
+    Used for work started from the interactive prompt (e.g. processing an
+    account as soon as it is added), so a burst of commands can't start an
+    unbounded number of threads. The threads are daemons: shutdown() waits
+    for running tasks only up to a deadline and never holds up exiting.
+    """
+
+    def __init__(self, workers: int, max_queued: int, name: str = "background"):
+        self._tasks: queue.Queue = queue.Queue(maxsize=max(1, max_queued))
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self._work, daemon=True, name=f"{name}-{i}")
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func: Callable, *args: Any) -> bool:
+        """Queue a task. Returns False if the queue is full or the workers are shutting down."""
+        if self._stopping.is_set():
+            return False
+        try:
+            # Keep the task attributed to the operation that queued it
+            self._tasks.put_nowait((propagate(func), args))
+            return True
+        except queue.Full:
+            return False
+
+    def pending(self) -> int:
+        """Tasks queued or running."""
+        with self._lock:
+            return self._tasks.qsize() + self._busy
+
+    def _work(self) -> None:
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            func, args = task
+            with self._lock:
+                self._busy += 1
+            try:
+                if not self._stopping.is_set():
+                    func(*args)
+            except Exception as e:
+                logger.error(f"Error in background task: {str(e)}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._idle.notify_all()
+
+    def shutdown(self, timeout: float) -> bool:
+        """Drop queued tasks and wait up to timeout seconds for running ones.
+
+        Returns True if every task finished in time.
+        """
+        self._stopping.set()
+        dropped = 0
+        while True:
+            try:
+                self._tasks.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                break
+        if dropped:
+            logger.info(f"Dropped {dropped} queued background tasks")
+        # Wake the idle workers so their threads end
+        for _ in self._threads:
+            try:
+                self._tasks.put_nowait(None)
+            except queue.Full:
+                break
+
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"{self._busy} background tasks still running at shutdown")
+                    return False
+                self._idle.wait(remaining)
+        return True
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from steamautofriend.utils.circuit_breaker import CircuitBreaker, CircuitOpen, AUTH, CAPTCHA, THROTTLED
+
+COOLDOWN = 0.05
+ADD_FRIEND = "https://steamcommunity.com/actions/AddFriendAjax"
+SEARCH = "https://steamcommunity.com/search/SearchCommunityAjax"
+PROFILE = "https://steamcommunity.com/profiles/76561198011111111"
+
+def make_breaker(probe=None) -> CircuitBreaker:
+    return CircuitBreaker(probe=probe, cooldowns={AUTH: COOLDOWN, CAPTCHA: COOLDOWN, THROTTLED: COOLDOWN}, max_cooldown=1.0)
+
+def wait_for_cooldown(breaker: CircuitBreaker) -> None:
+    time.sleep(breaker.stats()['retry_in'] + 0.01)
+
+def on_other_thread(func):
+    """Run func on another thread and return what it returned or raised."""
+    result = {}
+    def target():
+        try:
+            result['value'] = func()
+        except Exception as e:
+            result['value'] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    return result['value']
+
+def test_throttled_blocks_only_friend_requests():
+    breaker = make_breaker()
+    breaker.trip(THROTTLED)
+    with pytest.raises(CircuitOpen):
+        breaker.check('POST', ADD_FRIEND)
+    breaker.check('POST', SEARCH)
+    breaker.check('GET', PROFILE)
+    assert breaker.is_blocking('POST')
+    assert not breaker.is_blocking('POST', SEARCH)
+    assert not breaker.is_blocking('GET')
+    assert breaker.stats()['state'] == 'open'
+    assert breaker.stats()['rejected'] == 1
+
+def test_auth_blocks_reads_too():
+    breaker = make_breaker()
+    breaker.trip(AUTH)
+    with pytest.raises(CircuitOpen):
+        breaker.check('GET', PROFILE)
+    assert breaker.is_blocking('GET')
+
+def test_trial_after_cooldown_closes_on_success():
+    breaker = make_breaker()
+    breaker.trip(CAPTCHA)
+    wait_for_cooldown(breaker)
+    assert breaker.stats()['state'] == 'half-open'
+
+    # The first friend request after the cooldown is the trial
+    breaker.check('POST', ADD_FRIEND)
+    assert not breaker.is_blocking('POST')
+    assert on_other_thread(lambda: breaker.is_blocking('POST'))
+    assert isinstance(on_other_thread(lambda: breaker.check('POST', ADD_FRIEND)), CircuitOpen)
+
+    # Only the trial thread can close it
+    on_other_thread(breaker.succeeded)
+    assert breaker.stats()['reason'] == CAPTCHA
+    breaker.succeeded()
+    assert breaker.stats()['state'] == 'closed'
+    on_other_thread(lambda: breaker.check('POST', ADD_FRIEND))
+
+def test_failed_trial_reopens_with_doubled_cooldown():
+    breaker = make_breaker()
+    breaker.trip(THROTTLED)
+    wait_for_cooldown(breaker)
+    breaker.check('POST', ADD_FRIEND)
+    breaker.trip(THROTTLED)
+    stats = breaker.stats()
+    assert stats['state'] == 'open'
+    assert COOLDOWN < stats['retry_in'] <= 2 * COOLDOWN
+    assert stats['trips'] == 1
+    assert not breaker.is_blocking('POST', SEARCH)
+    with pytest.raises(CircuitOpen):
+        breaker.check('POST', ADD_FRIEND)
+
+def test_reports_from_other_requests_only_upgrade_the_reason():
+    breaker = make_breaker()
+    breaker.trip(THROTTLED)
+    breaker.trip(THROTTLED)
+    assert breaker.stats()['trips'] == 1
+    breaker.trip(AUTH)
+    assert breaker.stats()['reason'] == AUTH
+    breaker.trip(CAPTCHA)
+    assert breaker.stats()['reason'] == AUTH
+
+def test_auth_probe_decides_whether_to_resume():
+    answers = [False, True]
+    breaker = make_breaker(probe=lambda: answers.pop(0))
+    breaker.trip(AUTH)
+    wait_for_cooldown(breaker)
+
+    with pytest.raises(CircuitOpen):
+        breaker.check('GET', PROFILE)
+    assert breaker.stats()['state'] == 'open'
+
+    wait_for_cooldown(breaker)
+    breaker.check('GET', PROFILE)
+    assert breaker.stats()['state'] == 'closed'
+    assert answers == []
+
+def test_stale_trial_stops_blocking_others():
+    breaker = make_breaker()
+    breaker.TRIAL_TIMEOUT = COOLDOWN
+    breaker.trip(THROTTLED)
+    wait_for_cooldown(breaker)
+    breaker.check('POST', ADD_FRIEND)
+    assert on_other_thread(lambda: breaker.is_blocking('POST'))
+
+    # The trial thread never reported back; another request takes over the trial
+    time.sleep(COOLDOWN + 0.01)
+    assert not on_other_thread(lambda: breaker.is_blocking('POST'))
+    assert on_other_thread(lambda: breaker.check('POST', ADD_FRIEND)) is None
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from steamautofriend.utils.extractor import extract_page
+from steamautofriend.utils.friends import _fetch_pending_invites_page
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+def load(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+class FakeResponse:
+    def __init__(self, text: str, status_code: int = 200):
+        self.text = text
+        self.status_code = status_code
+
+class FakeSession:
+    def __init__(self, text: str):
+        self.text = text
+        self.breaker = None
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.text)
+
+class FakeSteamSession:
+    def __init__(self, text: str):
+        self.session = FakeSession(text)
+
+def test_invites_section_keeps_nested_invites():
+    page = extract_page(load("pending_two_invites.html"))
+
+    assert page.invites_section_found
+    assert page.invites_section_complete
+    assert list(dict.fromkeys(page.invite_section_ids)) == ["76561198011111111", "76561198022222222"]
+    # Links after the section aren't invites
+    assert "76561198033333333" not in page.invite_section_ids
+    assert "76561198033333333" in page.profile_links
+
+def test_invites_page_is_authoritative_only_when_section_closes():
+    html = load("pending_two_invites.html")
+    found, authoritative = _fetch_pending_invites_page(FakeSteamSession(html), "76561198000000001")
+    assert found == {"76561198011111111", "76561198022222222"}
+    assert authoritative
+
+    # Page cut off inside the section: the invites seen so far count, but the list may be incomplete
+    truncated = html[:html.index('data-steamid="76561198022222222"')]
+    page = extract_page(truncated)
+    assert page.invites_section_found
+    assert not page.invites_section_complete
+    found, authoritative = _fetch_pending_invites_page(FakeSteamSession(truncated), "76561198000000001")
+    assert found == {"76561198011111111"}
+    assert not authoritative
@@ -0,0 +1,130 @@
+"""The page extractor compared with the regex parser it replaced.
+
+The legacy_* functions below are the parsing code of get_friends() and the
+three pending sources of get_pending_requests() before the extractor, kept
+verbatim so both parsers can be run on the same pages. Where the results
+differ, it is on purpose:
+
+- The invites section runs to its matching </div>, not the first one, so
+  invites nested in their own divs are all found (the old parser kept only
+  the first).
+- A pending marker belongs to the user right before it. The old patterns ran
+  from the first data-steamid to the next marker anywhere after it, so on a
+  page with friends and pending users mixed they reported the friend at the
+  start of the run instead of the pending user.
+- The friends page (METHOD 3) only counts "Pending..." and invite-sent
+  markers, like the manage page. The old pattern matched "pending" anywhere,
+  in any case, which includes a bare "Pending" label and class names.
+"""
+import re
+from pathlib import Path
+
+from steamautofriend.utils.extractor import extract_page
+from steamautofriend.utils.friends import (
+    get_friends, _fetch_pending_invites_page, _fetch_manage_friends_page, _fetch_friends_page_pending
+)
+
+FIXTURES = Path(__file__).parent / "fixtures"
+OWN_STEAM_ID = "76561198000000001"
+
+def load(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+class FakeResponse:
+    def __init__(self, text: str, status_code: int = 200):
+        self.text = text
+        self.status_code = status_code
+
+class FakeSession:
+    def __init__(self, text: str):
+        self.text = text
+        self.breaker = None
+        self.cookies = {'steamLoginSecure': f"{OWN_STEAM_ID}%7C%7Ctoken"}
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.text)
+
+class FakeSteamSession:
+    logged_in = True
+
+    def __init__(self, text: str):
+        self.session = FakeSession(text)
+
+# --- The parser before the extractor -----------------------------------------
+
+def legacy_friends(html: str, own_steam_id: str):
+    own_miniprofile_id = str(int(own_steam_id) - 76561197960265728)
+    steam_ids = [str(int(miniprofile) + 76561197960265728)
+                 for miniprofile in re.findall(r'data-miniprofile="(\d+)"', html)
+                 if miniprofile != own_miniprofile_id]
+    return sorted(set(steam_ids))
+
+def legacy_invites_page(html: str):
+    found = set()
+    pending_section = re.search(r'<div class="friends_invites_section">(.*?)</div>', html, re.DOTALL)
+    if not pending_section:
+        mini_pattern = r'data-miniprofile=["\'](.*?)["\'][^>]*>.*?<span\s+class="friend_blocked_text">Invite\s+Sent'
+        for miniprofile_id in re.findall(mini_pattern, html, re.DOTALL | re.IGNORECASE):
+            found.add(str(int(miniprofile_id) + 76561197960265728))
+    else:
+        profile_pattern = r'href="(?:https://steamcommunity\.com)?/profiles/(\d+)"[^>]*>'
+        found.update(re.findall(profile_pattern, pending_section.group(1)))
+    return found
+
+def legacy_manage_page(html: str):
+    found = set()
+    if 'class="friendInvite_SentRequest' in html:
+        sent_pattern = r'data-steamid="(\d+)"[^>]*>.*?class="friendInvite_SentRequest'
+        found.update(re.findall(sent_pattern, html, re.DOTALL))
+    newer_pattern = r'data-steamid="(\d+)"[^>]*>.*?Pending\.\.\..*?</span>'
+    found.update(re.findall(newer_pattern, html, re.DOTALL | re.IGNORECASE))
+    return found
+
+def legacy_friends_page_pending(html: str):
+    pending_pattern = r'data-steamid="(\d+)"[^>]*>.*?Pending.*?</span>'
+    return set(re.findall(pending_pattern, html, re.DOTALL | re.IGNORECASE))
+
+# --- Same results -------------------------------------------------------------
+
+def test_friends_list_matches_legacy():
+    html = load("friends_page.html")
+    friends = get_friends(FakeSteamSession(html))
+    assert friends == legacy_friends(html, OWN_STEAM_ID)
+    assert OWN_STEAM_ID not in friends
+    assert len(friends) == 5
+
+def test_invites_without_section_match_legacy():
+    html = load("pending_without_section.html")
+    found, authoritative = _fetch_pending_invites_page(FakeSteamSession(html), OWN_STEAM_ID)
+    assert found == legacy_invites_page(html) == {"76561198011111111", "76561198022222222"}
+    assert not authoritative
+
+def test_manage_page_sent_requests_match_legacy():
+    html = load("manage_sent_requests.html")
+    found, _ = _fetch_manage_friends_page(FakeSteamSession(html), OWN_STEAM_ID)
+    assert found == legacy_manage_page(html) == {"76561198011111111", "76561198022222222"}
+
+def test_manage_page_new_ui_matches_legacy():
+    html = load("manage_pending_new_ui.html")
+    found, _ = _fetch_manage_friends_page(FakeSteamSession(html), OWN_STEAM_ID)
+    assert found == legacy_manage_page(html) == {"76561198033333333", "76561198044444444"}
+
+# --- Deliberate differences ---------------------------------------------------
+
+def test_nested_invites_section_finds_every_invite():
+    html = load("pending_two_invites.html")
+    found, _ = _fetch_pending_invites_page(FakeSteamSession(html), OWN_STEAM_ID)
+    assert legacy_invites_page(html) == {"76561198011111111"}
+    assert found == {"76561198011111111", "76561198022222222"}
+
+def test_friends_page_pending_marker_belongs_to_preceding_user():
+    html = load("friends_page.html")
+    found, _ = _fetch_friends_page_pending(FakeSteamSession(html), OWN_STEAM_ID)
+    # The old pattern reported the friends whose blocks started each run up to a "pending"
+    assert legacy_friends_page_pending(html) == {"76561198011111111", "76561198055555555"}
+    # Only the user marked "Pending..." is pending; the bare "Pending" label doesn't count
+    assert found == {"76561198044444444"}
+
+def test_pending_marker_attaches_to_nearest_user():
+    page = extract_page(load("friends_page.html"))
+    assert page.pending_ids() == ["76561198044444444"]